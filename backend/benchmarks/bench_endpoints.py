@@ -0,0 +1,435 @@
+"""主要エンドポイントのベンチマーク（レイテンシ・Firestore読み書き回数・ピークメモリ）。
+
+合成ユーザー（100冊の読書記録・数千件のメッセージ）と大きな公開タイムラインを
+インメモリのFirestoreフェイクに投入し、FastAPIアプリをプロセス内で直接呼び出す。
+LLMは FakeLlm（benchmarks/fake_llm_script.json）、Google Books はスタブに差し替える。
+
+計測対象:
+- タイムライン v1 / v2（新着順・ランダム）
+- /api/profile/insights（全読書横断のInsight一覧）
+- /api/readings/{id}/delete-preview
+- /api/books/search
+- チャットのストリーミング（最後のイベントまでと最初のバイトまで）
+
+エンドポイントごとに p50/p95/p99 のレイテンシ、1リクエストあたりのFirestore
+読み取り・書き込み・往復回数、ピークメモリ（tracemalloc、別パスで計測）を出す。
+--latency でFirestoreの1往復あたりの遅延を模擬するため、往復回数の増減が
+レイテンシにも現れる。
+
+使い方:
+    python benchmarks/bench_endpoints.py [--requests 50] [--latency 0.002]
+    python benchmarks/bench_endpoints.py --save-baseline   # 結果を基準値として保存
+    python benchmarks/bench_endpoints.py --compare         # 基準値と比較（悪化があれば終了コード1）
+
+基準値（既定は benchmarks/baselines/endpoints.json）は実行環境に依存するため
+リポジトリには含めず、変更前に --save-baseline、変更後に --compare で使う。
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+_BENCH_DIR = Path(__file__).resolve().parent
+
+# 設定は import 時に読まれるため、knowva より先に環境変数を決める
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("FAKE_LLM_SCRIPT", str(_BENCH_DIR / "fake_llm_script.json"))
+os.environ.setdefault("FAKE_LLM_CHUNK_DELAY_SECONDS", "0.005")
+os.environ.setdefault("FAKE_LLM_TOOL_LATENCY_SECONDS", "0.01")
+os.environ.setdefault("GOOGLE_API_KEY", "bench-dummy-key")
+
+from knowva.main import app  # noqa: E402
+from knowva.middleware.firebase_auth import get_current_user  # noqa: E402
+from knowva.middleware.rate_limit import limiter  # noqa: E402
+from knowva.services import book_search  # noqa: E402
+from knowva.testing.firestore_fake import FakeAsyncClient, fake_firestore  # noqa: E402
+
+DEFAULT_BASELINE = _BENCH_DIR / "baselines" / "endpoints.json"
+
+USER_ID = "bench_user"
+INSIGHT_TYPES = ["learning", "impression", "question", "connection"]
+STATUSES = ["not_started", "reading", "completed"]
+
+
+def seed_documents(
+    readings: int, sessions: int, messages: int, public_items: int, seed: int = 42
+) -> dict[str, dict]:
+    """ベンチマーク用の合成データ（パス→内容）を作る。"""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    user_path = f"users/{USER_ID}"
+    docs: dict[str, dict] = {
+        user_path: {
+            "name": "ベンチ読者",
+            "current_profile": {"interests": ["経営", "小説"], "goals": ["毎月2冊読む"]},
+            "activity": {"insights_count": readings * 5, "updated_at": now},
+            "created_at": now - timedelta(days=400),
+        }
+    }
+
+    for i in range(readings):
+        reading_id = f"reading_{i:03d}"
+        book_id = f"book_{i:03d}"
+        started = now - timedelta(days=readings - i)
+        book = {"title": f"合成された本 {i}", "author": f"著者 {i % 17}"}
+        docs[f"books/{book_id}"] = {**book, "isbn": f"978{i:010d}", "created_at": started}
+        reading_path = f"{user_path}/readings/{reading_id}"
+        docs[reading_path] = {
+            "user_id": USER_ID,
+            "book_id": book_id,
+            "book": book,
+            "status": STATUSES[i % len(STATUSES)],
+            "reading_context": {"motivation": "仕事に活かしたい"},
+            "read_count": 1,
+            "start_date": started,
+            "latest_summary": None,
+            "created_at": started,
+            "updated_at": started,
+        }
+        for s in range(sessions):
+            session_path = f"{reading_path}/sessions/session_{s}"
+            docs[session_path] = {
+                "reading_id": reading_id,
+                "session_type": "during_reading",
+                "started_at": started,
+                "ended_at": None,
+                "summary": None,
+                "message_count": messages,
+            }
+            for m in range(messages):
+                role = "user" if m % 2 == 0 else "assistant"
+                docs[f"{session_path}/messages/message_{m:04d}"] = {
+                    "role": role,
+                    "message": f"{role} のメッセージ {m}。" * rng.randint(1, 6),
+                    "input_type": "text",
+                    "created_at": started + timedelta(minutes=s * 60 + m),
+                }
+        for n in range(5):
+            docs[f"{reading_path}/insights/insight_{n}"] = {
+                "content": f"気づき {i}-{n}",
+                "type": INSIGHT_TYPES[n % len(INSIGHT_TYPES)],
+                "visibility": "private",
+                "reading_status": "reading",
+                "created_at": started + timedelta(hours=n),
+            }
+        for mood_type in ("before", "after"):
+            docs[f"{reading_path}/moods/{mood_type}"] = {
+                "user_id": USER_ID,
+                "reading_id": reading_id,
+                "mood_type": mood_type,
+                "metrics": {"energy": rng.randint(1, 5), "curiosity": rng.randint(1, 5)},
+                "recorded_at": started,
+            }
+
+    for p in range(public_items):
+        published_at = now - timedelta(minutes=p)
+        book = {"title": f"公開された本 {p % 300}", "author": "誰か"}
+        docs[f"publicInsights/public_insight_{p:05d}"] = {
+            "insight_id": f"insight_{p}",
+            "user_id": f"user_{p % 500}",
+            "content": f"タイムラインの気づき {p}",
+            "type": INSIGHT_TYPES[p % len(INSIGHT_TYPES)],
+            "display_name": "読書家さん",
+            "book": book,
+            "reading_status": "completed",
+            "published_at": published_at,
+        }
+        if p % 4 == 0:
+            docs[f"publicReports/public_report_{p:05d}"] = {
+                "report_id": f"report_{p}",
+                "user_id": f"user_{p % 500}",
+                "reading_id": f"reading_{p}",
+                "summary": "要約",
+                "insights_summary": "気づきのまとめ",
+                "display_name": "読書家さん",
+                "book": book,
+                "reading_status": "completed",
+                "published_at": published_at - timedelta(seconds=30),
+            }
+    return docs
+
+
+def stub_book_search(readings: int, upstream_latency: float) -> None:
+    """Google Books の呼び出しを、一定の遅延で10件を返すスタブにする。"""
+
+    async def search_google_books(query: str, max_results: int = 10) -> list[dict]:
+        await asyncio.sleep(upstream_latency)
+        return [
+            {
+                "google_books_id": f"gb_{n}",
+                # 半分は登録済みの本（ISBN一致）にする
+                "isbn": f"978{n * 7 % readings:010d}" if n % 2 == 0 else f"979{n:010d}",
+                "title": f"{query} {n}",
+                "author": "著者",
+                "description": None,
+                "thumbnail_url": None,
+            }
+            for n in range(max_results)
+        ]
+
+    book_search.search_google_books = search_google_books
+
+
+async def call(method: str, url: str, body: dict | None) -> tuple[int, float, float, str | None]:
+    """ASGIアプリを直接呼び、(ステータス, 最初のバイトまで, 完了まで, SSEのエラー) を返す。"""
+    path, _, query = url.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    started = time.perf_counter()
+    first_byte: float | None = None
+    status = 0
+    error: str | None = None
+    request_sent = False
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal first_byte, status, error
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            if error is None and b"event: error" in message["body"]:
+                error = message["body"].decode(errors="replace").strip()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(b"content-type", b"application/json"), (b"host", b"bench")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("bench", 80),
+        "app": app,
+    }
+    await app(scope, receive, send)
+    done.set()
+    total = time.perf_counter() - started
+    return status, first_byte if first_byte is not None else total, total, error
+
+
+def scenarios() -> dict[str, tuple[str, str, dict | None]]:
+    chat = "/api/readings/reading_000/sessions/session_0/messages/stream"
+    message = {"message": "主人公の決断が印象的でした", "input_type": "text"}
+    return {
+        "timeline_v1_newest": ("GET", "/api/timeline?order=newest&limit=20", None),
+        "timeline_v1_random": ("GET", "/api/timeline?order=random&limit=20", None),
+        "timeline_v2_newest": ("GET", "/api/timeline/v2?order=newest&limit=20", None),
+        "timeline_v2_random": ("GET", "/api/timeline/v2?order=random&limit=20", None),
+        "profile_insights": ("GET", "/api/profile/insights?limit=100", None),
+        "delete_preview": ("GET", "/api/readings/reading_000/delete-preview", None),
+        "book_search": ("GET", "/api/books/search?q=リーダーシップ", None),
+        "chat_stream": ("POST", chat, message),
+    }
+
+
+# パーセンタイルより上に最低この件数の標本がなければ、その値は最大値とほぼ同じで
+# 実行ごとに大きく揺れるため、比較に使わない（p95 は40件、p99 は200件から比較する）
+_MIN_SAMPLES_ABOVE_PERCENTILE = 2
+
+
+def comparable_percentiles(requests: int) -> set[str]:
+    """requests 件の計測で比較に使えるパーセンタイルのキー。"""
+    return {
+        f"p{pct}_ms"
+        for pct in (50, 95, 99)
+        if requests * (100 - pct) / 100 >= _MIN_SAMPLES_ABOVE_PERCENTILE
+    }
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def run_scenario(
+    db: FakeAsyncClient, method: str, url: str, body: dict | None, requests: int, warmup: int
+) -> dict:
+    for _ in range(warmup):
+        await call(method, url, body)
+
+    totals: list[float] = []
+    first_bytes: list[float] = []
+    db.stats.reset()
+    for _ in range(requests):
+        status, first_byte, total, error = await call(method, url, body)
+        if status != 200:
+            raise RuntimeError(f"{method} {url} returned {status}")
+        # ストリームの途中のエラーはステータス200のまま error イベントで届く。
+        # エラー経路の速さを計測・保存しないよう、失敗として扱う
+        if error is not None:
+            raise RuntimeError(f"{method} {url} streamed an error: {error}")
+        first_bytes.append(first_byte)
+        totals.append(total)
+    stats = db.stats.as_dict()
+
+    # tracemalloc は処理を大きく遅くするため、ピークメモリは別パスで測る
+    tracemalloc.start()
+    peak = 0
+    for _ in range(min(requests, 5)):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await call(method, url, body)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    result = {
+        "requests": requests,
+        "p50_ms": percentile(totals, 50) * 1000,
+        "p95_ms": percentile(totals, 95) * 1000,
+        "p99_ms": percentile(totals, 99) * 1000,
+        "reads_per_request": stats["reads"] / requests,
+        "writes_per_request": (stats["writes"] + stats["deletes"]) / requests,
+        "round_trips_per_request": stats["round_trips"] / requests,
+        "peak_kib": peak / 1024,
+    }
+    if method == "POST":
+        result["ttfb_p50_ms"] = percentile(first_bytes, 50) * 1000
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    limiter.enabled = False
+    app.dependency_overrides[get_current_user] = lambda: {"uid": USER_ID}
+    stub_book_search(args.readings, args.upstream_latency)
+
+    selected = scenarios()
+    if args.only:
+        selected = {name: selected[name] for name in args.only}
+
+    results = {}
+    with fake_firestore(latency=args.latency) as db:
+        db.load(seed_documents(args.readings, args.sessions, args.messages, args.public_items))
+        # 投入した大量の合成データを GC の対象から外す。残したままだと世代2の回収が
+        # まれに数百ミリ秒かかり、その1回が p99 を決めてしまう
+        gc.collect()
+        gc.freeze()
+        for name, (method, url, body) in selected.items():
+            results[name] = await run_scenario(db, method, url, body, args.requests, args.warmup)
+            print_row(name, results[name])
+        # チャットが予約したバックグラウンドの要約を待ってから閉じる
+        await asyncio.sleep(0.1)
+    return {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "readings",
+                "sessions",
+                "messages",
+                "public_items",
+                "requests",
+                "latency",
+                "upstream_latency",
+            )
+        },
+        "results": results,
+    }
+
+
+def print_row(name: str, result: dict) -> None:
+    print(
+        f"{name:20s} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+        f"p99 {result['p99_ms']:8.2f} ms  reads {result['reads_per_request']:8.1f}  "
+        f"writes {result['writes_per_request']:5.1f}  "
+        f"round trips {result['round_trips_per_request']:6.1f}  "
+        f"peak {result['peak_kib']:9.1f} KiB"
+    )
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """基準値より悪化した項目を返す。
+
+    Firestoreの読み書き・往復回数はデータが同じなら決まった値になるため、わずかな増加でも
+    悪化とみなす。レイテンシとメモリは実行環境の揺らぎを考慮して tolerance の割合まで許容する。
+    標本数が少なく最大値と変わらないパーセンタイル（既定の50件では p99）は比較しない。
+    エラーを含む古い基準値とは比較せず、保存し直すよう悪化として扱う。
+    """
+    if current["config"] != baseline["config"]:
+        print(f"warning: config differs from baseline: {baseline['config']}")
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        if base.get("errors"):
+            # 失敗したリクエストを含む基準値は、エラー経路の速さを測っている
+            print(f"  {name}: baseline recorded {base['errors']} errors; save it again")
+            regressions.append(f"{name}.errors")
+            continue
+        percentiles = comparable_percentiles(min(result["requests"], base["requests"]))
+        for key, value in result.items():
+            if key not in base or key == "requests":
+                continue
+            if key.startswith("p") and key.endswith("_ms") and key not in percentiles:
+                continue
+            if key.endswith("_per_request"):
+                limit = base[key] * 1.01
+            else:
+                limit = base[key] * (1 + tolerance)
+            marker = "  <-- regression" if value > limit else ""
+            if marker:
+                regressions.append(f"{name}.{key}")
+            if marker or value != base[key]:
+                print(f"  {name}.{key}: {base[key]} -> {value}{marker}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readings", type=int, default=100)
+    parser.add_argument("--sessions", type=int, default=2, help="読書記録あたりのセッション数")
+    parser.add_argument("--messages", type=int, default=20, help="セッションあたりのメッセージ数")
+    parser.add_argument("--public-items", type=int, default=2000, help="公開Insightの件数")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.002, help="Firestore 1往復の遅延（秒）")
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="Google Books の遅延")
+    parser.add_argument("--only", nargs="+", choices=list(scenarios()), help="計測する対象")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="結果を基準値として保存")
+    parser.add_argument("--compare", action="store_true", help="基準値と比較する")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="レイテンシ等の許容悪化率")
+    args = parser.parse_args()
+
+    current = asyncio.run(run(args))
+
+    if args.save_baseline:
+        if args.requests < parser.get_default("requests"):
+            print(
+                f"warning: saving a baseline from {args.requests} requests; "
+                f"{sorted(comparable_percentiles(args.requests))} will be compared"
+            )
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(current, indent=2, ensure_ascii=False) + "\n")
+        print(f"baseline saved: {args.baseline}")
+    if args.compare:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
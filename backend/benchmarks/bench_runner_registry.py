@@ -0,0 +1,76 @@
+"""リクエストごとのRunner/genai.Client生成とレジストリ共有のベンチマーク。
+
+従来はリクエストのたびに ADK Runner と genai.Client を生成していた。
+agent_registry で共有したインスタンスを引く場合と、1リクエストあたりの
+セットアップ時間を比較する（ネットワーク通信やLLM呼び出しは含まない）。
+
+使い方:
+    python benchmarks/bench_runner_registry.py [--requests 2000]
+"""
+
+import argparse
+import os
+import time
+
+# genai.Client の生成にAPIキーが必要なため、未設定ならダミーを入れる（通信はしない）
+os.environ.setdefault("GOOGLE_API_KEY", "bench-dummy-key")
+
+from google import genai  # noqa: E402
+from google.adk.runners import Runner  # noqa: E402
+
+from knowva.agents import mentor_agent, onboarding_agent, reading_agent, report_agent  # noqa: E402
+from knowva.services import agent_registry  # noqa: E402
+from knowva.services.session_service import get_session_service  # noqa: E402
+
+APPS = {
+    "knowva": reading_agent,
+    "knowva_report": report_agent,
+    "knowva_mentor": mentor_agent,
+    "knowva_profile": onboarding_agent,
+}
+
+
+def per_request(requests: int) -> float:
+    """従来方式: 毎回 Runner と genai.Client を生成する。"""
+    names = list(APPS)
+    start = time.perf_counter()
+    for i in range(requests):
+        app_name = names[i % len(names)]
+        Runner(agent=APPS[app_name], app_name=app_name, session_service=get_session_service())
+        genai.Client()
+    return time.perf_counter() - start
+
+
+def shared(requests: int) -> float:
+    """レジストリ方式: 起動時に一度だけ生成し、以降は参照のみ。"""
+    for app_name, agent in APPS.items():
+        agent_registry.register_agent(app_name, agent)
+    names = list(APPS)
+    start = time.perf_counter()
+    for i in range(requests):
+        agent_registry.get_runner(names[i % len(names)])
+        agent_registry.get_genai_client()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    startup_begin = time.perf_counter()
+    shared(1)
+    startup = time.perf_counter() - startup_begin
+
+    baseline = per_request(args.requests)
+    registry = shared(args.requests)
+
+    print(f"requests: {args.requests}")
+    print(f"registry startup (one-off): {startup * 1e3:.2f} ms")
+    print(f"per-request construction: {baseline / args.requests * 1e6:9.2f} us/request")
+    print(f"shared registry lookup:   {registry / args.requests * 1e6:9.2f} us/request")
+    print(f"speedup: {baseline / registry:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""ADKイベント→SSEイベント変換のベンチマーク。
+
+長い応答のイベント列（ツール呼び出しを含む）を再生し、従来のルーター内ループ
+（パートの2回走査・名前による線形探索・チャンクごとの前方一致比較と json.dumps）と
+StreamTranslator の変換時間を比較する。SSEの送出やLLM呼び出しは含まない。
+
+イベント列は合成したものを使うか、--events で記録済みのJSONL
+（1行に Event.model_dump_json() を1件）を指定する。--record で合成した列を保存できる。
+
+使い方:
+    python benchmarks/bench_stream_translator.py [--chars 20000] [--chunk 20] [--repeat 5]
+    python benchmarks/bench_stream_translator.py --events recorded.jsonl
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from google.adk.events import Event
+from google.genai import types
+
+from knowva.services.sse_emitter import TextDelta, encode_delta
+from knowva.services.stream_translator import StreamTranslator
+
+
+def _event(parts: list[types.Part], partial: bool = False) -> Event:
+    return Event(
+        author="bench",
+        invocation_id="inv",
+        partial=partial,
+        content=types.Content(role="model", parts=parts),
+    )
+
+
+def synthesize(chars: int, chunk: int, partial: bool) -> list[Event]:
+    """ツール呼び出し2回（うち1回はidなし）のあとに長い応答が続くイベント列。"""
+    events = [
+        _event([types.Part(function_call=types.FunctionCall(id="c1", name="get_reading_context"))]),
+        _event([types.Part(function_call=types.FunctionCall(name="save_insight"))]),
+        _event(
+            [
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        id="c1", name="get_reading_context", response={"title": "本"}
+                    )
+                ),
+                types.Part(
+                    function_response=types.FunctionResponse(
+                        name="save_insight", response={"status": "saved"}
+                    )
+                ),
+            ]
+        ),
+    ]
+    text = "".join(f"読書の記録{i % 10}" for i in range(chars // 6 + 1))[:chars]
+    for end in range(chunk, len(text) + chunk, chunk):
+        piece = text[end - chunk : end] if partial else text[:end]
+        events.append(_event([types.Part(text=piece)], partial=partial))
+    if partial:
+        # ストリーミングモードでは最後に集約済みの全文が届く
+        events.append(_event([types.Part(text=text)]))
+    return events
+
+
+def legacy(events: list[Event]) -> int:
+    """変更前のルーター内ループ相当。送出した差分の文字数を返す。"""
+    sent = 0
+    accumulated_text = ""
+    pending_tool_calls: dict[str, str] = {}
+    for event in events:
+        if event.content and event.content.parts:
+            for part in event.content.parts:
+                if hasattr(part, "function_call") and part.function_call:
+                    fc = part.function_call
+                    tool_name = getattr(fc, "name", "unknown")
+                    tool_id = getattr(fc, "id", f"tc_{int(time.time() * 1000)}")
+                    pending_tool_calls[tool_id] = tool_name
+                    json.dumps({"tool_name": tool_name, "tool_call_id": tool_id})
+                if hasattr(part, "function_response") and part.function_response:
+                    fr = part.function_response
+                    tool_id = getattr(fr, "id", None)
+                    tool_name = getattr(fr, "name", None)
+                    result = getattr(fr, "response", {})
+                    if not tool_id and tool_name:
+                        for tid, tname in pending_tool_calls.items():
+                            if tname == tool_name:
+                                tool_id = tid
+                                break
+                    if tool_id:
+                        json.dumps({"tool_call_id": tool_id, "result": result})
+                        pending_tool_calls.pop(tool_id, None)
+        if event.content and event.content.parts:
+            for part in event.content.parts:
+                if part.text:
+                    new_text = part.text
+                    if new_text != accumulated_text:
+                        delta = (
+                            new_text[len(accumulated_text) :]
+                            if new_text.startswith(accumulated_text)
+                            else new_text
+                        )
+                        if delta:
+                            json.dumps({"delta": delta})
+                            sent += len(delta)
+                        accumulated_text = new_text
+    return sent
+
+
+def translated(events: list[Event]) -> int:
+    """StreamTranslator（差分はまとめ送りしない最悪ケースとして1件ずつエンコード）。"""
+    sent = 0
+    translator = StreamTranslator()
+    for event in events:
+        for item in translator.translate(event):
+            if isinstance(item, TextDelta):
+                encode_delta(item.text)
+                sent += len(item.text)
+    return sent
+
+
+def best_of(func, events: list[Event], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(events)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chars", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--events", type=Path, help="記録済みイベント列（JSONL）")
+    parser.add_argument("--record", type=Path, help="合成したイベント列の保存先（JSONL）")
+    args = parser.parse_args()
+
+    if args.events:
+        lines = args.events.read_text(encoding="utf-8").splitlines()
+        streams = {args.events.name: [Event.model_validate_json(line) for line in lines]}
+    else:
+        streams = {
+            "cumulative": synthesize(args.chars, args.chunk, partial=False),
+            "partial": synthesize(args.chars, args.chunk, partial=True),
+        }
+    if args.record:
+        events = next(iter(streams.values()))
+        args.record.write_text(
+            "\n".join(e.model_dump_json(exclude_none=True) for e in events), encoding="utf-8"
+        )
+
+    for name, events in streams.items():
+        baseline = best_of(legacy, events, args.repeat)
+        current = best_of(translated, events, args.repeat)
+        print(f"[{name}] events: {len(events)}")
+        print(f"  legacy loop:      {baseline * 1e3:9.2f} ms")
+        print(f"  StreamTranslator: {current * 1e3:9.2f} ms")
+        print(f"  speedup: {baseline / current:.1f}x")
+        # 従来のループは部分イベントの後の集約イベントで全文を再送してしまう
+        print(f"  delta chars sent: legacy {legacy(events)} / translator {translated(events)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,11 @@ from knowva.agents.mentor.tools import (
     get_mentor_context,
     save_mentor_feedback,
 )
+from knowva.services.llm_backend import agent_model
 
 mentor_agent = LlmAgent(
     name="mentor_agent",
-    model="gemini-3-flash-preview",
+    model=agent_model("gemini-3-flash-preview", "mentor_agent"),
     instruction="""あなたはユーザーの読書活動をサポートする「メンター」AIアシスタントです。
 ユーザーの読書履歴、気づき（Insight）、プロファイル情報をもとに、
 ポジティブで励みになる振り返りコメントと、次のステップへのアドバイスを提供してください。
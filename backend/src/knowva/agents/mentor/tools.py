@@ -4,7 +4,7 @@ from datetime import datetime, timedelta, timezone
 
 from google.adk.tools import ToolContext
 
-from knowva.services import firestore
+from knowva.services import firestore, mentor_context
 
 
 async def get_mentor_context(
@@ -27,10 +27,9 @@ async def get_mentor_context(
     if not user_id:
         return {"status": "error", "error_message": "User context not found"}
 
-    context = await firestore.get_mentor_context(
-        user_id=user_id,
-        period_days=period_days,
-    )
+    context, activity = await mentor_context.get_mentor_context(user_id, period_days)
+    # 保存するフィードバックに、生成に使った活動のフィンガープリントを記録する
+    tool_context.state[mentor_context.state_key(period_days)] = activity
     return {"status": "success", "context": context}
 
 
@@ -56,10 +55,8 @@ async def save_mentor_feedback(
 
     # 期間の計算
     now = datetime.now(timezone.utc)
-    if feedback_type == "weekly":
-        period_start = now - timedelta(days=7)
-    else:
-        period_start = now - timedelta(days=30)
+    period_days = mentor_context.FEEDBACK_PERIOD_DAYS.get(feedback_type, 30)
+    period_start = now - timedelta(days=period_days)
 
     result = await firestore.save_mentor_feedback(
         user_id=user_id,
@@ -68,6 +65,7 @@ async def save_mentor_feedback(
             "content": content,
             "period_start": period_start,
             "period_end": now,
+            "activity_fingerprint": tool_context.state.get(mentor_context.state_key(period_days)),
         },
     )
     return {"status": "success", "feedback_id": result["id"]}
@@ -5,10 +5,11 @@ from knowva.agents.onboarding.tools import (
     get_current_entries,
     save_profile_entry,
 )
+from knowva.services.llm_backend import agent_model
 
 onboarding_agent = LlmAgent(
     name="onboarding_agent",
-    model="gemini-3-flash-preview",
+    model=agent_model("gemini-3-flash-preview", "onboarding_agent"),
     instruction="""あなたはユーザーの読書プロファイルを充実させる「聞き上手」なAIアシスタントです。
 対話を通じて、ユーザーの目標、興味、読みたい本などを自然に聞き出してください。
 
@@ -11,6 +11,7 @@ from google.adk.agents import LlmAgent
 
 from knowva.agents.onboarding.agent import onboarding_agent
 from knowva.agents.reading.agent import reading_agent
+from knowva.services.llm_backend import agent_model
 
 # TODO(phase2): 推薦エージェント追加時にimport
 # from knowva.agents.recommendation.agent import recommendation_agent
@@ -18,7 +19,7 @@ from knowva.agents.reading.agent import reading_agent
 
 root_orchestrator_agent = LlmAgent(
     name="root_orchestrator",
-    model="gemini-3-flash-preview",
+    model=agent_model("gemini-3-flash-preview", "root_orchestrator"),
     instruction="""あなたはKnowvaアプリケーションのオーケストレーターエージェントです。
 
 ユーザーのリクエストを適切なサブエージェントに振り分けます。
@@ -8,10 +8,11 @@ from google.adk.agents import LlmAgent
 from google.adk.tools import FunctionTool, google_search
 
 from knowva.agents.reading.book_guide.tools import get_book_info
+from knowva.services.llm_backend import agent_model
 
 book_guide_agent = LlmAgent(
     name="book_guide_agent",
-    model="gemini-3-flash-preview",
+    model=agent_model("gemini-3-flash-preview", "book_guide_agent"),
     description="本の内容・背景・解説などの専門的な質問に回答するサブエージェント。難しい概念の解説、時代背景、著者の意図などを説明する。",
     instruction="""あなたは読書をサポートする専門知識エージェントです。
 ユーザーが読んでいる本について、専門的な質問に答えます。
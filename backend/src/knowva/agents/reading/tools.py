@@ -1,6 +1,6 @@
 from google.adk.tools import ToolContext
 
-from knowva.services import badge_service, firestore
+from knowva.services import badge_service, firestore, mood_analytics, reading_context
 
 
 async def save_insight(
@@ -59,10 +59,9 @@ async def get_reading_context(tool_context: ToolContext) -> dict:
     """現在の読書記録のコンテキスト情報を取得する。
 
     読書の背景情報（書籍タイトル、著者、読書状況、動機など）とセッションタイプ、
-    ユーザー設定（対話モード）を参照するために使う。
-    最初のメッセージで必ず呼び出すこと。
-
-    book_idが存在する場合は、/booksコレクションから本の詳細情報（概要など）も取得する。
+    ユーザー設定（対話モード）、本の詳細情報（概要など）を返す。
+    通常はセッション作成時にstateへ事前取得済みのため、その内容をそのまま返す。
+    stateに無い場合のみFirestoreから取得してstateに格納する。
 
     Args:
         tool_context: ツール実行コンテキスト（セッション情報を含む）。
@@ -70,32 +69,28 @@ async def get_reading_context(tool_context: ToolContext) -> dict:
     Returns:
         dict: 読書コンテキスト、セッションタイプ、ユーザー設定、本の詳細情報を含む。
     """
-    user_id = tool_context.session.state.get("user_id")
-    reading_id = tool_context.session.state.get("reading_id")
-    session_type = tool_context.session.state.get("session_type")
+    user_id = tool_context.state.get("user_id")
+    reading_id = tool_context.state.get("reading_id")
+    session_type = tool_context.state.get("session_type")
 
     if not user_id or not reading_id:
         return {"status": "error", "error_message": "Session context not found"}
 
-    result = await firestore.get_reading(user_id=user_id, reading_id=reading_id)
-
-    # ユーザー設定を取得
-    user_settings = await firestore.get_user_settings(user_id)
+    if tool_context.state.get("reading_context") is None:
+        context = await reading_context.load_reading_context(user_id, reading_id, session_type)
+        if not context:
+            return {"status": "error", "error_message": "Reading not found"}
+        for key, value in context.items():
+            tool_context.state[key] = value
 
-    if result:
-        # book_idがある場合は/booksから詳細情報（description等）を取得
-        book_details = None
-        if result.get("book_id"):
-            book_details = await firestore.get_book(result["book_id"])
-
-        return {
-            "status": "success",
-            "context": result,
-            "session_type": session_type or "during_reading",
-            "user_settings": user_settings,
-            "book_details": book_details,  # 本の詳細情報（description, isbn等）
-        }
-    return {"status": "error", "error_message": "Reading not found"}
+    return {
+        "status": "success",
+        "context": tool_context.state.get("reading_context"),
+        "session_type": session_type or "during_reading",
+        "user_settings": tool_context.state.get("user_settings"),
+        # 本の詳細情報（description, isbn等）
+        "book_details": tool_context.state.get("book_details"),
+    }
 
 
 async def save_mood(
@@ -159,6 +154,7 @@ async def save_mood(
     }
 
     result = await firestore.save_mood(user_id, reading_id, data)
+    mood_analytics.invalidate(user_id)
 
     # バッジ判定（心境記録）
     await badge_service.check_onboarding_badges(user_id)
@@ -194,6 +190,15 @@ async def update_reading_status(
 
     result = await firestore.update_reading(user_id, reading_id, {"status": new_status})
     if result:
+        # 事前取得したコンテキストも更新し、以降のターンのinstructionに反映する
+        if tool_context.state.get("reading_context") is not None:
+            tool_context.state["reading_context"] = result
+            tool_context.state["reading_context_text"] = reading_context.format_reading_context(
+                result,
+                tool_context.state.get("book_details"),
+                tool_context.state.get("user_settings") or {},
+                tool_context.state.get("session_type") or "during_reading",
+            )
         # バッジ判定（ステータス変更時）
         await badge_service.check_reading_badges(user_id)
         return {"status": "success", "new_status": new_status}
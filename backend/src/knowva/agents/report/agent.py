@@ -8,10 +8,11 @@ from knowva.agents.report.tools import (
     save_action_plan,
     save_report,
 )
+from knowva.services.llm_backend import agent_model
 
 report_agent = LlmAgent(
     name="report_agent",
-    model="gemini-3-flash-preview",
+    model=agent_model("gemini-3-flash-preview", "report_agent"),
     instruction="""あなたは読書体験を構造化された「美しい読書レポート」にまとめるAIアシスタントです。
 ユーザーの対話履歴、気づき（Insight）、プロファイル情報をもとに、
 読書から得た学びを体系化し、具体的なアクションプランを提案します。
@@ -94,6 +95,8 @@ source_insight_id: "insight_xxx"（該当するInsightがあれば）
 ## 注意事項
 - 日本語で出力
 - Insightがない場合や少ない場合は、対話履歴（messages）から学びを抽出して構造化
+- 長いセッションは要約（sessions の conversation_summary）とそれ以降の対話履歴のみが含まれる。
+  両方を合わせて対話全体として扱う
 - プロファイルが空の場合は、一般的な自己成長の観点でアクションプランを生成
 - ポジティブで励みになるトーンを維持
 - ユーザーの言葉を尊重し、押し付けがましくならないように
@@ -4,7 +4,7 @@ from typing import Optional
 
 from google.adk.tools import ToolContext
 
-from knowva.services import firestore
+from knowva.services import firestore, report_fingerprint
 
 
 async def get_report_context(tool_context: ToolContext) -> dict:
@@ -68,6 +68,8 @@ async def save_report(
                 "insight_count": context.get("summary", {}).get("insight_count", 0),
                 "generation_model": "gemini-3-flash-preview",
             },
+            # 生成開始時点の入力のフィンガープリント（変化がなければ次回の生成を省略する）
+            "input_fingerprint": tool_context.state.get(report_fingerprint.STATE_KEY),
         },
     )
     return {"status": "success", "report_id": result["id"]}
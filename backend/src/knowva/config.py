@@ -19,6 +19,58 @@ class Settings(BaseSettings):
     rate_limit_default: str = "60/minute"
     rate_limit_ai_endpoints: str = "10/minute;100/hour"
 
+    # LLM呼び出しの並行数制御（インスタンスごと）
+    llm_max_concurrency: int = 8
+    llm_max_queue: int = 32
+    llm_queue_timeout_seconds: float = 15.0
+
+    # SSEの再接続（Last-Event-ID）用リプレイバッファ
+    sse_replay_buffer_size: int = 1000
+    sse_detach_grace_seconds: float = 30.0
+    sse_stream_retention_seconds: float = 300.0
+    sse_replay_spill_to_firestore: bool = False
+
+    # SSEの送出（待機中のハートビートとテキスト差分のまとめ送り）
+    sse_heartbeat_seconds: float = 15.0
+    sse_delta_coalesce_seconds: float = 0.05
+    sse_delta_coalesce_max_chars: int = 512
+
+    # セッション要約のバックグラウンド処理
+    summary_concurrency: int = 2
+    summary_max_retries: int = 3
+    summary_retry_base_seconds: float = 5.0
+    # 1回のプロンプトに含める対話の最大文字数（超える場合は分割して要約する）
+    summary_chunk_chars: int = 8000
+    # 対話中のローリング要約（N件ごとに更新。0で無効）
+    session_rolling_summary_interval: int = 10
+    session_rolling_summary_max_chars: int = 600
+    # ローリング要約があるセッションの復元時に、そのまま渡す直近のメッセージ数
+    session_restore_recent_messages: int = 10
+
+    # LLMバックエンド（"gemini" | "fake" | "record" | "replay"。services/llm_backend.py 参照）
+    llm_backend: str = "gemini"
+    fake_llm_script: str = ""  # FakeLlm のスクリプト（JSON）のパス。空なら既定の応答
+    fake_llm_chunk_chars: int = 20
+    fake_llm_chunk_delay_seconds: float = 0.02
+    fake_llm_tool_latency_seconds: float = 0.1
+    llm_trace_path: str = "llm_traces.jsonl"
+
+    # メンターの振り返り（活動に変化がなければ直近のフィードバックを再利用する）
+    mentor_feedback_reuse_hours: float = 24.0
+    mentor_context_cache_seconds: float = 3600.0
+
+    # エンドポイントのFirestore操作予算（超過時は警告。テストでは有効にして失敗させる）
+    firestore_budget_enforce: bool = False
+
+    # /metrics の取得に要求するトークン（Authorization: Bearer）。
+    # 空の場合、/metrics はエミュレーター利用時（ローカル）のみ公開する
+    metrics_token: str = ""
+
+    # トレーシング（"" | "memory" | "otlp"。services/tracing.py 参照）
+    tracing_exporter: str = ""
+    tracing_sample_ratio: float = 1.0
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8", "extra": "ignore"}
 
     @field_validator("allowed_origins", mode="after")
@@ -3,6 +3,7 @@ import os
 from google.cloud import firestore
 
 from knowva.config import settings
+from knowva.services import firestore_ops
 
 _firestore_client: firestore.AsyncClient | None = None
 
@@ -12,5 +13,7 @@ def get_firestore_client() -> firestore.AsyncClient:
     if _firestore_client is None:
         if settings.use_emulator:
             os.environ["FIRESTORE_EMULATOR_HOST"] = settings.firestore_emulator_host
-        _firestore_client = firestore.AsyncClient(project=settings.google_cloud_project)
+        _firestore_client = firestore_ops.instrument(
+            firestore.AsyncClient(project=settings.google_cloud_project)
+        )
     return _firestore_client
@@ -0,0 +1,5 @@
+"""定期実行するバッチジョブ。
+
+各モジュールは `python -m knowva.jobs.<name>` で実行する
+（Cloud Run ジョブ・Cloud Scheduler から起動する）。
+"""
@@ -0,0 +1,261 @@
+"""週次・月次のメンターフィードバックを一括生成するバッチジョブ。
+
+ユーザーがメンターを開いたときに生成を待たせないよう、期間内に活動のあったユーザーの
+振り返りを事前に生成して mentorFeedbacks に保存する。
+
+- 対象ユーザーはインデックス（readings.updated_at / users.activity.updated_at）で絞り込む
+- コンテキストの構築は --context-concurrency 件ずつ並行に行い、
+  生成（LLM呼び出し）は --llm-concurrency 件に制限する
+- 前回のフィードバックから活動に変化がないユーザーは生成しない（"unchanged"）
+- 生成したフィードバックには batch_job_id を記録する。同じジョブIDで再実行すると
+  生成済みのユーザーを飛ばして再開する。進捗は batchJobs/{job_id} に定期的に書き出す
+
+使い方:
+    python -m knowva.jobs.mentor_feedback_batch [--feedback-type weekly] [--job-id ID]
+        [--context-concurrency 8] [--llm-concurrency 2] [--limit N] [--dry-run]
+        [--stub-model] [--stub-latency 0.5]
+
+ローカルでは USE_EMULATOR=true（デフォルト）で Firestore エミュレーターに接続し、
+--stub-model でLLMを呼ばずに固定の文章を生成して動作と処理速度を確認できる。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from google.cloud.firestore import AsyncClient
+
+from knowva.dependencies import get_firestore_client
+from knowva.services import firestore, llm_backend, mentor_context
+from knowva.services.sse_emitter import encode_json
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_MODEL = "gemini-3-flash-preview"
+JOB_COLLECTION = "batchJobs"
+
+# 進捗を書き出す間隔（処理したユーザー数）
+_CHECKPOINT_EVERY = 20
+
+_FEEDBACK_PROMPT = """あなたはユーザーの読書活動をサポートする「メンター」です。
+以下は{period_label}のユーザーの読書記録・気づき（Insight）・プロファイルです。
+これをもとに、ポジティブで励みになる振り返りコメントを日本語で書いてください。
+
+構成:
+1. 称賛: 読んだ本や記録したInsightに具体的に触れて、頑張りを褒める
+2. 気づきの振り返り（任意）: 印象的なInsightを取り上げ、学びを言語化する
+3. アドバイス: 目標や興味に関連づけた、具体的で実行可能な次のステップを
+   「次は○○してみませんか？」の形で提案する
+
+データが少ない場合は、読書を続けることを優しく提案してください。
+振り返りコメントのみを返してください。
+
+コンテキスト:
+{context}
+
+振り返りコメント:"""
+
+_PERIOD_LABELS = {"weekly": "この1週間", "monthly": "この1カ月"}
+
+Generate = Callable[[str], Awaitable[str]]
+
+
+async def generate_with_model(prompt: str) -> str:
+    """設定されたLLMバックエンドで振り返りを生成する。"""
+    return await llm_backend.generate_text(FEEDBACK_MODEL, prompt, "mentor_feedback_batch")
+
+
+def stub_model(latency: float = 0.0) -> Generate:
+    """LLMを呼ばずに固定の文章を返す生成関数（ローカル検証用）。"""
+
+    async def generate(prompt: str) -> str:
+        if latency:
+            await asyncio.sleep(latency)
+        return (
+            f"（スタブ）読書を続けられましたね。次は気づきを記録してみませんか？（{len(prompt)}）"
+        )
+
+    return generate
+
+
+class MentorFeedbackBatch:
+    """期間内に活動のあったユーザーの振り返りを生成するジョブ。"""
+
+    def __init__(
+        self,
+        feedback_type: str,
+        job_id: str,
+        generate: Generate = generate_with_model,
+        context_concurrency: int = 8,
+        llm_concurrency: int = 2,
+        dry_run: bool = False,
+    ):
+        self.feedback_type = feedback_type
+        self.period_days = mentor_context.FEEDBACK_PERIOD_DAYS[feedback_type]
+        self.job_id = job_id
+        self.generate = generate
+        self.dry_run = dry_run
+        self._context_semaphore = asyncio.Semaphore(context_concurrency)
+        self._llm_semaphore = asyncio.Semaphore(llm_concurrency)
+        # 生成待ちで保持するコンテキストの数を抑える（構築がLLMより速く進みすぎないように）
+        self._inflight = asyncio.Semaphore(context_concurrency + llm_concurrency)
+        self.counts = {"users": 0, "generated": 0, "unchanged": 0, "resumed": 0, "failed": 0}
+        self._processed = 0
+
+    def _checkpoint_ref(self):
+        db: AsyncClient = get_firestore_client()
+        return db.collection(JOB_COLLECTION).document(self.job_id)
+
+    async def _checkpoint(self, status: str) -> None:
+        if self.dry_run:
+            return
+        await self._checkpoint_ref().set(
+            {
+                "job": "mentor_feedback",
+                "feedback_type": self.feedback_type,
+                "status": status,
+                "counts": dict(self.counts),
+                "updated_at": datetime.now(timezone.utc),
+            },
+            merge=True,
+        )
+
+    async def _process_user(self, user_id: str) -> str:
+        """1ユーザーを処理し、結果（counts のキー）を返す。"""
+        async with self._context_semaphore:
+            feedbacks = await firestore.list_mentor_feedbacks(user_id, limit=10)
+            latest = next(
+                (f for f in feedbacks if f.get("feedback_type") == self.feedback_type), None
+            )
+            if latest and latest.get("batch_job_id") == self.job_id:
+                return "resumed"
+            context, activity = await mentor_context.get_mentor_context(user_id, self.period_days)
+            if latest and latest.get("activity_fingerprint") == activity:
+                return "unchanged"
+
+        if self.dry_run:
+            return "generated"
+
+        prompt = _FEEDBACK_PROMPT.format(
+            period_label=_PERIOD_LABELS[self.feedback_type], context=encode_json(context)
+        )
+        async with self._llm_semaphore:
+            content = await self.generate(prompt)
+        if not content:
+            raise ValueError("empty feedback")
+
+        now = datetime.now(timezone.utc)
+        await firestore.save_mentor_feedback(
+            user_id=user_id,
+            data={
+                "feedback_type": self.feedback_type,
+                "content": content,
+                "period_start": now - timedelta(days=self.period_days),
+                "period_end": now,
+                "activity_fingerprint": activity,
+                "batch_job_id": self.job_id,
+            },
+        )
+        return "generated"
+
+    async def _run_one(self, user_id: str) -> None:
+        try:
+            async with self._inflight:
+                result = await self._process_user(user_id)
+        except Exception as e:
+            logger.warning(f"Mentor feedback failed for {user_id}: {e}")
+            result = "failed"
+        self.counts[result] += 1
+        self._processed += 1
+        if self._processed % _CHECKPOINT_EVERY == 0:
+            await self._checkpoint("running")
+
+    async def run(self, user_ids: list[str]) -> dict:
+        """ユーザーごとの処理を並行に実行し、件数と処理速度を返す。"""
+        self.counts["users"] = len(user_ids)
+        await self._checkpoint("running")
+        started = time.perf_counter()
+        await asyncio.gather(*(self._run_one(user_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - started
+        await self._checkpoint("completed")
+        return {
+            "job_id": self.job_id,
+            **self.counts,
+            "elapsed_seconds": round(elapsed, 3),
+            "users_per_second": round(len(user_ids) / elapsed, 2) if elapsed else None,
+            "feedbacks_per_second": round(self.counts["generated"] / elapsed, 2)
+            if elapsed
+            else None,
+        }
+
+
+async def run_batch(
+    feedback_type: str = "weekly",
+    job_id: Optional[str] = None,
+    generate: Generate = generate_with_model,
+    context_concurrency: int = 8,
+    llm_concurrency: int = 2,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+) -> dict:
+    """期間内に活動のあったユーザーを集め、振り返りを一括生成する。"""
+    now = datetime.now(timezone.utc)
+    job_id = job_id or f"mentor_{feedback_type}_{now:%Y%m%d}"
+    period_days = mentor_context.FEEDBACK_PERIOD_DAYS[feedback_type]
+
+    user_ids = await firestore.list_active_user_ids(now - timedelta(days=period_days))
+    if limit is not None:
+        user_ids = user_ids[:limit]
+
+    batch = MentorFeedbackBatch(
+        feedback_type,
+        job_id,
+        generate=generate,
+        context_concurrency=context_concurrency,
+        llm_concurrency=llm_concurrency,
+        dry_run=dry_run,
+    )
+    results = await batch.run(user_ids)
+    logger.info(f"mentor feedback batch: {results}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--feedback-type", choices=["weekly", "monthly"], default="weekly")
+    parser.add_argument(
+        "--job-id", default=None, help="再開するジョブのID（デフォルトは種類+日付）"
+    )
+    parser.add_argument(
+        "--context-concurrency", type=int, default=8, help="コンテキスト構築の並行数"
+    )
+    parser.add_argument("--llm-concurrency", type=int, default=2, help="LLM呼び出しの並行数")
+    parser.add_argument("--limit", type=int, default=None, help="処理するユーザー数の上限")
+    parser.add_argument("--dry-run", action="store_true", help="生成・保存せず件数のみ表示")
+    parser.add_argument("--stub-model", action="store_true", help="LLMを呼ばずに固定の文章を生成")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="スタブの応答時間（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    generate = stub_model(args.stub_latency) if args.stub_model else generate_with_model
+    results = asyncio.run(
+        run_batch(
+            feedback_type=args.feedback_type,
+            job_id=args.job_id,
+            generate=generate,
+            context_concurrency=args.context_concurrency,
+            llm_concurrency=args.llm_concurrency,
+            limit=args.limit,
+            dry_run=args.dry_run,
+        )
+    )
+    print(json.dumps(results, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
-from fastapi import FastAPI
+import hmac
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
 from knowva.config import settings  # noqa: F401 (環境変数設定を含むため最初にimport)
+from knowva.middleware.metrics import MetricsMiddleware
 from knowva.middleware.rate_limit import limiter
+from knowva.middleware.server_timing import ServerTimingMiddleware
 from knowva.routers import (
     badges,
     books,
@@ -18,10 +24,25 @@ from knowva.routers import (
     sessions,
     timeline,
 )
+from knowva.services import agent_registry, metrics, session_summary, tracing
+from knowva.services.llm_scheduler import LLMOverloadedError, llm_overloaded_handler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracing.setup_tracing()
+    # Runner・genai.Client はプロセス内で一度だけ生成して共有する
+    await agent_registry.startup()
+    yield
+    await session_summary.shutdown()
+    await agent_registry.shutdown()
+    tracing.shutdown_tracing()
+
 
-app = FastAPI(title="Knowva API", version="0.1.0")
+app = FastAPI(title="Knowva API", version="0.1.0", lifespan=lifespan)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(LLMOverloadedError, llm_overloaded_handler)
 
 app.add_middleware(SlowAPIMiddleware)
 app.add_middleware(
@@ -31,6 +52,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# ルートごとのレイテンシと処理中リクエスト数（/metrics）
+app.add_middleware(MetricsMiddleware)
+# リクエストごとのFirestore操作数（最も外側で全体を計測する）
+app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(badges.router, prefix="/api/badges", tags=["badges"])
 app.include_router(books.router, prefix="/api/books", tags=["books"])
@@ -48,3 +73,21 @@ app.include_router(timeline.router, prefix="/api/timeline", tags=["timeline"])
 @limiter.exempt
 async def health_check():
     return {"status": "ok", "version": "0.1.0"}
+
+
+@app.get("/metrics", include_in_schema=False)
+@limiter.exempt
+async def prometheus_metrics(request: Request):
+    """Prometheus形式のメトリクス（内部向け）。
+
+    METRICS_TOKEN を設定した場合は Bearer トークンを要求する。未設定の場合は
+    エミュレーター利用時（ローカル開発）のみ公開し、本番では存在しないものとして扱う。
+    """
+    if not settings.metrics_token:
+        if not settings.use_emulator:
+            raise HTTPException(status_code=404, detail="Not Found")
+    else:
+        expected = f"Bearer {settings.metrics_token}"
+        if not hmac.compare_digest(request.headers.get("authorization", ""), expected):
+            raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,41 @@
+"""ルートごとのレイテンシと処理中リクエスト数を記録するミドルウェア。"""
+
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from knowva.services import metrics
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.HTTP_REQUESTS_IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.HTTP_REQUESTS_IN_FLIGHT.dec(method)
+            # ラベルにはパスそのものではなくルートのテンプレートを使う（IDを含めない）
+            route = scope.get("route")
+            metrics.HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method,
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
@@ -0,0 +1,72 @@
+"""リクエストごとのFirestore操作数を Server-Timing ヘッダーとログに出すミドルウェア。
+
+ヘッダーはレスポンス開始時点の件数になる（SSEではストリーム開始前の分のみ）。
+ログはレスポンスの送信完了後に出すため、ストリームの生成中の操作も含む。
+エンドポイントに宣言された予算（firestore_ops.budget）を超えた場合は警告を出し、
+settings.firestore_budget_enforce が有効なら firestore_ops.FirestoreBudgetExceededError を送出する。
+"""
+
+import logging
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from knowva.config import settings
+from knowva.services import firestore_ops
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 0
+
+        with firestore_ops.track() as ops:
+
+            async def send_with_timing(message: Message) -> None:
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    duration_ms = (time.perf_counter() - started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append(
+                        (b"server-timing", firestore_ops.server_timing(ops, duration_ms).encode())
+                    )
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        route = scope.get("route")
+        path = getattr(route, "path", scope["path"])
+        logger.info(
+            f"firestore_ops {scope['method']} {path} status={status} "
+            + " ".join(f"{k}={v}" for k, v in ops.as_dict().items())
+            + f" duration_ms={duration_ms:.1f}",
+            extra={
+                "http_method": scope["method"],
+                "http_route": path,
+                "http_status": status,
+                "duration_ms": round(duration_ms, 1),
+                "firestore_ops": ops.as_dict(),
+            },
+        )
+
+        declared = firestore_ops.get_budget(scope.get("endpoint"))
+        violations = declared.violations(ops) if declared else []
+        if violations:
+            message = f"Firestore budget exceeded: {scope['method']} {path}: " + ", ".join(
+                violations
+            )
+            logger.warning(message)
+            if settings.firestore_budget_enforce:
+                raise firestore_ops.FirestoreBudgetExceededError(message)
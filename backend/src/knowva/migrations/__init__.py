@@ -0,0 +1,4 @@
+"""Firestoreデータ移行スクリプト。
+
+各モジュールは `python -m knowva.migrations.<name>` で実行する。
+"""
@@ -0,0 +1,70 @@
+"""セッションの message_count を実際のメッセージ数で補完する移行スクリプト。
+
+message_count はメッセージ保存時に1ずつ増やしているが、それ以前に作成された
+セッションには設定されていない。ローリング要約の更新判定は message_count と
+rolling_summary_count（要約済みのメッセージ数）の差で行うため、
+messages サブコレクションを count() で数えて書き込む。
+
+対話中のセッションでは保存と競合して値がずれることがあるため、
+利用の少ない時間帯に実行する。
+
+使い方:
+    python -m knowva.migrations.backfill_message_counts [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+
+from google.cloud.firestore import AsyncClient
+
+from knowva.dependencies import get_firestore_client
+from knowva.services.firestore import BATCH_WRITE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate(dry_run: bool = False) -> dict:
+    """全セッションの message_count を実際のメッセージ数に合わせる。"""
+    db: AsyncClient = get_firestore_client()
+
+    counts = {"updated": 0, "already_counted": 0}
+    batch = db.batch()
+    pending = 0
+
+    async for doc in db.collection_group("sessions").stream():
+        data = doc.to_dict() or {}
+        result = await doc.reference.collection("messages").count().get()
+        message_count = int(result[0][0].value)
+        if data.get("message_count") == message_count:
+            counts["already_counted"] += 1
+            continue
+
+        if pending >= BATCH_WRITE_LIMIT:
+            if not dry_run:
+                await batch.commit()
+            batch = db.batch()
+            pending = 0
+        batch.update(doc.reference, {"message_count": message_count})
+        pending += 1
+        counts["updated"] += 1
+
+    if pending and not dry_run:
+        await batch.commit()
+
+    logger.info(f"message counts: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="書き込まずに件数のみ表示")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(migrate(dry_run=args.dry_run))
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
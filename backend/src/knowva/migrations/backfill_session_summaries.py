@@ -0,0 +1,110 @@
+"""要約のない過去のセッションに要約を生成する移行スクリプト。
+
+summary が未設定のセッション（終了済み、または開始から一定時間が経過したもの）を
+collection group クエリで集め、要約パイプラインで並行数を制限して生成する。
+プロセス停止で "pending" のまま残ったセッションもここで拾い直す。
+LLMへの負荷を抑えるため、ジョブの登録は --rate 件/秒 に間引く。
+
+使い方:
+    python -m knowva.migrations.backfill_session_summaries [--dry-run] [--limit N]
+        [--rate 0.5] [--concurrency 2] [--min-age-hours 24]
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from google.cloud.firestore import AsyncClient
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from knowva.config import settings
+from knowva.dependencies import get_firestore_client
+from knowva.services.session_summary import STATUS_COMPLETED, SummaryPipeline
+
+logger = logging.getLogger(__name__)
+
+
+async def migrate(
+    dry_run: bool = False,
+    limit: int | None = None,
+    rate: float = 0.5,
+    concurrency: int = 2,
+    min_age_hours: float = 24.0,
+) -> dict:
+    """要約のないセッションを要約する。"""
+    db: AsyncClient = get_firestore_client()
+    # 終了していないセッションは、対話中の可能性がある間は対象にしない
+    started_before = datetime.now(timezone.utc) - timedelta(hours=min_age_hours)
+    pipeline = SummaryPipeline(
+        concurrency=concurrency,
+        max_retries=settings.summary_max_retries,
+        retry_base_seconds=settings.summary_retry_base_seconds,
+    )
+
+    counts = {"queued": 0, "skipped_active": 0, "skipped_completed": 0}
+    targets: list[tuple[str, str, str]] = []
+    query = db.collection_group("sessions").where(filter=FieldFilter("summary", "==", None))
+    async for doc in query.stream():
+        if limit is not None and len(targets) >= limit:
+            break
+        data = doc.to_dict() or {}
+        if data.get("summary_status") == STATUS_COMPLETED:
+            # メッセージがなく要約不要と判定済み
+            counts["skipped_completed"] += 1
+            continue
+        started_at = data.get("started_at")
+        if not data.get("ended_at") and (started_at is None or started_at > started_before):
+            counts["skipped_active"] += 1
+            continue
+        # users/{user_id}/readings/{reading_id}/sessions/{session_id}
+        _, user_id, _, reading_id, _, session_id = doc.reference.path.split("/")
+        targets.append((user_id, reading_id, session_id))
+    counts["queued"] = len(targets)
+
+    # 対象を先に集めてから、間引きながら登録する（クエリのストリームを長時間保持しない）
+    for i, target in enumerate(targets):
+        if dry_run:
+            break
+        if i and rate > 0:
+            await asyncio.sleep(1 / rate)
+        pipeline.enqueue(*target)
+
+    if not dry_run:
+        await pipeline.join()
+        await pipeline.shutdown()
+        counts.update(completed=pipeline.completed, failed=pipeline.failed)
+
+    logger.info(f"session summaries: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="要約を生成せず件数のみ表示")
+    parser.add_argument("--limit", type=int, default=None, help="処理するセッション数の上限")
+    parser.add_argument("--rate", type=float, default=0.5, help="1秒あたりの登録件数（0で無制限）")
+    parser.add_argument("--concurrency", type=int, default=2, help="同時に要約するセッション数")
+    parser.add_argument(
+        "--min-age-hours",
+        type=float,
+        default=24.0,
+        help="未終了のセッションを対象にするまでの経過時間",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(
+        migrate(
+            dry_run=args.dry_run,
+            limit=args.limit,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            min_age_hours=args.min_age_hours,
+        )
+    )
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""心境記録を moods/{mood_type} のキー付きドキュメントに集約する移行スクリプト。
+
+旧実装ではランダムIDで作成しており、同時保存により同じ mood_type の
+レコードが重複することがあった。読書記録ごと・mood_typeごとに最新の1件
+（updated_at が最も新しいもの）を残して moods/{mood_type} に書き込み、残りを削除する。
+あわせて、コレクショングループクエリ用の user_id フィールドを補完する。
+
+使い方:
+    python -m knowva.migrations.collapse_moods [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from google.cloud.firestore import AsyncClient
+
+from knowva.dependencies import get_firestore_client
+from knowva.services.firestore import BATCH_WRITE_LIMIT, MOOD_TYPES
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def _freshness(doc) -> datetime:
+    data = doc.to_dict() or {}
+    return data.get("updated_at") or data.get("recorded_at") or data.get("created_at") or _EPOCH
+
+
+async def migrate(dry_run: bool = False) -> dict:
+    """全ユーザーの moods サブコレクションを集約する。"""
+    db: AsyncClient = get_firestore_client()
+
+    # (moodsコレクションのパス, mood_type) ごとにグルーピング
+    groups: dict[tuple[str, str], list] = {}
+    async for doc in db.collection_group("moods").stream():
+        mood_type = (doc.to_dict() or {}).get("mood_type")
+        if mood_type not in MOOD_TYPES:
+            logger.warning(f"{doc.reference.path} has invalid mood_type; skipped")
+            continue
+        collection_path = doc.reference.path.rsplit("/", 1)[0]
+        groups.setdefault((collection_path, mood_type), []).append(doc)
+
+    counts = {"moved": 0, "deleted_duplicates": 0, "already_keyed": 0}
+    batch = db.batch()
+    pending = 0
+
+    for (collection_path, mood_type), docs in groups.items():
+        latest = max(docs, key=_freshness)
+        stale = [d for d in docs if d.id != mood_type]
+        # コレクショングループクエリ用に user_id を補完する
+        user_id = collection_path.split("/")[1]
+        rewrite = latest.id != mood_type or latest.to_dict().get("user_id") != user_id
+        ops = len(stale) + (1 if rewrite else 0)
+        if not ops:
+            counts["already_keyed"] += 1
+            continue
+
+        if pending + ops > BATCH_WRITE_LIMIT:
+            if not dry_run:
+                await batch.commit()
+            batch = db.batch()
+            pending = 0
+
+        if rewrite:
+            batch.set(
+                db.collection(collection_path).document(mood_type),
+                {**latest.to_dict(), "user_id": user_id},
+            )
+            counts["moved"] += 1
+        else:
+            counts["already_keyed"] += 1
+        for doc in stale:
+            batch.delete(doc.reference)
+        counts["deleted_duplicates"] += len(docs) - 1
+        pending += ops
+
+    if pending and not dry_run:
+        await batch.commit()
+
+    logger.info(f"moods: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="書き込みを行わず件数のみ表示")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(migrate(dry_run=args.dry_run))
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""獲得バッジを badges/{badge_id} のキー付きドキュメントに付け替える移行スクリプト。
+
+旧実装ではランダムIDで作成し、付与前に一覧を取得して重複を確認していた。
+ユーザーごと・badge_idごとに最も早く獲得した1件を badges/{badge_id} に残し、
+残りを削除する。
+
+使い方:
+    python -m knowva.migrations.rekey_badges [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from google.cloud.firestore import AsyncClient
+
+from knowva.dependencies import get_firestore_client
+from knowva.services.firestore import BATCH_WRITE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+_FAR_FUTURE = datetime.max.replace(tzinfo=timezone.utc)
+
+
+def _earned_at(doc) -> datetime:
+    return (doc.to_dict() or {}).get("earned_at") or _FAR_FUTURE
+
+
+async def migrate(dry_run: bool = False) -> dict:
+    """全ユーザーの badges サブコレクションを付け替える。"""
+    db: AsyncClient = get_firestore_client()
+
+    # (badgesコレクションのパス, badge_id) ごとにグルーピング
+    groups: dict[tuple[str, str], list] = {}
+    async for doc in db.collection_group("badges").stream():
+        badge_id = (doc.to_dict() or {}).get("badge_id")
+        if not badge_id:
+            logger.warning(f"{doc.reference.path} has no badge_id; skipped")
+            continue
+        collection_path = doc.reference.path.rsplit("/", 1)[0]
+        groups.setdefault((collection_path, badge_id), []).append(doc)
+
+    counts = {"moved": 0, "deleted_duplicates": 0, "already_keyed": 0}
+    batch = db.batch()
+    pending = 0
+
+    for (collection_path, badge_id), docs in groups.items():
+        earliest = min(docs, key=_earned_at)
+        stale = [d for d in docs if d.id != badge_id]
+        rewrite = earliest.id != badge_id
+        ops = len(stale) + (1 if rewrite else 0)
+        if not ops:
+            counts["already_keyed"] += 1
+            continue
+
+        if pending + ops > BATCH_WRITE_LIMIT:
+            if not dry_run:
+                await batch.commit()
+            batch = db.batch()
+            pending = 0
+
+        if rewrite:
+            batch.set(db.collection(collection_path).document(badge_id), earliest.to_dict())
+            counts["moved"] += 1
+        else:
+            counts["already_keyed"] += 1
+        for doc in stale:
+            batch.delete(doc.reference)
+        counts["deleted_duplicates"] += len(docs) - 1
+        pending += ops
+
+    if pending and not dry_run:
+        await batch.commit()
+
+    logger.info(f"badges: {counts}")
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="書き込みを行わず件数のみ表示")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(migrate(dry_run=args.dry_run))
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""publicInsights / publicReports のドキュメントIDを元データのIDに揃える移行スクリプト。
+
+旧実装ではランダムIDで作成し `insight_id` / `report_id` フィールドで検索していた。
+新実装ではドキュメントID = 元のID としてキー参照するため、既存データを付け替える。
+
+使い方:
+    python -m knowva.migrations.rekey_public_mirrors [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+
+from google.cloud.firestore import AsyncClient
+
+from knowva.dependencies import get_firestore_client
+from knowva.services.firestore import BATCH_WRITE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# (コレクション名, 元データIDを保持するフィールド名)
+MIRROR_COLLECTIONS = [
+    ("publicInsights", "insight_id"),
+    ("publicReports", "report_id"),
+]
+
+
+async def rekey_collection(
+    db: AsyncClient, collection: str, key_field: str, dry_run: bool = False
+) -> dict:
+    """コレクション内のドキュメントを key_field の値をIDとするドキュメントに付け替える。
+
+    同じ元IDを持つ重複ドキュメントがある場合は、既にキー付けされたもの
+    （なければ最初に見つかったもの）を残し、それ以外は削除する。
+    """
+    groups: dict[str, list] = {}
+    async for doc in db.collection(collection).stream():
+        source_id = (doc.to_dict() or {}).get(key_field)
+        if not source_id:
+            logger.warning(f"{collection}/{doc.id} has no {key_field}; skipped")
+            continue
+        groups.setdefault(source_id, []).append(doc)
+
+    counts = {"moved": 0, "deleted_duplicates": 0, "already_keyed": 0}
+    batch = db.batch()
+    pending = 0
+
+    for source_id, docs in groups.items():
+        keyed = next((d for d in docs if d.id == source_id), None)
+        stale = [d for d in docs if d.id != source_id]
+        ops = len(stale) + (0 if keyed else 1)
+
+        # 書き込み上限を超える前にコミットする
+        if pending + ops > BATCH_WRITE_LIMIT:
+            if not dry_run:
+                await batch.commit()
+            batch = db.batch()
+            pending = 0
+
+        if keyed:
+            counts["already_keyed"] += 1
+            counts["deleted_duplicates"] += len(stale)
+        else:
+            batch.set(db.collection(collection).document(source_id), stale[0].to_dict())
+            counts["moved"] += 1
+            counts["deleted_duplicates"] += len(stale) - 1
+        for doc in stale:
+            batch.delete(doc.reference)
+        pending += ops
+
+    if pending and not dry_run:
+        await batch.commit()
+
+    return counts
+
+
+async def migrate(dry_run: bool = False) -> dict:
+    """全ての公開ミラーコレクションを付け替える。"""
+    db: AsyncClient = get_firestore_client()
+    results = {}
+    for collection, key_field in MIRROR_COLLECTIONS:
+        results[collection] = await rekey_collection(db, collection, key_field, dry_run)
+        logger.info(f"{collection}: {results[collection]}")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="書き込みを行わず件数のみ表示")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.run(migrate(dry_run=args.dry_run))
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
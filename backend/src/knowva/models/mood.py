@@ -78,3 +78,41 @@ class MoodComparisonResponse(BaseModel):
     after_mood: Optional[MoodResponse] = None
     # 変化量（afterが存在する場合のみ計算）
     changes: Optional[dict[str, int]] = None
+
+
+class MoodMetricStats(BaseModel):
+    """指標ごとの読書横断統計"""
+
+    before_mean: Optional[float] = None
+    after_mean: Optional[float] = None
+    delta_mean: Optional[float] = None
+    delta_std: Optional[float] = None
+    improved: int = 0  # after > before の読書数
+    declined: int = 0  # after < before の読書数
+    unchanged: int = 0
+    before_distribution: list[int] = Field(description="値1〜5それぞれの件数（読書前）")
+    after_distribution: list[int] = Field(description="値1〜5それぞれの件数（読書後）")
+    trend_slope_per_30_days: Optional[float] = Field(
+        default=None, description="変化量の時系列トレンド（30日あたりの傾き）"
+    )
+
+
+class MoodTrendPoint(BaseModel):
+    """読書ごとの変化量と移動平均"""
+
+    reading_id: str
+    recorded_at: datetime
+    deltas: dict[str, float]
+    rolling_deltas: dict[str, float]
+
+
+class MoodAnalyticsResponse(BaseModel):
+    """読書横断の心境分析レスポンス"""
+
+    record_count: int
+    reading_count: int
+    paired_count: int  # before/after が揃っている読書数
+    window: int  # 移動平均のウィンドウ
+    metrics: dict[str, MoodMetricStats]
+    trend: list[MoodTrendPoint]
+    computed_at: datetime
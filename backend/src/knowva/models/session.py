@@ -5,6 +5,8 @@ from pydantic import BaseModel
 
 # セッションタイプ: 読書前、読書中、読書後
 SessionType = Literal["before_reading", "during_reading", "after_reading"]
+# 要約の生成状況（セッション終了後にバックグラウンドで生成する）
+SummaryStatus = Literal["pending", "completed", "failed"]
 
 
 class SessionCreate(BaseModel):
@@ -18,3 +20,4 @@ class SessionResponse(BaseModel):
     started_at: datetime
     ended_at: Optional[datetime] = None  # 既存データの互換性のため残す
     summary: Optional[str] = None
+    summary_status: Optional[SummaryStatus] = None
@@ -4,17 +4,26 @@ import logging
 from datetime import datetime, timezone
 from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from google.adk.runners import Runner
 from google.genai import types
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from knowva.agents import mentor_agent
 from knowva.config import settings
 from knowva.middleware.firebase_auth import get_current_user
 from knowva.middleware.rate_limit import limiter
-from knowva.services import firestore
+from knowva.services import agent_registry, firestore, mentor_context
+from knowva.services.chat_stream import (
+    ERROR_TEXT,
+    NO_RESPONSE_TEXT,
+    ensure_chat_session,
+    start_chat_stream,
+)
+from knowva.services.llm_scheduler import LLMOverloadedError, Priority, get_llm_scheduler
 from knowva.services.session_service import get_session_service
+from knowva.services.sse_emitter import stream_response
+from knowva.services.stream_hub import open_stream, parse_last_event_id
 
 logger = logging.getLogger(__name__)
 
@@ -53,16 +62,81 @@ class MentorFeedbackResponse(BaseModel):
     created_at: datetime
 
 
+class MentorFeedbackGenerateRequest(BaseModel):
+    """振り返り生成リクエスト。"""
+
+    feedback_type: Literal["weekly", "monthly"] = "weekly"
+    force: bool = False
+
+
+class MentorFeedbackGenerateResponse(BaseModel):
+    """振り返り生成レスポンス。"""
+
+    message: str
+    feedback: Optional[MentorFeedbackResponse] = None
+    unchanged: bool = Field(
+        default=False, description="活動に変化がなく、既存のフィードバックを返した場合はTrue"
+    )
+
+
 # --- Helpers ---
 
 
+agent_registry.register_agent(APP_NAME, mentor_agent)
+
+
 def get_mentor_runner() -> Runner:
-    """メンターエージェント用のADK Runnerを取得する。"""
-    return Runner(
-        agent=mentor_agent,
-        app_name=APP_NAME,
-        session_service=get_session_service(),
-    )
+    """メンターエージェント用のADK Runner（プロセス内で共有）を取得する。"""
+    return agent_registry.get_runner(APP_NAME)
+
+
+# 再接続時にストリームと対応づけるスコープ
+STREAM_SCOPE = "mentor"
+
+# 振り返り生成時にエージェントへ送るメッセージ
+REFLECTION_MESSAGES = {
+    "weekly": "今週の振り返りをお願いします",
+    "monthly": "今月の振り返りをお願いします",
+}
+
+
+async def _run_mentor(user_id: str, message: str) -> str:
+    """メンターエージェントにメッセージを送り、応答テキストを返す。"""
+    session_id = f"mentor_{user_id}"
+
+    # ADKセッションが存在するか確認、なければ作成
+    await ensure_chat_session(APP_NAME, user_id, session_id)
+
+    # ADK Runnerにメッセージを送信
+    runner = get_mentor_runner()
+    user_content = types.Content(role="user", parts=[types.Part(text=message)])
+
+    response_text = ""
+    try:
+        async with get_llm_scheduler().slot(Priority.INTERACTIVE):
+            async for event in runner.run_async(
+                user_id=user_id,
+                session_id=session_id,
+                new_message=user_content,
+            ):
+                logger.debug(f"ADK event: {event}")
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if part.text:
+                            if event.is_final_response():
+                                response_text = part.text
+                            elif not response_text:
+                                response_text = part.text
+    except LLMOverloadedError:
+        raise
+    except Exception as e:
+        logger.error(f"ADK runner error: {e}", exc_info=True)
+        response_text = ERROR_TEXT
+
+    if not response_text:
+        logger.warning("No response text from ADK runner")
+        response_text = NO_RESPONSE_TEXT
+    return response_text
 
 
 # --- Endpoints ---
@@ -87,56 +161,46 @@ async def get_latest_mentor_feedback(
     return feedback
 
 
-@router.post("/chat", response_model=MentorChatResponse)
+@router.post("/feedbacks/generate", response_model=MentorFeedbackGenerateResponse)
 @limiter.limit(settings.rate_limit_ai_endpoints)
-async def chat_with_mentor(
+async def generate_mentor_feedback(
     request: Request,
-    body: MentorChatRequest,
+    body: MentorFeedbackGenerateRequest,
     user: dict = Depends(get_current_user),
 ):
-    """メンターエージェントとチャットする。"""
-    user_id = user["uid"]
-    session_id = f"mentor_{user_id}"
+    """週次・月次の振り返りを生成する。
 
-    # ADKセッションが存在するか確認、なければ作成
-    session_service = get_session_service()
-    adk_session = await session_service.get_session(
-        app_name=APP_NAME, user_id=user_id, session_id=session_id
-    )
-    if not adk_session:
-        adk_session = await session_service.create_session(
-            app_name=APP_NAME,
-            user_id=user_id,
-            session_id=session_id,
-            state={"user_id": user_id},
+    前回の同じ種類の振り返りから期間内の活動（読書・Insight・プロファイル）に
+    変化がなければ、LLMを呼ばずにそのフィードバックを返す（unchanged=True）。
+    force=True で常に再生成する。
+    """
+    user_id = user["uid"]
+    if not body.force:
+        activity = await mentor_context.activity_fingerprint(
+            user_id, mentor_context.FEEDBACK_PERIOD_DAYS[body.feedback_type]
+        )
+        feedback = await mentor_context.find_reusable_feedback(
+            user_id, body.feedback_type, activity
         )
+        if feedback:
+            return MentorFeedbackGenerateResponse(
+                message=feedback["content"], feedback=feedback, unchanged=True
+            )
 
-    # ADK Runnerにメッセージを送信
-    runner = get_mentor_runner()
-    user_content = types.Content(role="user", parts=[types.Part(text=body.message)])
+    message = await _run_mentor(user_id, REFLECTION_MESSAGES[body.feedback_type])
+    feedback = await firestore.get_latest_mentor_feedback(user_id)
+    return MentorFeedbackGenerateResponse(message=message, feedback=feedback)
 
-    response_text = ""
-    try:
-        async for event in runner.run_async(
-            user_id=user_id,
-            session_id=session_id,
-            new_message=user_content,
-        ):
-            logger.debug(f"ADK event: {event}")
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if part.text:
-                        if event.is_final_response():
-                            response_text = part.text
-                        elif not response_text:
-                            response_text = part.text
-    except Exception as e:
-        logger.error(f"ADK runner error: {e}", exc_info=True)
-        response_text = "申し訳ございません。エラーが発生しました。もう一度お試しください。"
 
-    if not response_text:
-        logger.warning("No response text from ADK runner")
-        response_text = "申し訳ございません。応答を生成できませんでした。もう一度お試しください。"
+@router.post("/chat", response_model=MentorChatResponse)
+@limiter.limit(settings.rate_limit_ai_endpoints)
+async def chat_with_mentor(
+    request: Request,
+    body: MentorChatRequest,
+    user: dict = Depends(get_current_user),
+):
+    """メンターエージェントとチャットする。"""
+    response_text = await _run_mentor(user["uid"], body.message)
 
     return MentorChatResponse(
         id=f"msg_{datetime.now(timezone.utc).timestamp()}",
@@ -146,6 +210,44 @@ async def chat_with_mentor(
     )
 
 
+@router.post("/chat/stream")
+@limiter.limit(settings.rate_limit_ai_endpoints)
+async def chat_with_mentor_stream(
+    request: Request,
+    body: MentorChatRequest,
+    user: dict = Depends(get_current_user),
+):
+    """メンターエージェントとチャットする（SSEストリーミング）。"""
+    user_id = user["uid"]
+    # LLMスロットを確保（混雑時はストリーム開始前に503を返す）
+    llm_slot = await get_llm_scheduler().acquire(Priority.INTERACTIVE)
+    stream = start_chat_stream(
+        app_name=APP_NAME,
+        kind="mentor_chat",
+        user_id=user_id,
+        session_id=f"mentor_{user_id}",
+        message=body.message,
+        scope=STREAM_SCOPE,
+        llm_slot=llm_slot,
+    )
+    return stream_response(stream.subscribe())
+
+
+@router.get("/chat/streams/{stream_id}")
+async def reattach_mentor_stream(
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user: dict = Depends(get_current_user),
+):
+    """切断されたメンターチャットのSSEストリームに再接続する。"""
+    events = await open_stream(
+        stream_id, user["uid"], STREAM_SCOPE, parse_last_event_id(last_event_id)
+    )
+    if events is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return stream_response(events)
+
+
 @router.post("/reset")
 async def reset_mentor_session(
     user: dict = Depends(get_current_user),
@@ -8,7 +8,7 @@ from knowva.models.mood import (
     MoodCreate,
     MoodResponse,
 )
-from knowva.services import firestore
+from knowva.services import firestore, mood_analytics
 
 router = APIRouter()
 
@@ -32,6 +32,7 @@ async def save_mood(
         "dominant_emotion": body.dominant_emotion,
     }
     result = await firestore.save_mood(user["uid"], reading_id, data)
+    mood_analytics.invalidate(user["uid"])
     return result
 
 
@@ -8,7 +8,7 @@ from knowva.models.onboarding import (
     OnboardingStatus,
     OnboardingSubmit,
 )
-from knowva.services import firestore
+from knowva.services import firestore, onboarding_service
 
 router = APIRouter()
 
@@ -25,15 +25,10 @@ async def submit_onboarding(
     body: OnboardingSubmit,
     user: dict = Depends(get_current_user),
 ):
-    """オンボーディング回答を保存する。"""
-    user_id = user["uid"]
-    badges_earned = []
+    """オンボーディング回答を保存する。
 
-    # 1. ニックネームを保存（入力がある場合のみ）
-    if body.nickname and body.nickname.strip():
-        await firestore.update_user_name(user_id, body.nickname.strip())
-
-    # 2. current_profileに構造化情報を保存（interestsも含む）
+    全ての書き込みを1回のコミットで行い、リトライされても冪等。
+    """
     profile_data = {
         "life_stage": body.life_stage,
         "situation": body.situation,
@@ -42,33 +37,13 @@ async def submit_onboarding(
         "reading_motivations": body.reading_motivations,
         "interests": body.interests,
     }
-    await firestore.update_user_profile(user_id, profile_data)
-
-    # 3. profileEntriesに非構造的情報を保存
-    # 読みたい本
-    for book_wish in body.book_wishes:
-        if book_wish.strip():  # 空文字でない場合のみ
-            await firestore.save_profile_entry(
-                user_id,
-                {
-                    "entry_type": "book_wish",
-                    "content": book_wish,
-                    "note": "オンボーディングで登録",
-                },
-            )
-
-    # 4. オンボーディング完了フラグを設定
-    await firestore.set_onboarding_completed(user_id)
-
-    # 5. バッジを付与（badge_serviceが実装されたら有効化）
-    try:
-        from knowva.services.badge_service import award_badge
+    nickname = body.nickname.strip() if body.nickname else None
 
-        badge = await award_badge(user_id, "onboarding_complete")
-        if badge:
-            badges_earned.append("onboarding_complete")
-    except ImportError:
-        # badge_serviceがまだ実装されていない場合は無視
-        pass
+    result = await onboarding_service.submit_onboarding(
+        user["uid"],
+        nickname=nickname,
+        profile_data=profile_data,
+        book_wishes=body.book_wishes,
+    )
 
-    return OnboardingResponse(status="success", badges_earned=badges_earned)
+    return OnboardingResponse(status="success", badges_earned=result["badges_earned"])
@@ -1,13 +1,14 @@
 import logging
 from typing import Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from google.adk.runners import Runner
 from google.genai import types
 
 from knowva.agents import onboarding_agent
 from knowva.middleware.firebase_auth import get_current_user
 from knowva.models.message import MessageCreate, MessageResponse
+from knowva.models.mood import MoodAnalyticsResponse
 from knowva.models.profile import (
     AllInsightsResponse,
     InsightGroup,
@@ -21,8 +22,17 @@ from knowva.models.profile import (
     UserSettings,
     UserSettingsUpdate,
 )
-from knowva.services import firestore
+from knowva.services import agent_registry, firestore, mood_analytics
+from knowva.services.chat_stream import (
+    ERROR_TEXT,
+    NO_RESPONSE_TEXT,
+    ensure_chat_session,
+    start_chat_stream,
+)
+from knowva.services.llm_scheduler import LLMOverloadedError, Priority, get_llm_scheduler
 from knowva.services.session_service import get_session_service
+from knowva.services.sse_emitter import stream_response
+from knowva.services.stream_hub import open_stream, parse_last_event_id
 
 logger = logging.getLogger(__name__)
 
@@ -31,13 +41,16 @@ router = APIRouter()
 APP_NAME = "knowva_profile"
 
 
+agent_registry.register_agent(APP_NAME, onboarding_agent)
+
+
 def get_profile_runner() -> Runner:
-    """プロファイルエージェント用のADK Runnerを取得する。"""
-    return Runner(
-        agent=onboarding_agent,
-        app_name=APP_NAME,
-        session_service=get_session_service(),
-    )
+    """プロファイルエージェント用のADK Runner（プロセス内で共有）を取得する。"""
+    return agent_registry.get_runner(APP_NAME)
+
+
+# 再接続時にストリームと対応づけるスコープ
+STREAM_SCOPE = "profile"
 
 
 # === 全読書 Insight 一覧 ===
@@ -92,6 +105,17 @@ async def list_all_insights(
     )
 
 
+# === 読書横断の心境分析 ===
+
+
+@router.get("/mood-analytics", response_model=MoodAnalyticsResponse)
+async def get_mood_analytics(
+    user: dict = Depends(get_current_user),
+):
+    """全読書の心境記録から指標ごとの統計・トレンドを取得する。"""
+    return await mood_analytics.get_mood_analytics(user["uid"])
+
+
 # === プロファイルエントリ ===
 
 
@@ -262,17 +286,7 @@ async def chat_with_profile_agent(
     session_id = f"profile_{user_id}"
 
     # ADKセッションが存在するか確認、なければ作成
-    session_service = get_session_service()
-    adk_session = await session_service.get_session(
-        app_name=APP_NAME, user_id=user_id, session_id=session_id
-    )
-    if not adk_session:
-        adk_session = await session_service.create_session(
-            app_name=APP_NAME,
-            user_id=user_id,
-            session_id=session_id,
-            state={"user_id": user_id},
-        )
+    await ensure_chat_session(APP_NAME, user_id, session_id)
 
     # ADK Runnerにメッセージを送信
     runner = get_profile_runner()
@@ -280,26 +294,29 @@ async def chat_with_profile_agent(
 
     response_text = ""
     try:
-        async for event in runner.run_async(
-            user_id=user_id,
-            session_id=session_id,
-            new_message=user_content,
-        ):
-            logger.debug(f"ADK event: {event}")
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if part.text:
-                        if event.is_final_response():
-                            response_text = part.text
-                        elif not response_text:
-                            response_text = part.text
+        async with get_llm_scheduler().slot(Priority.INTERACTIVE):
+            async for event in runner.run_async(
+                user_id=user_id,
+                session_id=session_id,
+                new_message=user_content,
+            ):
+                logger.debug(f"ADK event: {event}")
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if part.text:
+                            if event.is_final_response():
+                                response_text = part.text
+                            elif not response_text:
+                                response_text = part.text
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"ADK runner error: {e}", exc_info=True)
-        response_text = "申し訳ございません。エラーが発生しました。もう一度お試しください。"
+        response_text = ERROR_TEXT
 
     if not response_text:
         logger.warning("No response text from ADK runner")
-        response_text = "申し訳ございません。応答を生成できませんでした。もう一度お試しください。"
+        response_text = NO_RESPONSE_TEXT
 
     # レスポンスを返す（プロファイルチャットはメッセージをFirestoreに保存しない）
     from datetime import datetime, timezone
@@ -313,6 +330,45 @@ async def chat_with_profile_agent(
     )
 
 
+@router.post("/chat/stream")
+async def chat_with_profile_agent_stream(
+    body: MessageCreate,
+    user: dict = Depends(get_current_user),
+):
+    """プロファイルエージェントとチャットする（SSEストリーミング）。
+
+    応答はFirestoreに保存しない（/chat と同じ）。
+    """
+    user_id = user["uid"]
+    # LLMスロットを確保（混雑時はストリーム開始前に503を返す）
+    llm_slot = await get_llm_scheduler().acquire(Priority.INTERACTIVE)
+    stream = start_chat_stream(
+        app_name=APP_NAME,
+        kind="profile_chat",
+        user_id=user_id,
+        session_id=f"profile_{user_id}",
+        message=body.message,
+        scope=STREAM_SCOPE,
+        llm_slot=llm_slot,
+    )
+    return stream_response(stream.subscribe())
+
+
+@router.get("/chat/streams/{stream_id}")
+async def reattach_profile_stream(
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user: dict = Depends(get_current_user),
+):
+    """切断されたプロファイルチャットのSSEストリームに再接続する。"""
+    events = await open_stream(
+        stream_id, user["uid"], STREAM_SCOPE, parse_last_event_id(last_event_id)
+    )
+    if events is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return stream_response(events)
+
+
 @router.post("/chat/reset")
 async def reset_profile_chat(
     user: dict = Depends(get_current_user),
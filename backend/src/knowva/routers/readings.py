@@ -1,7 +1,6 @@
 import json
 
 from fastapi import APIRouter, Depends, HTTPException
-from google import genai
 
 from knowva.middleware.firebase_auth import get_current_user
 from knowva.models.insight import (
@@ -23,7 +22,8 @@ from knowva.models.reading import (
     ReadingResponse,
     ReadingUpdate,
 )
-from knowva.services import badge_service, firestore
+from knowva.services import badge_service, firestore, firestore_ops, llm_backend, mood_analytics
+from knowva.services.llm_scheduler import LLMOverloadedError, Priority, get_llm_scheduler
 
 router = APIRouter()
 
@@ -76,12 +76,14 @@ async def create_reading(
 
 
 @router.get("", response_model=list[ReadingResponse])
+@firestore_ops.budget(queries=1, writes=0)
 async def list_readings(user: dict = Depends(get_current_user)):
     """ユーザーの読書記録一覧を取得する。"""
     return await firestore.list_readings(user["uid"])
 
 
 @router.get("/{reading_id}", response_model=ReadingResponse)
+@firestore_ops.budget(reads=1, queries=0, writes=0)
 async def get_reading(
     reading_id: str,
     user: dict = Depends(get_current_user),
@@ -141,6 +143,8 @@ async def delete_reading(
     result = await firestore.delete_reading_cascade(user["uid"], reading_id)
     if not result.get("deleted"):
         raise HTTPException(status_code=404, detail="Reading not found")
+    # 削除した読書の心境記録が読書横断の分析に残らないようにする
+    mood_analytics.invalidate(user["uid"])
 
     return ReadingDeleteResponse(
         deleted=True,
@@ -296,11 +300,7 @@ async def preview_insight_merge(
     user_id = user["uid"]
 
     # 対象Insightを取得
-    original_insights = []
-    for insight_id in body.insight_ids:
-        insight = await firestore.get_insight(user_id, reading_id, insight_id)
-        if insight:
-            original_insights.append(insight)
+    original_insights = await firestore.get_insights(user_id, reading_id, body.insight_ids)
 
     if len(original_insights) < 2:
         raise HTTPException(status_code=400, detail="Not enough valid insights found")
@@ -332,14 +332,12 @@ async def preview_insight_merge(
 """
 
     try:
-        client = genai.Client()
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-        )
+        async with get_llm_scheduler().slot(Priority.GENERATION):
+            response_text = await llm_backend.generate_text(
+                "gemini-2.0-flash", prompt, "merge_insights"
+            )
 
         # レスポンスをパース
-        response_text = response.text.strip()
         # マークダウンコードブロックを除去
         if response_text.startswith("```"):
             lines = response_text.split("\n")
@@ -355,6 +353,8 @@ async def preview_insight_merge(
         if suggested_type not in valid_types:
             suggested_type = "learning"
 
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         # LLM呼び出しに失敗した場合はシンプルに連結
         merged_content = " / ".join([ins["content"] for ins in original_insights])
@@ -1,16 +1,14 @@
 """Reading Report & Action Plan API Router."""
 
-import json
 import logging
 import time
 from collections.abc import AsyncGenerator
-from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from google.adk.runners import Runner
 from google.genai import types
-from sse_starlette import EventSourceResponse, ServerSentEvent
+from sse_starlette import ServerSentEvent
 
 from knowva.agents import report_agent
 from knowva.config import settings
@@ -26,8 +24,13 @@ from knowva.models.report import (
     ReportVisibilityResponse,
     ReportVisibilityUpdate,
 )
-from knowva.services import firestore
+from knowva.services import agent_registry, firestore, report_fingerprint
+from knowva.services.cancellation import GenerationRun, cancellable_run
+from knowva.services.llm_scheduler import Priority, get_llm_scheduler, hold_slot
 from knowva.services.session_service import get_session_service
+from knowva.services.sse_emitter import TextDelta, encode_delta, stream_response
+from knowva.services.stream_hub import get_stream_hub, open_stream, parse_last_event_id
+from knowva.services.stream_translator import StreamTranslator, error_event, sse_event
 
 logger = logging.getLogger(__name__)
 
@@ -36,19 +39,25 @@ router = APIRouter()
 APP_NAME = "knowva_report"
 
 
-def json_serializer(obj):
-    """datetimeオブジェクトをシリアライズする。"""
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+agent_registry.register_agent(APP_NAME, report_agent)
 
 
 def get_report_runner() -> Runner:
-    """Report Agent用のADK Runnerを取得する。"""
-    return Runner(
-        agent=report_agent,
-        app_name=APP_NAME,
-        session_service=get_session_service(),
+    """Report Agent用のADK Runner（プロセス内で共有）を取得する。"""
+    return agent_registry.get_runner(APP_NAME)
+
+
+def _stream_scope(reading_id: str) -> str:
+    return f"{reading_id}/reports"
+
+
+async def _replay_report(report: dict) -> AsyncGenerator[ServerSentEvent, None]:
+    """既存のレポートを生成時と同じイベントモデルで返す。"""
+    yield sse_event("message_start", {"message_id": report["id"]})
+    yield ServerSentEvent(data=encode_delta(report.get("summary", "")), event="text_delta")
+    yield sse_event("text_done", {"text": report.get("summary", "")})
+    yield sse_event(
+        "message_done", {"status": "unchanged", "report": ReportResponse(**report).model_dump()}
     )
 
 
@@ -60,14 +69,31 @@ def get_report_runner() -> Runner:
 async def generate_report(
     request: Request,
     reading_id: str,
+    force: bool = False,
     user: dict = Depends(get_current_user),
 ):
-    """読書レポートを生成する（SSEストリーミング）。"""
-    reading = await firestore.get_reading(user["uid"], reading_id)
-    if not reading:
+    """読書レポートを生成する（SSEストリーミング）。
+
+    入力（対話・Insight・プロファイル・心境）が最新レポートの生成時から変わっていなければ、
+    Agentを実行せずに最新レポートを返す（message_done の status が "unchanged"）。
+    force=true で常に再生成する。
+    """
+    fingerprint = await report_fingerprint.compute_report_fingerprint(user["uid"], reading_id)
+    if fingerprint is None:
         raise HTTPException(status_code=404, detail="Reading not found")
 
-    async def event_generator() -> AsyncGenerator[ServerSentEvent, None]:
+    if not force:
+        latest = await firestore.get_latest_report(user["uid"], reading_id)
+        if latest and latest.get("input_fingerprint") == fingerprint:
+            return stream_response(_replay_report(latest))
+
+    # LLMスロットを確保（混雑時はストリーム開始前に503を返す）
+    llm_slot = await get_llm_scheduler().acquire(Priority.GENERATION)
+
+    # メッセージIDは再接続用のストリームIDも兼ねる
+    message_id = f"report_{reading_id}_{int(time.time() * 1000)}"
+
+    async def event_generator() -> AsyncGenerator[ServerSentEvent | TextDelta, None]:
         session_service = get_session_service()
         session_id = f"report_{reading_id}_{int(time.time())}"
 
@@ -79,96 +105,44 @@ async def generate_report(
             state={
                 "reading_id": reading_id,
                 "user_id": user["uid"],
+                report_fingerprint.STATE_KEY: fingerprint,
             },
         )
 
+        async def _delete_report_session(run: GenerationRun) -> None:
+            # 切断時もレポート用の一時セッションを残さない
+            await session_service.delete_session(
+                app_name=APP_NAME, user_id=user["uid"], session_id=session_id
+            )
+
         runner = get_report_runner()
         init_content = types.Content(
             role="user",
             parts=[types.Part(text="この読書のレポートを生成してください。")],
         )
 
-        message_id = f"report_{reading_id}_{int(time.time() * 1000)}"
-        accumulated_text = ""
-        pending_tool_calls: dict[str, str] = {}
+        translator = StreamTranslator()
 
-        yield ServerSentEvent(data=json.dumps({"message_id": message_id}), event="message_start")
+        yield sse_event("message_start", {"message_id": message_id})
 
-        try:
-            async for event in runner.run_async(
-                user_id=user["uid"],
-                session_id=session_id,
-                new_message=init_content,
-            ):
-                if event.content and event.content.parts:
-                    for part in event.content.parts:
-                        if hasattr(part, "function_call") and part.function_call:
-                            fc = part.function_call
-                            tool_name = getattr(fc, "name", "unknown")
-                            tool_id = getattr(fc, "id", f"tc_{int(time.time() * 1000)}")
-                            pending_tool_calls[tool_id] = tool_name
-                            yield ServerSentEvent(
-                                data=json.dumps({"tool_name": tool_name, "tool_call_id": tool_id}),
-                                event="tool_call_start",
-                            )
-
-                        if hasattr(part, "function_response") and part.function_response:
-                            fr = part.function_response
-                            tool_id = getattr(fr, "id", None)
-                            tool_name = getattr(fr, "name", None)
-                            result = getattr(fr, "response", {})
-
-                            if not tool_id and tool_name:
-                                for tid, tname in pending_tool_calls.items():
-                                    if tname == tool_name:
-                                        tool_id = tid
-                                        break
-
-                            if tool_id:
-                                yield ServerSentEvent(
-                                    data=json.dumps(
-                                        {
-                                            "tool_call_id": tool_id,
-                                            "result": result,
-                                        },
-                                        default=json_serializer,
-                                    ),
-                                    event="tool_call_done",
-                                )
-                                pending_tool_calls.pop(tool_id, None)
-
-                if event.content and event.content.parts:
-                    for part in event.content.parts:
-                        if part.text:
-                            new_text = part.text
-                            if new_text != accumulated_text:
-                                delta = (
-                                    new_text[len(accumulated_text) :]
-                                    if new_text.startswith(accumulated_text)
-                                    else new_text
-                                )
-                                if delta:
-                                    yield ServerSentEvent(
-                                        data=json.dumps({"delta": delta}),
-                                        event="text_delta",
-                                    )
-                                accumulated_text = new_text
-
-        except Exception as e:
-            logger.error(f"Report generation error: {e}", exc_info=True)
-            yield ServerSentEvent(
-                data=json.dumps(
-                    {
-                        "code": "generation_error",
-                        "message": "レポート生成中にエラーが発生しました。",
-                    }
-                ),
-                event="error",
-            )
-            return
-
-        yield ServerSentEvent(data=json.dumps({"text": accumulated_text}), event="text_done")
-        yield ServerSentEvent(data=json.dumps({"status": "completed"}), event="message_done")
+        events = runner.run_async(
+            user_id=user["uid"],
+            session_id=session_id,
+            new_message=init_content,
+        )
+        async with cancellable_run("report", events, on_cancel=_delete_report_session) as run:
+            run.track(lambda: translator.text)
+            try:
+                async for event in events:
+                    for sse in translator.translate(event):
+                        yield sse
+            except Exception as e:
+                logger.error(f"Report generation error: {e}", exc_info=True)
+                yield error_event("generation_error", "レポート生成中にエラーが発生しました。")
+                return
+
+        yield sse_event("text_done", {"text": translator.text})
+        yield sse_event("message_done", {"status": "completed"})
 
         # セッションクリーンアップ
         try:
@@ -178,10 +152,31 @@ async def generate_report(
         except Exception:
             pass
 
-    return EventSourceResponse(
-        event_generator(),
-        headers={"Cache-Control": "no-cache"},
+    # 生成は接続から独立して実行し、このレスポンスは最初の購読者として配信する
+    stream = get_stream_hub().start(
+        message_id,
+        user["uid"],
+        _stream_scope(reading_id),
+        hold_slot(event_generator(), llm_slot),
+        kind="report",
+    )
+    return stream_response(stream.subscribe())
+
+
+@router.get("/{reading_id}/reports/streams/{stream_id}")
+async def reattach_report_stream(
+    reading_id: str,
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user: dict = Depends(get_current_user),
+):
+    """切断されたレポート生成のSSEストリームに再接続する。"""
+    events = await open_stream(
+        stream_id, user["uid"], _stream_scope(reading_id), parse_last_event_id(last_event_id)
     )
+    if events is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return stream_response(events)
 
 
 @router.get("/{reading_id}/reports", response_model=list[ReportResponse])
@@ -1,14 +1,13 @@
-import json
 import logging
 import time
 from collections.abc import AsyncGenerator
 from datetime import datetime, timezone
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Request
-from google import genai
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from google.adk.runners import Runner
 from google.genai import types
-from sse_starlette import EventSourceResponse, ServerSentEvent
+from sse_starlette import ServerSentEvent
 
 from knowva.agents import reading_agent
 from knowva.config import settings
@@ -16,31 +15,57 @@ from knowva.middleware.firebase_auth import get_current_user
 from knowva.middleware.rate_limit import limiter
 from knowva.models.message import MessageCreate, MessageResponse
 from knowva.models.session import SessionCreate, SessionResponse
-from knowva.services import firestore
+from knowva.services import (
+    agent_registry,
+    firestore,
+    firestore_ops,
+    reading_context,
+    session_summary,
+)
+from knowva.services.cancellation import GenerationRun, cancellable_run
+from knowva.services.llm_scheduler import (
+    Priority,
+    get_llm_scheduler,
+    hold_slot,
+)
 from knowva.services.session_service import get_session_service
+from knowva.services.sse_emitter import TextDelta, stream_response
+from knowva.services.stream_hub import get_stream_hub, open_stream, parse_last_event_id
+from knowva.services.stream_translator import StreamTranslator, error_event, sse_event
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-def json_serializer(obj):
-    """JSONシリアライズ時にdatetimeをISO形式に変換する。"""
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+APP_NAME = "knowva"
 
 
-APP_NAME = "knowva"
+agent_registry.register_agent(APP_NAME, reading_agent)
 
 
 def get_runner() -> Runner:
-    """ADK Runnerを取得する。FirestoreSessionServiceを使用。"""
-    return Runner(
-        agent=reading_agent,
-        app_name=APP_NAME,
-        session_service=get_session_service(),
-    )
+    """ADK Runner（プロセス内で共有）を取得する。FirestoreSessionServiceを使用。"""
+    return agent_registry.get_runner(APP_NAME)
+
+
+def _discard_adk_session(user_id: str, session_id: str):
+    """切断された生成の後始末。
+
+    途中までの応答は保存しないため、途中イベントを含むメモリ上のADKセッションを破棄し、
+    次のターンは保存済みのメッセージから復元させる。
+    """
+
+    async def on_cancel(run: GenerationRun) -> None:
+        get_session_service().evict_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id
+        )
+
+    return on_cancel
+
+
+def _stream_scope(reading_id: str, session_id: str) -> str:
+    return f"{reading_id}/{session_id}"
 
 
 @router.post("/{reading_id}/sessions", response_model=SessionResponse)
@@ -61,17 +86,15 @@ async def create_session(
     )
 
     # ADKセッションも作成（会話コンテキスト用）
-    # session_typeもstateに含めて、エージェントが参照できるようにする
-    session_service = get_session_service()
-    await session_service.create_session(
+    # 読書コンテキストを事前取得してstateに含め、エージェントのツール呼び出しを省く
+    await reading_context.ensure_reading_session(
+        get_session_service(),
         app_name=APP_NAME,
         user_id=user["uid"],
         session_id=result["id"],
-        state={
-            "reading_id": reading_id,
-            "user_id": user["uid"],
-            "session_type": body.session_type,
-        },
+        reading_id=reading_id,
+        session_type=body.session_type,
+        reading=reading,
     )
 
     return result
@@ -133,55 +156,54 @@ async def send_message(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # ユーザーメッセージをFirestoreに保存
-    await firestore.save_message(
-        user_id=user["uid"],
-        reading_id=reading_id,
-        session_id=session_id,
-        data={"role": "user", "message": body.message, "input_type": body.input_type},
-    )
+    # LLMスロットを確保（混雑時はここで503を返す）
+    llm_slot = await get_llm_scheduler().acquire(Priority.INTERACTIVE)
 
-    # ADKセッションが存在するか確認、なければ作成（Firestoreから復元）
-    session_service = get_session_service()
-    adk_session = await session_service.get_session(
-        app_name=APP_NAME, user_id=user["uid"], session_id=session_id
-    )
-    if not adk_session:
-        adk_session = await session_service.create_session(
-            app_name=APP_NAME,
+    try:
+        # ユーザーメッセージをFirestoreに保存
+        await firestore.save_message(
             user_id=user["uid"],
+            reading_id=reading_id,
             session_id=session_id,
-            state={
-                "reading_id": reading_id,
-                "user_id": user["uid"],
-                "session_type": session.get("session_type", "during_reading"),
-            },
+            data={"role": "user", "message": body.message, "input_type": body.input_type},
         )
 
-    # ADK Runnerにメッセージを送信
-    runner = get_runner()
-    user_content = types.Content(role="user", parts=[types.Part(text=body.message)])
-
-    response_text = ""
-    try:
-        async for event in runner.run_async(
+        # ADKセッションの取得/作成（読書コンテキストはstateに事前取得する）
+        await reading_context.ensure_reading_session(
+            get_session_service(),
+            app_name=APP_NAME,
             user_id=user["uid"],
             session_id=session_id,
-            new_message=user_content,
-        ):
-            logger.debug(f"ADK event: {event}")
-            # テキスト応答を収集（最終応答以外も含む）
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if part.text:
-                        # 最終応答を優先、なければ途中の応答も使用
-                        if event.is_final_response():
-                            response_text = part.text
-                        elif not response_text:
-                            response_text = part.text
-    except Exception as e:
-        logger.error(f"ADK runner error: {e}", exc_info=True)
-        response_text = "申し訳ございません。エラーが発生しました。もう一度お試しください。"
+            reading_id=reading_id,
+            session_type=session.get("session_type"),
+        )
+
+        # ADK Runnerにメッセージを送信
+        runner = get_runner()
+        user_content = types.Content(role="user", parts=[types.Part(text=body.message)])
+
+        response_text = ""
+        try:
+            async for event in runner.run_async(
+                user_id=user["uid"],
+                session_id=session_id,
+                new_message=user_content,
+            ):
+                logger.debug(f"ADK event: {event}")
+                # テキスト応答を収集（最終応答以外も含む）
+                if event.content and event.content.parts:
+                    for part in event.content.parts:
+                        if part.text:
+                            # 最終応答を優先、なければ途中の応答も使用
+                            if event.is_final_response():
+                                response_text = part.text
+                            elif not response_text:
+                                response_text = part.text
+        except Exception as e:
+            logger.error(f"ADK runner error: {e}", exc_info=True)
+            response_text = "申し訳ございません。エラーが発生しました。もう一度お試しください。"
+    finally:
+        llm_slot.release()
 
     # 応答がない場合のフォールバック
     if not response_text:
@@ -195,6 +217,7 @@ async def send_message(
         session_id=session_id,
         data={"role": "assistant", "message": response_text, "input_type": "text"},
     )
+    session_summary.schedule_rolling_update(user["uid"], reading_id, session, added_messages=2)
 
     return ai_message
 
@@ -203,6 +226,7 @@ async def send_message(
     "/{reading_id}/sessions/{session_id}/messages",
     response_model=list[MessageResponse],
 )
+@firestore_ops.budget(queries=1, writes=0)
 async def list_messages(
     reading_id: str,
     session_id: str,
@@ -226,143 +250,68 @@ async def send_message_stream(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    # LLMスロットを確保（混雑時はストリーム開始前に503を返す）
+    llm_slot = await get_llm_scheduler().acquire(Priority.INTERACTIVE)
+
     # ユーザーメッセージをFirestoreに保存
-    await firestore.save_message(
-        user_id=user["uid"],
-        reading_id=reading_id,
-        session_id=session_id,
-        data={"role": "user", "message": body.message, "input_type": body.input_type},
-    )
+    try:
+        await firestore.save_message(
+            user_id=user["uid"],
+            reading_id=reading_id,
+            session_id=session_id,
+            data={"role": "user", "message": body.message, "input_type": body.input_type},
+        )
+    except BaseException:
+        llm_slot.release()
+        raise
+
+    # メッセージIDは再接続用のストリームIDも兼ねる
+    message_id = f"msg_{session_id}_{int(time.time() * 1000)}"
 
-    async def event_generator() -> AsyncGenerator[ServerSentEvent, None]:
+    async def event_generator() -> AsyncGenerator[ServerSentEvent | TextDelta, None]:
         """ADKイベントをSSEイベントに変換するジェネレーター"""
-        # ADKセッションの取得/作成
-        session_service = get_session_service()
-        adk_session = await session_service.get_session(
-            app_name=APP_NAME, user_id=user["uid"], session_id=session_id
+        # ADKセッションの取得/作成（読書コンテキストはstateに事前取得する）
+        await reading_context.ensure_reading_session(
+            get_session_service(),
+            app_name=APP_NAME,
+            user_id=user["uid"],
+            session_id=session_id,
+            reading_id=reading_id,
+            session_type=session.get("session_type"),
         )
-        if not adk_session:
-            adk_session = await session_service.create_session(
-                app_name=APP_NAME,
-                user_id=user["uid"],
-                session_id=session_id,
-                state={
-                    "reading_id": reading_id,
-                    "user_id": user["uid"],
-                    "session_type": session.get("session_type", "during_reading"),
-                },
-            )
 
         runner = get_runner()
         user_content = types.Content(role="user", parts=[types.Part(text=body.message)])
 
-        message_id = f"msg_{session_id}_{int(time.time() * 1000)}"
-        accumulated_text = ""
-        # 進行中のツール呼び出しを追跡
-        pending_tool_calls: dict[str, str] = {}  # tool_id -> tool_name
-        # present_optionsのデータを保持（メッセージに永続化するため）
-        options_data: dict | None = None
+        translator = StreamTranslator()
 
         # メッセージ開始イベント
-        yield ServerSentEvent(data=json.dumps({"message_id": message_id}), event="message_start")
-
-        try:
-            async for event in runner.run_async(
-                user_id=user["uid"],
-                session_id=session_id,
-                new_message=user_content,
-            ):
-                # ツール呼び出しイベントの処理（part.function_callをチェック）
-                if event.content and event.content.parts:
-                    for part in event.content.parts:
-                        # function_callパートがあればツール開始イベントを送信
-                        if hasattr(part, "function_call") and part.function_call:
-                            fc = part.function_call
-                            tool_name = getattr(fc, "name", "unknown")
-                            tool_id = getattr(fc, "id", f"tc_{int(time.time() * 1000)}")
-                            pending_tool_calls[tool_id] = tool_name
-                            yield ServerSentEvent(
-                                data=json.dumps({"tool_name": tool_name, "tool_call_id": tool_id}),
-                                event="tool_call_start",
-                            )
-
-                        # function_responseパートがあればツール完了イベントを送信
-                        if hasattr(part, "function_response") and part.function_response:
-                            fr = part.function_response
-                            tool_id = getattr(fr, "id", None)
-                            tool_name = getattr(fr, "name", None)
-                            result = getattr(fr, "response", {})
-
-                            # tool_idがない場合はpending_tool_callsから探す
-                            if not tool_id and tool_name:
-                                for tid, tname in pending_tool_calls.items():
-                                    if tname == tool_name:
-                                        tool_id = tid
-                                        break
-
-                            # present_optionsツールの場合は特別なSSEイベントを送信
-                            if tool_name == "present_options" and isinstance(result, dict):
-                                if result.get("status") == "options_presented":
-                                    options_data = {
-                                        "prompt": result.get("prompt", ""),
-                                        "options": result.get("options", []),
-                                        "allow_multiple": result.get("allow_multiple", True),
-                                        "allow_freeform": result.get("allow_freeform", True),
-                                    }
-                                    yield ServerSentEvent(
-                                        data=json.dumps(options_data),
-                                        event="options_request",
-                                    )
-
-                            if tool_id:
-                                yield ServerSentEvent(
-                                    data=json.dumps(
-                                        {
-                                            "tool_call_id": tool_id,
-                                            "result": result,
-                                        },
-                                        default=json_serializer,
-                                    ),
-                                    event="tool_call_done",
-                                )
-                                pending_tool_calls.pop(tool_id, None)
-
-                # テキストコンテンツの処理
-                if event.content and event.content.parts:
-                    for part in event.content.parts:
-                        if part.text:
-                            # テキスト差分を配信
-                            new_text = part.text
-                            if new_text != accumulated_text:
-                                # 差分のみ送信
-                                delta = (
-                                    new_text[len(accumulated_text) :]
-                                    if new_text.startswith(accumulated_text)
-                                    else new_text
-                                )
-                                if delta:
-                                    yield ServerSentEvent(
-                                        data=json.dumps({"delta": delta}), event="text_delta"
-                                    )
-                                accumulated_text = new_text
+        yield sse_event("message_start", {"message_id": message_id})
 
-        except Exception as e:
-            logger.error(f"ADK runner error: {e}", exc_info=True)
-            yield ServerSentEvent(
-                data=json.dumps(
-                    {
-                        "code": "runner_error",
-                        "message": "エラーが発生しました。もう一度お試しください。",
-                    }
-                ),
-                event="error",
-            )
-            return
+        events = runner.run_async(
+            user_id=user["uid"],
+            session_id=session_id,
+            new_message=user_content,
+        )
+        async with cancellable_run(
+            "reading_chat", events, on_cancel=_discard_adk_session(user["uid"], session_id)
+        ) as run:
+            run.track(lambda: translator.text)
+            try:
+                async for event in events:
+                    # ツール呼び出し・結果・テキスト差分をSSEイベントに変換
+                    for sse in translator.translate(event):
+                        yield sse
+            except Exception as e:
+                logger.error(f"ADK runner error: {e}", exc_info=True)
+                yield error_event("runner_error", "エラーが発生しました。もう一度お試しください。")
+                return
 
         # 応答がない場合のフォールバック
+        accumulated_text = translator.text
         if not accumulated_text:
             accumulated_text = "申し訳ございません。応答を生成できませんでした。"
-            yield ServerSentEvent(data=json.dumps({"delta": accumulated_text}), event="text_delta")
+            yield TextDelta(accumulated_text)
 
         # AIの応答をFirestoreに保存
         message_data: dict = {
@@ -370,28 +319,56 @@ async def send_message_stream(
             "message": accumulated_text,
             "input_type": "text",
         }
-        if options_data:
-            message_data["options"] = options_data
+        if translator.options:
+            message_data["options"] = translator.options
         ai_message = await firestore.save_message(
             user_id=user["uid"],
             reading_id=reading_id,
             session_id=session_id,
             data=message_data,
         )
+        # 未要約のメッセージが一定数たまったらローリング要約を更新する
+        session_summary.schedule_rolling_update(user["uid"], reading_id, session, added_messages=2)
 
         # テキスト完了イベント
-        yield ServerSentEvent(data=json.dumps({"text": accumulated_text}), event="text_done")
+        yield sse_event("text_done", {"text": accumulated_text})
 
         # メッセージ完了イベント
-        yield ServerSentEvent(
-            data=json.dumps({"message": ai_message}, default=json_serializer),
-            event="message_done",
-        )
+        yield sse_event("message_done", {"message": ai_message})
+
+    # 生成は接続から独立して実行し、このレスポンスは最初の購読者として配信する
+    stream = get_stream_hub().start(
+        message_id,
+        user["uid"],
+        _stream_scope(reading_id, session_id),
+        hold_slot(event_generator(), llm_slot),
+        kind="reading_chat",
+    )
+    return stream_response(stream.subscribe())
 
-    return EventSourceResponse(
-        event_generator(),
-        headers={"Cache-Control": "no-cache"},
+
+@router.get("/{reading_id}/sessions/{session_id}/streams/{stream_id}")
+async def reattach_stream(
+    reading_id: str,
+    session_id: str,
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user: dict = Depends(get_current_user),
+):
+    """切断されたSSEストリームに再接続する。
+
+    Last-Event-ID より後のイベントを再送し、生成中であれば続きを配信する。
+    stream_id は message_start イベントの message_id。
+    """
+    events = await open_stream(
+        stream_id,
+        user["uid"],
+        _stream_scope(reading_id, session_id),
+        parse_last_event_id(last_event_id),
     )
+    if events is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return stream_response(events)
 
 
 @router.post("/{reading_id}/sessions/{session_id}/init")
@@ -412,125 +389,54 @@ async def init_session(
     if existing_messages:
         raise HTTPException(status_code=400, detail="Session already initialized")
 
-    async def event_generator() -> AsyncGenerator[ServerSentEvent, None]:
+    # LLMスロットを確保（混雑時はストリーム開始前に503を返す）
+    llm_slot = await get_llm_scheduler().acquire(Priority.INTERACTIVE)
+
+    # メッセージIDは再接続用のストリームIDも兼ねる
+    message_id = f"msg_{session_id}_{int(time.time() * 1000)}"
+
+    async def event_generator() -> AsyncGenerator[ServerSentEvent | TextDelta, None]:
         """エージェントの初期挨拶をSSEイベントに変換するジェネレーター"""
-        # ADKセッションの取得/作成
-        session_service = get_session_service()
-        adk_session = await session_service.get_session(
-            app_name=APP_NAME, user_id=user["uid"], session_id=session_id
+        # ADKセッションの取得/作成（読書コンテキストはstateに事前取得する）
+        await reading_context.ensure_reading_session(
+            get_session_service(),
+            app_name=APP_NAME,
+            user_id=user["uid"],
+            session_id=session_id,
+            reading_id=reading_id,
+            session_type=session.get("session_type"),
         )
-        if not adk_session:
-            adk_session = await session_service.create_session(
-                app_name=APP_NAME,
-                user_id=user["uid"],
-                session_id=session_id,
-                state={
-                    "reading_id": reading_id,
-                    "user_id": user["uid"],
-                    "session_type": session.get("session_type", "during_reading"),
-                },
-            )
 
         runner = get_runner()
         # セッション初期化トリガーメッセージ
         init_content = types.Content(role="user", parts=[types.Part(text="__session_init__")])
 
-        message_id = f"msg_{session_id}_{int(time.time() * 1000)}"
-        accumulated_text = ""
-        pending_tool_calls: dict[str, str] = {}
-        # present_optionsのデータを保持（メッセージに永続化するため）
-        options_data: dict | None = None
+        translator = StreamTranslator()
 
-        yield ServerSentEvent(data=json.dumps({"message_id": message_id}), event="message_start")
-
-        try:
-            async for event in runner.run_async(
-                user_id=user["uid"],
-                session_id=session_id,
-                new_message=init_content,
-            ):
-                if event.content and event.content.parts:
-                    for part in event.content.parts:
-                        if hasattr(part, "function_call") and part.function_call:
-                            fc = part.function_call
-                            tool_name = getattr(fc, "name", "unknown")
-                            tool_id = getattr(fc, "id", f"tc_{int(time.time() * 1000)}")
-                            pending_tool_calls[tool_id] = tool_name
-                            yield ServerSentEvent(
-                                data=json.dumps({"tool_name": tool_name, "tool_call_id": tool_id}),
-                                event="tool_call_start",
-                            )
-
-                        if hasattr(part, "function_response") and part.function_response:
-                            fr = part.function_response
-                            tool_id = getattr(fr, "id", None)
-                            tool_name = getattr(fr, "name", None)
-                            result = getattr(fr, "response", {})
-
-                            if not tool_id and tool_name:
-                                for tid, tname in pending_tool_calls.items():
-                                    if tname == tool_name:
-                                        tool_id = tid
-                                        break
-
-                            if tool_name == "present_options" and isinstance(result, dict):
-                                if result.get("status") == "options_presented":
-                                    options_data = {
-                                        "prompt": result.get("prompt", ""),
-                                        "options": result.get("options", []),
-                                        "allow_multiple": result.get("allow_multiple", True),
-                                        "allow_freeform": result.get("allow_freeform", True),
-                                    }
-                                    yield ServerSentEvent(
-                                        data=json.dumps(options_data),
-                                        event="options_request",
-                                    )
-
-                            if tool_id:
-                                yield ServerSentEvent(
-                                    data=json.dumps(
-                                        {
-                                            "tool_call_id": tool_id,
-                                            "result": result,
-                                        },
-                                        default=json_serializer,
-                                    ),
-                                    event="tool_call_done",
-                                )
-                                pending_tool_calls.pop(tool_id, None)
-
-                if event.content and event.content.parts:
-                    for part in event.content.parts:
-                        if part.text:
-                            new_text = part.text
-                            if new_text != accumulated_text:
-                                delta = (
-                                    new_text[len(accumulated_text) :]
-                                    if new_text.startswith(accumulated_text)
-                                    else new_text
-                                )
-                                if delta:
-                                    yield ServerSentEvent(
-                                        data=json.dumps({"delta": delta}), event="text_delta"
-                                    )
-                                accumulated_text = new_text
-
-        except Exception as e:
-            logger.error(f"ADK runner error during init: {e}", exc_info=True)
-            yield ServerSentEvent(
-                data=json.dumps(
-                    {
-                        "code": "runner_error",
-                        "message": "初期化中にエラーが発生しました。",
-                    }
-                ),
-                event="error",
-            )
-            return
+        yield sse_event("message_start", {"message_id": message_id})
 
+        events = runner.run_async(
+            user_id=user["uid"],
+            session_id=session_id,
+            new_message=init_content,
+        )
+        async with cancellable_run(
+            "session_init", events, on_cancel=_discard_adk_session(user["uid"], session_id)
+        ) as run:
+            run.track(lambda: translator.text)
+            try:
+                async for event in events:
+                    for sse in translator.translate(event):
+                        yield sse
+            except Exception as e:
+                logger.error(f"ADK runner error during init: {e}", exc_info=True)
+                yield error_event("runner_error", "初期化中にエラーが発生しました。")
+                return
+
+        accumulated_text = translator.text
         if not accumulated_text:
             accumulated_text = "こんにちは。読書について対話しましょう。"
-            yield ServerSentEvent(data=json.dumps({"delta": accumulated_text}), event="text_delta")
+            yield TextDelta(accumulated_text)
 
         # AIの初期メッセージをFirestoreに保存
         message_data: dict = {
@@ -538,25 +444,28 @@ async def init_session(
             "message": accumulated_text,
             "input_type": "text",
         }
-        if options_data:
-            message_data["options"] = options_data
+        if translator.options:
+            message_data["options"] = translator.options
         ai_message = await firestore.save_message(
             user_id=user["uid"],
             reading_id=reading_id,
             session_id=session_id,
             data=message_data,
         )
-
-        yield ServerSentEvent(data=json.dumps({"text": accumulated_text}), event="text_done")
-        yield ServerSentEvent(
-            data=json.dumps({"message": ai_message}, default=json_serializer),
-            event="message_done",
-        )
-
-    return EventSourceResponse(
-        event_generator(),
-        headers={"Cache-Control": "no-cache"},
+        session_summary.schedule_rolling_update(user["uid"], reading_id, session, added_messages=1)
+
+        yield sse_event("text_done", {"text": accumulated_text})
+        yield sse_event("message_done", {"message": ai_message})
+
+    # 生成は接続から独立して実行し、このレスポンスは最初の購読者として配信する
+    stream = get_stream_hub().start(
+        message_id,
+        user["uid"],
+        _stream_scope(reading_id, session_id),
+        hold_slot(event_generator(), llm_slot),
+        kind="session_init",
     )
+    return stream_response(stream.subscribe())
 
 
 @router.post("/{reading_id}/sessions/{session_id}/end", response_model=SessionResponse)
@@ -565,69 +474,27 @@ async def end_session(
     session_id: str,
     user: dict = Depends(get_current_user),
 ):
-    """セッションを終了し、対話内容の要約を生成する。
+    """セッションを終了し、対話内容の要約をバックグラウンドで生成する。
 
     チャット画面から離脱する際に呼び出される。
-    対話履歴を取得し、Gemini APIで一行要約を生成してセッションに保存する。
+    要約の生成は待たずに summary_status を "pending" にして返し、
+    生成後に summary と summary_status が更新される。
     """
     session = await firestore.get_session(user["uid"], reading_id, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
     # 既に終了済みの場合はそのまま返す（冪等性）
-    if session.get("ended_at") and session.get("summary"):
+    if session.get("ended_at") and (
+        session.get("summary") or session.get("summary_status") == session_summary.STATUS_COMPLETED
+    ):
         return session
 
-    # メッセージ履歴を取得
-    messages = await firestore.list_messages(user["uid"], reading_id, session_id)
-
-    # 要約を生成（メッセージがある場合のみ）
-    summary = None
-    if messages:
-        summary = await _generate_session_summary(messages)
-
-    # セッションを更新
-    update_data = {
-        "ended_at": datetime.now(timezone.utc),
-    }
-    if summary:
-        update_data["summary"] = summary
-
+    update_data: dict = {"summary_status": session_summary.STATUS_PENDING}
+    if not session.get("ended_at"):
+        update_data["ended_at"] = datetime.now(timezone.utc)
     updated_session = await firestore.update_session(
         user["uid"], reading_id, session_id, update_data
     )
+    session_summary.get_summary_pipeline().enqueue(user["uid"], reading_id, session_id)
     return updated_session
-
-
-async def _generate_session_summary(messages: list[dict]) -> str | None:
-    """対話履歴から一行の要約を生成する。"""
-    if not messages:
-        return None
-
-    # 対話内容をテキストにまとめる
-    conversation_text = "\n".join(
-        f"{'ユーザー' if msg['role'] == 'user' else 'AI'}: {msg['message']}" for msg in messages
-    )
-
-    prompt = f"""以下は読書についての対話内容です。
-この対話で話された内容を、20〜40文字程度の日本語で一行にまとめてください。
-要約のみを返してください。
-
-対話内容:
-{conversation_text}
-
-要約:"""
-
-    try:
-        client = genai.Client()
-        response = await client.aio.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-        )
-        if response.text:
-            # 改行を除去して一行に
-            return response.text.strip().replace("\n", " ")
-    except Exception as e:
-        logger.error(f"Failed to generate session summary: {e}")
-
-    return None
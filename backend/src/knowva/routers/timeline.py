@@ -6,7 +6,7 @@ from pydantic import BaseModel
 from knowva.middleware.firebase_auth import get_current_user
 from knowva.models.insight import PublicInsightResponse, TimelineResponse
 from knowva.models.report import BookEmbed, PublicReportResponse
-from knowva.services import firestore
+from knowva.services import firestore, firestore_ops
 
 router = APIRouter()
 
@@ -29,6 +29,7 @@ class TimelineResponseV2(BaseModel):
 
 
 @router.get("", response_model=TimelineResponse)
+@firestore_ops.budget(queries=1, writes=0)
 async def get_timeline(
     order: Literal["random", "newest"] = "random",
     limit: int = 20,
@@ -88,6 +89,7 @@ async def get_timeline(
 
 
 @router.get("/v2", response_model=TimelineResponseV2)
+@firestore_ops.budget(queries=2, writes=0)
 async def get_timeline_v2(
     order: Literal["random", "newest"] = "random",
     item_type: Literal["insight", "report", "all"] = "all",
@@ -0,0 +1,82 @@
+"""ADK Runner と genai.Client のプロセス内レジストリ。
+
+Runner や genai.Client はリクエストごとに作る必要がなく、生成コストもかかる。
+各ルーターは import 時に register_agent() でエージェントを登録し、
+FastAPI の lifespan（startup）で一度だけ生成したインスタンスを全リクエストで共有する。
+Runner は実行ごとの状態を InvocationContext に持つため、並行リクエストで共有しても安全。
+"""
+
+import logging
+from typing import Optional
+
+from google import genai
+from google.adk.agents import BaseAgent
+from google.adk.runners import Runner
+
+from knowva.services import metrics, tracing
+from knowva.services.session_service import get_session_service
+
+logger = logging.getLogger(__name__)
+
+_agents: dict[str, BaseAgent] = {}
+_runners: dict[str, Runner] = {}
+_genai_client: Optional[genai.Client] = None
+# 全Runnerで共有する（モデル呼び出しの時間とトークン数の記録、スパンへの属性付け）
+_plugins = [metrics.LlmMetricsPlugin(), tracing.TracingPlugin()]
+
+
+def register_agent(app_name: str, agent: BaseAgent) -> None:
+    """app_name に対応するエージェントを登録する。"""
+    _agents[app_name] = agent
+
+
+def _build_runner(app_name: str) -> Runner:
+    return Runner(
+        agent=_agents[app_name],
+        app_name=app_name,
+        session_service=get_session_service(),
+        plugins=list(_plugins),
+    )
+
+
+def get_runner(app_name: str) -> Runner:
+    """共有のADK Runnerを取得する。
+
+    lifespan を経由しない実行（テストやスクリプト）では初回呼び出し時に生成する。
+    """
+    runner = _runners.get(app_name)
+    if runner is None:
+        runner = _runners[app_name] = _build_runner(app_name)
+    return runner
+
+
+def get_genai_client() -> genai.Client:
+    """共有の genai.Client を取得する。"""
+    global _genai_client
+    if _genai_client is None:
+        _genai_client = genai.Client()
+    return _genai_client
+
+
+async def startup() -> None:
+    """登録済みエージェントのRunnerとgenai.Clientを生成する。"""
+    for app_name in _agents:
+        get_runner(app_name)
+    try:
+        get_genai_client()
+    except Exception as e:
+        # 認証情報が無い環境でも起動は継続し、初回利用時に再試行する
+        logger.warning(f"Failed to create genai client at startup: {e}")
+    logger.info(f"Initialized {len(_runners)} ADK runners")
+
+
+async def shutdown() -> None:
+    """Runnerとgenai.Clientを閉じる。"""
+    global _genai_client
+    for runner in _runners.values():
+        await runner.close()
+    _runners.clear()
+    if _genai_client is not None:
+        await _genai_client.aio.aclose()
+        _genai_client.close()
+        _genai_client = None
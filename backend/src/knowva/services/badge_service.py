@@ -3,7 +3,11 @@
 from datetime import datetime, timezone
 from typing import Optional
 
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore import AsyncClient, AsyncDocumentReference
+
 from knowva.data.badges import get_badge_definition
+from knowva.dependencies import get_firestore_client
 from knowva.services import firestore
 
 
@@ -11,18 +15,29 @@ def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def get_badge_ref(db: AsyncClient, user_id: str, badge_id: str) -> AsyncDocumentReference:
+    """獲得バッジのドキュメントは badge_id をキーにする（badges/{badge_id}）。"""
+    return db.collection("users").document(user_id).collection("badges").document(badge_id)
+
+
+def build_badge_doc(badge_id: str, context: Optional[dict] = None) -> dict:
+    """獲得バッジのドキュメントデータを作成する。"""
+    return {
+        "badge_id": badge_id,
+        "earned_at": _now(),
+        "context": context,
+    }
+
+
 async def has_badge(user_id: str, badge_id: str) -> bool:
     """ユーザーがバッジを持っているか確認する。"""
-    badges = await list_user_badges(user_id)
-    return any(b.get("badge_id") == badge_id for b in badges)
+    db: AsyncClient = get_firestore_client()
+    doc = await get_badge_ref(db, user_id, badge_id).get()
+    return doc.exists
 
 
 async def list_user_badges(user_id: str) -> list[dict]:
     """ユーザーの獲得バッジ一覧を取得する。"""
-    from google.cloud.firestore import AsyncClient
-
-    from knowva.dependencies import get_firestore_client
-
     db: AsyncClient = get_firestore_client()
     docs = (
         db.collection("users")
@@ -41,31 +56,22 @@ async def award_badge(
 ) -> Optional[dict]:
     """バッジを付与する（重複チェック付き）。
 
+    ドキュメントIDを badge_id に固定し create で書き込むため、
+    一覧取得なしの1回の書き込みで重複を防げる。
     既に持っている場合はNoneを返す。
     """
-    from google.cloud.firestore import AsyncClient
-
-    from knowva.dependencies import get_firestore_client
-
     # バッジ定義が存在するか確認
     definition = get_badge_definition(badge_id)
     if not definition:
         return None
 
-    # 既に持っているか確認
-    if await has_badge(user_id, badge_id):
-        return None
-
-    # バッジを付与
     db: AsyncClient = get_firestore_client()
-    doc_ref = db.collection("users").document(user_id).collection("badges").document()
-    now = _now()
-    doc_data = {
-        "badge_id": badge_id,
-        "earned_at": now,
-        "context": context,
-    }
-    await doc_ref.set(doc_data)
+    doc_ref = get_badge_ref(db, user_id, badge_id)
+    doc_data = build_badge_doc(badge_id, context)
+    try:
+        await doc_ref.create(doc_data)
+    except AlreadyExists:
+        return None
     return {"id": doc_ref.id, **doc_data}
 
 
@@ -1,11 +1,13 @@
 """External book search API integrations (Google Books, openBD)."""
 
 import logging
+import time
 from typing import Optional
 
 import httpx
 
 from knowva.config import settings
+from knowva.services import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +15,19 @@ GOOGLE_BOOKS_API = "https://www.googleapis.com/books/v1/volumes"
 OPENBD_API = "https://api.openbd.jp/v1/get"
 
 
+async def _get(client: httpx.AsyncClient, api: str, url: str, params: dict) -> httpx.Response:
+    """GETしてステータスを確認する。所要時間を api ごとにメトリクスへ記録する。"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        outcome = "ok"
+        return response
+    finally:
+        metrics.EXTERNAL_API_DURATION.observe(time.perf_counter() - started, api, outcome)
+
+
 async def search_google_books(query: str, max_results: int = 10) -> list[dict]:
     """Search books using Google Books API.
 
@@ -35,8 +50,7 @@ async def search_google_books(query: str, max_results: int = 10) -> list[dict]:
             if settings.google_books_api_key:
                 params["key"] = settings.google_books_api_key
 
-            response = await client.get(GOOGLE_BOOKS_API, params=params)
-            response.raise_for_status()
+            response = await _get(client, "google_books", GOOGLE_BOOKS_API, params)
             data = response.json()
             return _parse_google_books_response(data)
         except httpx.HTTPError as e:
@@ -61,8 +75,7 @@ async def fetch_openbd(isbn: str) -> Optional[dict]:
 
     async with httpx.AsyncClient(timeout=10.0) as client:
         try:
-            response = await client.get(OPENBD_API, params={"isbn": normalized_isbn})
-            response.raise_for_status()
+            response = await _get(client, "openbd", OPENBD_API, {"isbn": normalized_isbn})
             data = response.json()
 
             # openBD returns array, first element is the book (or null if not found)
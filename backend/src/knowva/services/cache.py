@@ -0,0 +1,56 @@
+"""プロセス内の簡易TTLキャッシュ。
+
+Cloud Runのインスタンスごとに保持されるため、インスタンス間では共有されない。
+書き込み側で invalidate することで同一インスタンス内の整合性を保ち、
+他インスタンスの古い値はTTLで自然に失効させる。
+名前を付けたキャッシュはヒット率がメトリクス（/metrics）に出る。
+"""
+
+import time
+from typing import Any, Optional
+
+_named: dict[str, "TTLCache"] = {}
+
+
+def named_caches() -> dict[str, "TTLCache"]:
+    """名前付きで生成されたキャッシュの一覧。"""
+    return _named
+
+
+class TTLCache:
+    """キーごとに有効期限を持つ辞書ベースのキャッシュ。"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 1024, name: Optional[str] = None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[float, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        if name is not None:
+            _named[name] = self
+
+    def get(self, key: str) -> Optional[Any]:
+        """有効なエントリがあれば値を返す。期限切れ・未登録はNone。"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        """値を登録する。上限を超えた場合は最も古いエントリから捨てる。"""
+        self._entries.pop(key, None)
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def invalidate(self, key: str) -> None:
+        """エントリを削除する。"""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """全エントリを削除する。"""
+        self._entries.clear()
@@ -0,0 +1,123 @@
+"""SSEクライアント切断時のADK実行の打ち切り。
+
+sse_starlette はクライアント切断（http.disconnect）を検知すると配信タスクを
+キャンセルする。キャンセルは event_generator 内で待機中の箇所に届くため、
+run_async の内部（モデル呼び出し・ツール実行中）であればそのまま伝播して止まる。
+イベントの yield 中に切断された場合は、ジェネレーターが GeneratorExit で閉じられる。
+
+どちらの場合も cancellable_run() が ADK の実行ジェネレーターを閉じ、
+呼び出し側の後始末（on_cancel）を実行して、キャンセル件数を記録する。
+
+部分応答の扱い: 切断された生成の途中テキストは保存しない。
+呼び出し側は on_cancel で、ADKセッションのメモリ上の途中イベントを破棄するなど
+永続化済みのメッセージと整合する状態に戻すこと。
+"""
+
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+
+class _GenerationStats:
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        # キャンセル時点で生成済みだった（破棄した）文字数の合計
+        self.discarded_chars = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "discarded_chars": self.discarded_chars,
+        }
+
+
+_stats: dict[str, _GenerationStats] = {}
+
+
+class GenerationRun:
+    """1回の生成の進捗。
+
+    呼び出し側は受信したテキストを partial_text に反映するか、
+    track() でテキストの取得元を登録する（キャンセル時にのみ参照される）。
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.cancelled = False
+        self._partial_text = ""
+        self._text_source: Optional[Callable[[], str]] = None
+
+    @property
+    def partial_text(self) -> str:
+        if self._text_source is not None:
+            return self._text_source()
+        return self._partial_text
+
+    @partial_text.setter
+    def partial_text(self, value: str) -> None:
+        self._text_source = None
+        self._partial_text = value
+
+    def track(self, text_source: Callable[[], str]) -> None:
+        self._text_source = text_source
+
+
+@asynccontextmanager
+async def cancellable_run(
+    kind: str,
+    events: AsyncGenerator[Any, None],
+    on_cancel: Optional[Callable[[GenerationRun], Awaitable[None]]] = None,
+) -> AsyncGenerator[GenerationRun, None]:
+    """ADKの run_async をクライアント切断で打ち切れるようにする。
+
+    Args:
+        kind: メトリクス用の生成種別（"reading_chat", "session_init", "report" など）。
+        events: runner.run_async() が返すジェネレーター。
+        on_cancel: キャンセル時の後始末。キャンセル中でも完了するよう保護して実行する。
+    """
+    stats = _stats.setdefault(kind, _GenerationStats())
+    stats.started += 1
+    run = GenerationRun(kind)
+    try:
+        yield run
+    except (asyncio.CancelledError, GeneratorExit):
+        run.cancelled = True
+        stats.cancelled += 1
+        stats.discarded_chars += len(run.partial_text)
+        logger.info(f"Generation cancelled by client disconnect: {kind}")
+        # キャンセルスコープ内でも後始末のawaitを完了させる
+        with anyio.CancelScope(shield=True):
+            try:
+                await events.aclose()
+                if on_cancel is not None:
+                    await on_cancel(run)
+            except Exception as e:
+                logger.warning(f"Cleanup after cancelled generation failed: {e}")
+        raise
+    else:
+        stats.completed += 1
+    finally:
+        await _aclose_quietly(events)
+
+
+async def _aclose_quietly(events: AsyncGenerator[Any, None]) -> None:
+    with anyio.CancelScope(shield=True):
+        try:
+            await events.aclose()
+        except Exception:
+            pass
+
+
+def snapshot() -> dict:
+    """生成種別ごとの開始・完了・キャンセル件数を返す。"""
+    return {kind: stats.to_dict() for kind, stats in _stats.items()}
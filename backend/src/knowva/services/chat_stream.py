@@ -0,0 +1,114 @@
+"""メンター・プロファイルチャットの共通処理（ユーザーごとに1つのADKセッションを使う）。
+
+SSE版は読書セッションと同じイベントモデル（message_start / text_delta /
+tool_call_* / text_done / message_done）で配信し、ストリームハブ経由で
+Last-Event-ID による再接続にも対応する。これらのチャットは応答をFirestoreに保存しない。
+"""
+
+import logging
+import time
+from collections.abc import AsyncGenerator
+from datetime import datetime, timezone
+
+from google.adk.sessions import Session
+from google.genai import types
+from sse_starlette import ServerSentEvent
+
+from knowva.services import agent_registry
+from knowva.services.cancellation import GenerationRun, cancellable_run
+from knowva.services.llm_scheduler import LLMSlot, hold_slot
+from knowva.services.session_service import get_session_service
+from knowva.services.sse_emitter import TextDelta
+from knowva.services.stream_hub import ReplayStream, get_stream_hub
+from knowva.services.stream_translator import StreamTranslator, error_event, sse_event
+
+logger = logging.getLogger(__name__)
+
+ERROR_TEXT = "申し訳ございません。エラーが発生しました。もう一度お試しください。"
+NO_RESPONSE_TEXT = "申し訳ございません。応答を生成できませんでした。もう一度お試しください。"
+
+
+async def ensure_chat_session(app_name: str, user_id: str, session_id: str) -> Session:
+    """ADKセッションを取得し、なければ作成する。"""
+    session_service = get_session_service()
+    session = await session_service.get_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    )
+    if session:
+        return session
+    return await session_service.create_session(
+        app_name=app_name,
+        user_id=user_id,
+        session_id=session_id,
+        state={"user_id": user_id},
+    )
+
+
+def start_chat_stream(
+    *,
+    app_name: str,
+    kind: str,
+    user_id: str,
+    session_id: str,
+    message: str,
+    scope: str,
+    llm_slot: LLMSlot,
+) -> ReplayStream:
+    """エージェントの応答生成をストリームとして開始する。
+
+    Args:
+        kind: キャンセル件数・ストリームのメトリクス用の生成種別（"mentor_chat" など）。
+        scope: 再接続先のURLと対応づけるストリームのスコープ。
+        llm_slot: 確保済みのLLMスロット。ストリーム終了時に解放される。
+    """
+    message_id = f"msg_{session_id}_{int(time.time() * 1000)}"
+
+    async def discard_adk_session(run: GenerationRun) -> None:
+        # 途中までの応答を含むメモリ上のセッションを破棄する
+        get_session_service().evict_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    async def event_generator() -> AsyncGenerator[ServerSentEvent | TextDelta, None]:
+        await ensure_chat_session(app_name, user_id, session_id)
+        runner = agent_registry.get_runner(app_name)
+        user_content = types.Content(role="user", parts=[types.Part(text=message)])
+        translator = StreamTranslator()
+
+        yield sse_event("message_start", {"message_id": message_id})
+
+        events = runner.run_async(user_id=user_id, session_id=session_id, new_message=user_content)
+        async with cancellable_run(kind, events, on_cancel=discard_adk_session) as run:
+            run.track(lambda: translator.text)
+            try:
+                async for event in events:
+                    for sse in translator.translate(event):
+                        yield sse
+            except Exception as e:
+                logger.error(f"ADK runner error ({app_name}): {e}", exc_info=True)
+                yield error_event("runner_error", ERROR_TEXT)
+                return
+
+        response_text = translator.text
+        if not response_text:
+            logger.warning(f"No response text from ADK runner ({app_name})")
+            response_text = NO_RESPONSE_TEXT
+            yield TextDelta(response_text)
+
+        yield sse_event("text_done", {"text": response_text})
+        yield sse_event(
+            "message_done",
+            {
+                "message": {
+                    "id": message_id,
+                    "role": "assistant",
+                    "message": response_text,
+                    "input_type": "text",
+                    "created_at": datetime.now(timezone.utc),
+                }
+            },
+        )
+
+    return get_stream_hub().start(
+        message_id, user_id, scope, hold_slot(event_generator(), llm_slot), kind=kind
+    )
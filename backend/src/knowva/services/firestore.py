@@ -1,16 +1,59 @@
 from datetime import datetime, timezone
 from typing import Optional
 
-from google.cloud.firestore import AsyncClient
+from google.cloud.firestore import (
+    AsyncClient,
+    AsyncDocumentReference,
+    AsyncTransaction,
+    Increment,
+    async_transactional,
+)
 from google.cloud.firestore_v1.base_query import FieldFilter
 
 from knowva.dependencies import get_firestore_client
+from knowva.services import user_service
+
+# Firestoreの1バッチあたりの書き込み上限
+BATCH_WRITE_LIMIT = 500
 
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+async def _batch_delete(
+    db: AsyncClient,
+    refs: list[AsyncDocumentReference],
+    merge_write: Optional[tuple[AsyncDocumentReference, dict]] = None,
+) -> None:
+    """ドキュメント参照をWriteBatchでまとめて削除する（上限ごとに分割コミット）。
+
+    merge_write を渡すと、同じ set(merge=True) を各バッチに含める
+    （活動カウンターなど、削除と同時にコミットしたい書き込み用）。
+    """
+    # merge_write の分を空ける。削除を対で並べる呼び出し元のため偶数に保つ
+    size = BATCH_WRITE_LIMIT - 2 if merge_write is not None else BATCH_WRITE_LIMIT
+    for start in range(0, len(refs), size):
+        batch = db.batch()
+        for ref in refs[start : start + size]:
+            batch.delete(ref)
+        if merge_write is not None:
+            batch.set(*merge_write, merge=True)
+        await batch.commit()
+
+
+def _activity_fields(kind: str) -> dict:
+    """users/{uid}.activity の活動カウンターを進める書き込み内容（merge=True で使う）。
+
+    メンターの活動フィンガープリントがこのカウンターで変化を検出する。
+    書き込み後は user_service.invalidate() を呼ぶこと。
+    """
+    now = _now()
+    return {
+        "activity": {f"{kind}_count": Increment(1), f"{kind}_updated_at": now, "updated_at": now}
+    }
+
+
 # --- Readings ---
 
 
@@ -148,21 +191,25 @@ async def delete_reading_cascade(user_id: str, reading_id: str) -> dict:
         counts["sessions"] += 1
 
     # Insightsを削除（publicInsightsも連動削除）
+    insight_ids = []
     async for insight_doc in base_path.collection("insights").stream():
-        insight_id = insight_doc.id
+        insight_ids.append(insight_doc.id)
         await insight_doc.reference.delete()
-        await delete_public_insight(insight_id)
         counts["insights"] += 1
+    await delete_public_insights(insight_ids)
 
     # Moodsを削除
     async for mood_doc in base_path.collection("moods").stream():
         await mood_doc.reference.delete()
         counts["moods"] += 1
 
-    # Reportsを削除
+    # Reportsを削除（publicReportsも連動削除）
+    report_ids = []
     async for report_doc in base_path.collection("reports").stream():
+        report_ids.append(report_doc.id)
         await report_doc.reference.delete()
         counts["reports"] += 1
+    await delete_public_reports(report_ids)
 
     # Action Plansを削除
     async for plan_doc in base_path.collection("actionPlans").stream():
@@ -281,25 +328,40 @@ async def delete_session(user_id: str, reading_id: str, session_id: str) -> bool
 
 
 async def save_message(user_id: str, reading_id: str, session_id: str, data: dict) -> dict:
+    """メッセージを保存し、セッションの message_count を1増やす。"""
     db: AsyncClient = get_firestore_client()
-    doc_ref = (
+    session_ref = (
         db.collection("users")
         .document(user_id)
         .collection("readings")
         .document(reading_id)
         .collection("sessions")
         .document(session_id)
-        .collection("messages")
-        .document()
     )
+    doc_ref = session_ref.collection("messages").document()
     doc_data = {**data, "created_at": _now()}
-    await doc_ref.set(doc_data)
+    batch = db.batch()
+    batch.set(doc_ref, doc_data)
+    batch.update(session_ref, {"message_count": Increment(1)})
+    await batch.commit()
     return {"id": doc_ref.id, **doc_data}
 
 
-async def list_messages(user_id: str, reading_id: str, session_id: str) -> list[dict]:
+async def list_messages(
+    user_id: str,
+    reading_id: str,
+    session_id: str,
+    after: Optional[datetime] = None,
+    last: Optional[int] = None,
+) -> list[dict]:
+    """メッセージを古い順に取得する。
+
+    Args:
+        after: 指定時刻より後に作成されたメッセージのみ取得する。
+        last: 新しいものから指定件数のみ取得する（結果は古い順）。
+    """
     db: AsyncClient = get_firestore_client()
-    docs = (
+    messages_ref = (
         db.collection("users")
         .document(user_id)
         .collection("readings")
@@ -307,11 +369,69 @@ async def list_messages(user_id: str, reading_id: str, session_id: str) -> list[
         .collection("sessions")
         .document(session_id)
         .collection("messages")
-        .order_by("created_at")
     )
+    query = messages_ref
+    if after is not None:
+        query = query.where(filter=FieldFilter("created_at", ">", after))
+    if last is not None:
+        query = query.order_by("created_at", direction="DESCENDING").limit(last)
+    else:
+        query = query.order_by("created_at")
     results = []
-    async for doc in docs.stream():
+    async for doc in query.stream():
         results.append({"id": doc.id, **doc.to_dict()})
+    if last is not None:
+        results.reverse()
+    return results
+
+
+# --- SSE Stream Replay (再接続用イベントの退避) ---
+
+
+def _stream_events_ref(db: AsyncClient, user_id: str, stream_id: str):
+    return (
+        db.collection("users")
+        .document(user_id)
+        .collection("sse_streams")
+        .document(stream_id)
+        .collection("events")
+    )
+
+
+async def save_stream_events(
+    user_id: str, stream_id: str, events: list[dict], expires_at: datetime
+) -> None:
+    """SSEイベント（id, event, data）をまとめて保存する。
+
+    expires_at は Firestore の TTL ポリシーで自動削除するためのフィールド。
+    """
+    db: AsyncClient = get_firestore_client()
+    events_ref = _stream_events_ref(db, user_id, stream_id)
+    for start in range(0, len(events), BATCH_WRITE_LIMIT):
+        batch = db.batch()
+        for event in events[start : start + BATCH_WRITE_LIMIT]:
+            # ドキュメントIDをゼロ埋めしてid順に並ぶようにする
+            batch.set(
+                events_ref.document(f"{event['id']:08d}"),
+                {**event, "expires_at": expires_at},
+            )
+        await batch.commit()
+
+
+async def list_stream_events(
+    user_id: str, stream_id: str, after_id: int, before_id: Optional[int] = None
+) -> list[dict]:
+    """退避済みのSSEイベントを after_id より後（before_id 未満）からid順に取得する。"""
+    db: AsyncClient = get_firestore_client()
+    query = _stream_events_ref(db, user_id, stream_id).where(
+        filter=FieldFilter("id", ">", after_id)
+    )
+    if before_id is not None:
+        query = query.where(filter=FieldFilter("id", "<", before_id))
+    results = []
+    async for doc in query.order_by("id").stream():
+        data = doc.to_dict()
+        results.append({"id": data["id"], "event": data.get("event"), "data": data.get("data")})
     return results
 
 
@@ -329,7 +449,11 @@ async def save_insight(user_id: str, reading_id: str, data: dict) -> dict:
         .document()
     )
     doc_data = {**data, "created_at": _now()}
-    await doc_ref.set(doc_data)
+    batch = db.batch()
+    batch.set(doc_ref, doc_data)
+    batch.set(db.collection("users").document(user_id), _activity_fields("insights"), merge=True)
+    await batch.commit()
+    user_service.invalidate(user_id)
     return {"id": doc_ref.id, **doc_data}
 
 
@@ -369,33 +493,43 @@ async def update_insight(
     update_data = {k: v for k, v in data.items() if v is not None}
     update_data["updated_at"] = _now()
 
-    await doc_ref.update(update_data)
+    batch = db.batch()
+    batch.update(doc_ref, update_data)
+    batch.set(db.collection("users").document(user_id), _activity_fields("insights"), merge=True)
+    await batch.commit()
+    user_service.invalidate(user_id)
     updated = await doc_ref.get()
     return {"id": updated.id, **updated.to_dict()}
 
 
 async def delete_insights(user_id: str, reading_id: str, insight_ids: list[str]) -> dict:
-    """複数のInsightを削除する。関連するpublicInsightsも削除。"""
-    db: AsyncClient = get_firestore_client()
-    deleted_count = 0
-
-    for insight_id in insight_ids:
-        doc_ref = (
-            db.collection("users")
-            .document(user_id)
-            .collection("readings")
-            .document(reading_id)
-            .collection("insights")
-            .document(insight_id)
-        )
-        doc = await doc_ref.get()
-        if doc.exists:
-            await doc_ref.delete()
-            # 関連するpublicInsightも削除
-            await delete_public_insight(insight_id)
-            deleted_count += 1
+    """複数のInsightを削除する。関連するpublicInsightsも削除。
 
-    return {"deleted_count": deleted_count}
+    存在確認は get_all で1回にまとめ、削除は WriteBatch でコミットする。
+    """
+    db: AsyncClient = get_firestore_client()
+    insights_ref = (
+        db.collection("users")
+        .document(user_id)
+        .collection("readings")
+        .document(reading_id)
+        .collection("insights")
+    )
+    refs = [insights_ref.document(insight_id) for insight_id in dict.fromkeys(insight_ids)]
+    existing_ids = [snapshot.id async for snapshot in db.get_all(refs) if snapshot.exists]
+
+    # Insightと公開Insightを交互に並べ、バッチ分割時も対で削除されるようにする
+    delete_refs = []
+    for insight_id in existing_ids:
+        delete_refs.append(insights_ref.document(insight_id))
+        delete_refs.append(_public_insight_ref(db, insight_id))
+    # 活動カウンターは削除と同じバッチでコミットする
+    activity = (db.collection("users").document(user_id), _activity_fields("insights"))
+    await _batch_delete(db, delete_refs, merge_write=activity)
+    if existing_ids:
+        user_service.invalidate(user_id)
+
+    return {"deleted_count": len(existing_ids)}
 
 
 async def merge_insights(
@@ -407,66 +541,65 @@ async def merge_insights(
 ) -> dict:
     """複数のInsightを1つにマージする。
 
-    元のInsightを削除し、新しいマージ済みInsightを作成する。
+    元のInsight（と公開Insight）を削除し、新しいマージ済みInsightを作成する。
+    読み取りと書き込みを1つのトランザクションで行うため、途中で失敗しても
+    中途半端にマージされた状態は残らない。
     """
     db: AsyncClient = get_firestore_client()
-
-    # 元のInsightを取得して情報を保持
-    original_insights = []
-    for insight_id in source_insight_ids:
-        insight = await get_insight(user_id, reading_id, insight_id)
-        if insight:
-            original_insights.append(insight)
-            # 関連するpublicInsightも削除
-            await delete_public_insight(insight_id)
-
-    if not original_insights:
-        return {"status": "error", "error": "No insights found"}
-
-    # 最も古いcreated_atを持つInsightのreading_statusを使用
-    oldest_insight = min(original_insights, key=lambda x: x.get("created_at", ""))
-    reading_status = oldest_insight.get("reading_status")
-
-    # 元のInsightを削除
-    for insight_id in source_insight_ids:
-        doc_ref = (
-            db.collection("users")
-            .document(user_id)
-            .collection("readings")
-            .document(reading_id)
-            .collection("insights")
-            .document(insight_id)
-        )
-        doc = await doc_ref.get()
-        if doc.exists:
-            await doc_ref.delete()
-
-    # 新しいマージ済みInsightを作成
-    now = _now()
-    doc_ref = (
+    insights_ref = (
         db.collection("users")
         .document(user_id)
         .collection("readings")
         .document(reading_id)
         .collection("insights")
-        .document()
     )
-    doc_data = {
-        "content": merged_content,
-        "type": merged_type,
-        "reading_status": reading_status,
-        "merged_from": [
-            {
-                "insight_id": i["id"],
-                "original_content": i.get("content"),
-            }
-            for i in original_insights
-        ],
-        "is_merged": True,
-        "created_at": now,
-    }
-    await doc_ref.set(doc_data)
-    return {"id": doc_ref.id, **doc_data}
+    source_ids = list(dict.fromkeys(source_insight_ids))
+    refs = [insights_ref.document(insight_id) for insight_id in source_ids]
+    merged_ref = insights_ref.document()
+
+    @async_transactional
+    async def _merge_in_transaction(transaction: AsyncTransaction) -> Optional[dict]:
+        found = {}
+        async for snapshot in db.get_all(refs, transaction=transaction):
+            if snapshot.exists:
+                found[snapshot.id] = {"id": snapshot.id, **snapshot.to_dict()}
+        # get_allの返却順は保証されないため、リクエスト順に並べ直す
+        original_insights = [found[i] for i in source_ids if i in found]
+        if not original_insights:
+            return None
+
+        # 最も古いcreated_atを持つInsightのreading_statusを使用
+        oldest_insight = min(original_insights, key=lambda x: x.get("created_at", ""))
+
+        doc_data = {
+            "content": merged_content,
+            "type": merged_type,
+            "reading_status": oldest_insight.get("reading_status"),
+            "merged_from": [
+                {
+                    "insight_id": i["id"],
+                    "original_content": i.get("content"),
+                }
+                for i in original_insights
+            ],
+            "is_merged": True,
+            "created_at": _now(),
+        }
+
+        for insight in original_insights:
+            transaction.delete(insights_ref.document(insight["id"]))
+            transaction.delete(_public_insight_ref(db, insight["id"]))
+        transaction.set(merged_ref, doc_data)
+        transaction.set(
+            db.collection("users").document(user_id), _activity_fields("insights"), merge=True
+        )
+        return {"id": merged_ref.id, **doc_data}
+
+    result = await _merge_in_transaction(db.transaction())
+    user_service.invalidate(user_id)
+    if result is None:
+        return {"status": "error", "error": "No insights found"}
+    return result
 
 
 # --- User Profile ---
@@ -474,20 +607,18 @@ async def merge_insights(
 
 async def get_user_profile(user_id: str) -> Optional[dict]:
     """ユーザーのcurrent_profileを取得する。"""
-    db: AsyncClient = get_firestore_client()
-    doc = await db.collection("users").document(user_id).get()
-    if doc.exists:
-        data = doc.to_dict()
-        return data.get("current_profile", {})
-    return None
+    user_doc = await user_service.get_user_document(user_id)
+    return user_doc.current_profile
 
 
 async def ensure_user_exists(user_id: str, email: Optional[str] = None) -> dict:
     """ユーザードキュメントが存在しない場合は作成する。"""
-    db: AsyncClient = get_firestore_client()
-    doc_ref = db.collection("users").document(user_id)
-    doc = await doc_ref.get()
-    if not doc.exists:
+    user_doc = await user_service.get_user_document(user_id)
+    if not user_doc.exists:
+        # キャッシュの「未作成」は他インスタンスで作成済みの可能性があるため読み直す
+        user_doc = await user_service.load_user_document(user_id)
+    if not user_doc.exists:
+        db: AsyncClient = get_firestore_client()
         data = {
             "email": email,
             "name": None,
@@ -495,9 +626,10 @@ async def ensure_user_exists(user_id: str, email: Optional[str] = None) -> dict:
             "settings": {"interaction_mode": "guided"},
             "created_at": _now(),
         }
-        await doc_ref.set(data)
+        await db.collection("users").document(user_id).set(data)
+        user_service.invalidate(user_id)
         return {"user_id": user_id, **data}
-    return {"user_id": doc.id, **doc.to_dict()}
+    return {"user_id": user_id, **user_doc.to_dict()}
 
 
 # --- User Settings ---
@@ -505,34 +637,17 @@ async def ensure_user_exists(user_id: str, email: Optional[str] = None) -> dict:
 
 async def get_user_settings(user_id: str) -> dict:
     """ユーザー設定を取得する。存在しない場合はデフォルト値を返す。"""
-    db: AsyncClient = get_firestore_client()
-    doc = await db.collection("users").document(user_id).get()
-    if doc.exists:
-        data = doc.to_dict()
-        settings = data.get("settings", {})
-        # デフォルト値の補完
-        return {
-            "interaction_mode": settings.get("interaction_mode", "guided"),
-            "timeline_order": settings.get("timeline_order", "random"),
-            "fab_position": settings.get("fab_position", "left"),
-            "chat_initiator": settings.get("chat_initiator", "ai"),
-        }
-    # ドキュメントが存在しない場合はデフォルト値
-    return {
-        "interaction_mode": "guided",
-        "timeline_order": "random",
-        "fab_position": "left",
-        "chat_initiator": "ai",
-    }
+    user_doc = await user_service.get_user_document(user_id)
+    return user_doc.settings
 
 
 async def update_user_settings(user_id: str, settings: dict) -> dict:
     """ユーザー設定を更新する。"""
     db: AsyncClient = get_firestore_client()
     doc_ref = db.collection("users").document(user_id)
-    doc = await doc_ref.get()
+    user_doc = await user_service.load_user_document(user_id)
 
-    if not doc.exists:
+    if not user_doc.exists:
         # ドキュメントが存在しない場合は作成
         data = {
             "email": None,
@@ -542,121 +657,119 @@ async def update_user_settings(user_id: str, settings: dict) -> dict:
             "created_at": _now(),
         }
         await doc_ref.set(data)
+        user_service.invalidate(user_id)
         return settings
 
     # 既存のsettingsとマージ
-    current_settings = doc.to_dict().get("settings", {})
-    updated_settings = {**current_settings, **settings}
+    updated_settings = {**user_doc.raw_settings, **settings}
     await doc_ref.update({"settings": updated_settings})
+    user_service.invalidate(user_id)
     return updated_settings
 
 
 # --- Mood Records (読書前後の心境) ---
 
 
-async def save_mood(user_id: str, reading_id: str, data: dict) -> dict:
-    """心境記録を保存する。mood_type (before/after) ごとに1件のみ。"""
-    db: AsyncClient = get_firestore_client()
-    mood_type = data.get("mood_type")
+MOOD_TYPES = ("before", "after")
+MOOD_METRIC_KEYS = ["energy", "positivity", "clarity", "motivation", "openness"]
+
 
-    # mood_typeが同じ既存レコードがあるか確認
-    existing_docs = (
+def _mood_ref(
+    db: AsyncClient, user_id: str, reading_id: str, mood_type: str
+) -> AsyncDocumentReference:
+    """心境記録のドキュメントは mood_type をキーにする（moods/{mood_type}）。"""
+    return (
         db.collection("users")
         .document(user_id)
         .collection("readings")
         .document(reading_id)
         .collection("moods")
-        .where(filter=FieldFilter("mood_type", "==", mood_type))
+        .document(mood_type)
     )
-    existing = None
-    async for doc in existing_docs.stream():
-        existing = doc
-        break
 
-    now = _now()
 
-    if existing:
-        # 既存レコードを更新
-        doc_ref = existing.reference
+async def save_mood(user_id: str, reading_id: str, data: dict) -> dict:
+    """心境記録を保存する。mood_type (before/after) ごとに1件のみ。
+
+    ドキュメントIDを mood_type に固定し、トランザクション内でupsertするため
+    同時に保存されても重複レコードは作られない。
+    """
+    db: AsyncClient = get_firestore_client()
+    mood_type = data.get("mood_type")
+    doc_ref = _mood_ref(db, user_id, reading_id, mood_type)
+
+    @async_transactional
+    async def _upsert(transaction: AsyncTransaction) -> dict:
+        snapshot = await doc_ref.get(transaction=transaction)
+        now = _now()
         update_data = {
+            "user_id": user_id,
             "metrics": data.get("metrics"),
             "note": data.get("note"),
             "dominant_emotion": data.get("dominant_emotion"),
             "recorded_at": now,
             "updated_at": now,
         }
-        await doc_ref.update(update_data)
-        updated = await doc_ref.get()
-        return {"id": updated.id, **updated.to_dict()}
-    else:
+        if snapshot.exists:
+            # 既存レコードを更新
+            transaction.update(doc_ref, update_data)
+            return {"id": doc_ref.id, **snapshot.to_dict(), **update_data}
+
         # 新規作成
-        doc_ref = (
-            db.collection("users")
-            .document(user_id)
-            .collection("readings")
-            .document(reading_id)
-            .collection("moods")
-            .document()
-        )
         doc_data = {
             "reading_id": reading_id,
             "mood_type": mood_type,
-            "metrics": data.get("metrics"),
-            "note": data.get("note"),
-            "dominant_emotion": data.get("dominant_emotion"),
-            "recorded_at": now,
+            **update_data,
             "created_at": now,
-            "updated_at": now,
         }
-        await doc_ref.set(doc_data)
+        transaction.set(doc_ref, doc_data)
         return {"id": doc_ref.id, **doc_data}
 
+    return await _upsert(db.transaction())
+
 
 async def get_mood(user_id: str, reading_id: str, mood_type: str) -> Optional[dict]:
     """特定の心境記録を取得する。"""
     db: AsyncClient = get_firestore_client()
-    docs = (
-        db.collection("users")
-        .document(user_id)
-        .collection("readings")
-        .document(reading_id)
-        .collection("moods")
-        .where(filter=FieldFilter("mood_type", "==", mood_type))
-    )
-    async for doc in docs.stream():
+    doc = await _mood_ref(db, user_id, reading_id, mood_type).get()
+    if doc.exists:
         return {"id": doc.id, **doc.to_dict()}
     return None
 
 
+async def _get_moods_by_type(user_id: str, reading_id: str) -> dict[str, dict]:
+    """before/after の心境記録を get_all で一括取得する。"""
+    db: AsyncClient = get_firestore_client()
+    refs = [_mood_ref(db, user_id, reading_id, mood_type) for mood_type in MOOD_TYPES]
+    moods = {}
+    async for doc in db.get_all(refs):
+        if doc.exists:
+            moods[doc.id] = {"id": doc.id, **doc.to_dict()}
+    return moods
+
+
 async def list_moods(user_id: str, reading_id: str) -> list[dict]:
     """読書記録に紐づくすべての心境記録を取得する。"""
+    moods = await _get_moods_by_type(user_id, reading_id)
+    # 従来の order_by("mood_type") と同じ並び（after, before）
+    return [moods[mood_type] for mood_type in sorted(moods)]
+
+
+async def list_user_moods(user_id: str) -> list[dict]:
+    """ユーザーの全読書の心境記録をコレクショングループクエリで取得する。"""
     db: AsyncClient = get_firestore_client()
-    docs = (
-        db.collection("users")
-        .document(user_id)
-        .collection("readings")
-        .document(reading_id)
-        .collection("moods")
-        .order_by("mood_type")
-    )
+    query = db.collection_group("moods").where(filter=FieldFilter("user_id", "==", user_id))
     results = []
-    async for doc in docs.stream():
+    async for doc in query.stream():
         results.append({"id": doc.id, **doc.to_dict()})
     return results
 
 
 async def get_mood_comparison(user_id: str, reading_id: str) -> dict:
     """読書前後の心境比較データを取得する。"""
-    moods = await list_moods(user_id, reading_id)
-
-    before_mood = None
-    after_mood = None
-
-    for mood in moods:
-        if mood.get("mood_type") == "before":
-            before_mood = mood
-        elif mood.get("mood_type") == "after":
-            after_mood = mood
+    moods = await _get_moods_by_type(user_id, reading_id)
+    before_mood = moods.get("before")
+    after_mood = moods.get("after")
 
     # 変化量を計算
     changes = None
@@ -664,8 +777,7 @@ async def get_mood_comparison(user_id: str, reading_id: str) -> dict:
         before_metrics = before_mood.get("metrics", {})
         after_metrics = after_mood.get("metrics", {})
         changes = {
-            key: after_metrics.get(key, 0) - before_metrics.get(key, 0)
-            for key in ["energy", "positivity", "clarity", "motivation", "openness"]
+            key: after_metrics.get(key, 0) - before_metrics.get(key, 0) for key in MOOD_METRIC_KEYS
         }
 
     return {
@@ -682,14 +794,19 @@ async def get_mood_comparison(user_id: str, reading_id: str) -> dict:
 async def save_profile_entry(user_id: str, data: dict) -> dict:
     """プロファイルエントリを保存する。"""
     db: AsyncClient = get_firestore_client()
-    doc_ref = db.collection("users").document(user_id).collection("profileEntries").document()
+    user_ref = db.collection("users").document(user_id)
+    doc_ref = user_ref.collection("profileEntries").document()
     now = _now()
     doc_data = {
         **data,
         "created_at": now,
         "updated_at": now,
     }
-    await doc_ref.set(doc_data)
+    batch = db.batch()
+    batch.set(doc_ref, doc_data)
+    batch.set(user_ref, _activity_fields("profile_entries"), merge=True)
+    await batch.commit()
+    user_service.invalidate(user_id)
     return {"id": doc_ref.id, **doc_data}
 
 
@@ -712,9 +829,8 @@ async def list_profile_entries(user_id: str, entry_type: Optional[str] = None) -
 async def update_profile_entry(user_id: str, entry_id: str, data: dict) -> Optional[dict]:
     """プロファイルエントリを更新する。"""
     db: AsyncClient = get_firestore_client()
-    doc_ref = (
-        db.collection("users").document(user_id).collection("profileEntries").document(entry_id)
-    )
+    user_ref = db.collection("users").document(user_id)
+    doc_ref = user_ref.collection("profileEntries").document(entry_id)
     doc = await doc_ref.get()
     if not doc.exists:
         return None
@@ -722,7 +838,11 @@ async def update_profile_entry(user_id: str, entry_id: str, data: dict) -> Optio
     update_data = {k: v for k, v in data.items() if v is not None}
     update_data["updated_at"] = _now()
 
-    await doc_ref.update(update_data)
+    batch = db.batch()
+    batch.update(doc_ref, update_data)
+    batch.set(user_ref, _activity_fields("profile_entries"), merge=True)
+    await batch.commit()
+    user_service.invalidate(user_id)
     updated = await doc_ref.get()
     return {"id": updated.id, **updated.to_dict()}
 
@@ -730,13 +850,16 @@ async def update_profile_entry(user_id: str, entry_id: str, data: dict) -> Optio
 async def delete_profile_entry(user_id: str, entry_id: str) -> bool:
     """プロファイルエントリを削除する。"""
     db: AsyncClient = get_firestore_client()
-    doc_ref = (
-        db.collection("users").document(user_id).collection("profileEntries").document(entry_id)
-    )
+    user_ref = db.collection("users").document(user_id)
+    doc_ref = user_ref.collection("profileEntries").document(entry_id)
     doc = await doc_ref.get()
     if not doc.exists:
         return False
-    await doc_ref.delete()
+    batch = db.batch()
+    batch.delete(doc_ref)
+    batch.set(user_ref, _activity_fields("profile_entries"), merge=True)
+    await batch.commit()
+    user_service.invalidate(user_id)
     return True
 
 
@@ -863,6 +986,24 @@ async def get_latest_mentor_feedback(user_id: str) -> Optional[dict]:
     return feedbacks[0] if feedbacks else None
 
 
+async def list_active_user_ids(since: datetime) -> list[str]:
+    """指定時刻以降に活動（読書記録・Insight・プロファイルの更新）があったユーザーIDを返す。
+
+    全ユーザーを走査せず、readings.updated_at（コレクショングループ）と
+    users.activity.updated_at のインデックスで絞り込む。
+    """
+    db: AsyncClient = get_firestore_client()
+    user_ids: dict[str, None] = {}
+    readings = db.collection_group("readings").where(filter=FieldFilter("updated_at", ">=", since))
+    async for doc in readings.select(["user_id"]).stream():
+        # users/{user_id}/readings/{reading_id}
+        user_ids[doc.reference.parent.parent.id] = None
+    users = db.collection("users").where(filter=FieldFilter("activity.updated_at", ">=", since))
+    async for doc in users.select([]).stream():
+        user_ids[doc.id] = None
+    return list(user_ids)
+
+
 # --- User Name (Nickname) ---
 
 
@@ -870,9 +1011,9 @@ async def update_user_name(user_id: str, name: str) -> dict:
     """ユーザーのニックネームを更新する。"""
     db: AsyncClient = get_firestore_client()
     doc_ref = db.collection("users").document(user_id)
-    doc = await doc_ref.get()
+    user_doc = await user_service.load_user_document(user_id)
 
-    if not doc.exists:
+    if not user_doc.exists:
         # ドキュメントが存在しない場合は作成
         data = {
             "email": None,
@@ -882,19 +1023,18 @@ async def update_user_name(user_id: str, name: str) -> dict:
             "created_at": _now(),
         }
         await doc_ref.set(data)
+        user_service.invalidate(user_id)
         return {"name": name}
 
     await doc_ref.update({"name": name})
+    user_service.invalidate(user_id)
     return {"name": name}
 
 
 async def get_user_name(user_id: str) -> Optional[str]:
     """ユーザーのニックネームを取得する。"""
-    db: AsyncClient = get_firestore_client()
-    doc = await db.collection("users").document(user_id).get()
-    if doc.exists:
-        return doc.to_dict().get("name")
-    return None
+    user_doc = await user_service.get_user_document(user_id)
+    return user_doc.name
 
 
 # --- Insight Visibility & Public Insights ---
@@ -917,6 +1057,24 @@ async def get_insight(user_id: str, reading_id: str, insight_id: str) -> Optiona
     return None
 
 
+async def get_insights(user_id: str, reading_id: str, insight_ids: list[str]) -> list[dict]:
+    """複数のInsightを get_all で一括取得する（存在するもののみ、指定順）。"""
+    db: AsyncClient = get_firestore_client()
+    insights_ref = (
+        db.collection("users")
+        .document(user_id)
+        .collection("readings")
+        .document(reading_id)
+        .collection("insights")
+    )
+    ids = list(dict.fromkeys(insight_ids))
+    found = {}
+    async for snapshot in db.get_all([insights_ref.document(i) for i in ids]):
+        if snapshot.exists:
+            found[snapshot.id] = {"id": snapshot.id, **snapshot.to_dict()}
+    return [found[i] for i in ids if i in found]
+
+
 async def update_insight_visibility(
     user_id: str, reading_id: str, insight_id: str, visibility: str
 ) -> Optional[dict]:
@@ -948,63 +1106,49 @@ async def create_public_insight(
     visibility: str,
     display_name: str,
 ) -> dict:
-    """公開Insightを作成する。"""
-    db: AsyncClient = get_firestore_client()
-
-    # 既存の公開Insightがあるか確認
-    existing_docs = db.collection("publicInsights").where(
-        filter=FieldFilter("insight_id", "==", insight_id)
-    )
-    existing = None
-    async for doc in existing_docs.stream():
-        existing = doc
-        break
+    """公開Insightを作成する。
 
+    publicInsightsのドキュメントIDは元のinsight_idと同一にしているため、
+    既存チェックのクエリを行わず1回の書き込みでupsertできる。
+    """
+    db: AsyncClient = get_firestore_client()
+    doc_ref = _public_insight_ref(db, insight_id)
     now = _now()
-
-    if existing:
-        # 既存のドキュメントを更新
-        doc_ref = existing.reference
-        update_data = {
-            "visibility": visibility,
-            "display_name": display_name,
-            "content": insight_data.get("content"),
-            "type": insight_data.get("type"),
-            "reading_status": insight_data.get("reading_status"),
-            "book": book_data,
-        }
-        await doc_ref.update(update_data)
-        updated = await doc_ref.get()
-        return {"id": updated.id, **updated.to_dict()}
-    else:
-        # 新規作成
-        doc_ref = db.collection("publicInsights").document()
-        doc_data = {
-            "insight_id": insight_id,
-            "user_id": user_id,
-            "reading_id": reading_id,
-            "content": insight_data.get("content"),
-            "type": insight_data.get("type"),
-            "reading_status": insight_data.get("reading_status"),
-            "visibility": visibility,
-            "display_name": display_name,
-            "book": book_data,
-            "created_at": insight_data.get("created_at", now),
-            "published_at": now,
-        }
-        await doc_ref.set(doc_data)
-        return {"id": doc_ref.id, **doc_data}
+    doc_data = {
+        "insight_id": insight_id,
+        "user_id": user_id,
+        "reading_id": reading_id,
+        "content": insight_data.get("content"),
+        "type": insight_data.get("type"),
+        "reading_status": insight_data.get("reading_status"),
+        "visibility": visibility,
+        "display_name": display_name,
+        "book": book_data,
+        "created_at": insight_data.get("created_at", now),
+        "published_at": now,
+    }
+    await doc_ref.set(doc_data, merge=True)
+    return {"id": doc_ref.id, **doc_data}
 
 
 async def delete_public_insight(insight_id: str) -> bool:
     """公開Insightを削除する。"""
     db: AsyncClient = get_firestore_client()
-    docs = db.collection("publicInsights").where(filter=FieldFilter("insight_id", "==", insight_id))
-    deleted = False
-    async for doc in docs.stream():
-        await doc.reference.delete()
-        deleted = True
-    return deleted
+    await _public_insight_ref(db, insight_id).delete()
+    return True
+
+
+async def delete_public_insights(insight_ids: list[str]) -> int:
+    """複数の公開InsightをWriteBatchでまとめて削除する。"""
+    db: AsyncClient = get_firestore_client()
+    refs = [_public_insight_ref(db, insight_id) for insight_id in insight_ids]
+    await _batch_delete(db, refs)
+    return len(refs)
+
+
+def _public_insight_ref(db: AsyncClient, insight_id: str) -> AsyncDocumentReference:
+    """公開InsightのドキュメントはinsightIdをキーにする。"""
+    return db.collection("publicInsights").document(insight_id)
 
 
 async def update_public_insights_display_name(user_id: str, new_name: str) -> int:
@@ -1277,71 +1421,52 @@ async def create_public_report(
     display_name: str,
     include_context_analysis: bool,
 ) -> dict:
-    """公開レポートを作成する。"""
-    db: AsyncClient = get_firestore_client()
-
-    # 既存の公開レポートがあるか確認
-    existing_docs = db.collection("publicReports").where(
-        filter=FieldFilter("report_id", "==", report_id)
-    )
-    existing = None
-    async for doc in existing_docs.stream():
-        existing = doc
-        break
+    """公開レポートを作成する。
 
+    publicReportsのドキュメントIDは元のreport_idと同一（1回の書き込みでupsert）。
+    """
+    db: AsyncClient = get_firestore_client()
+    doc_ref = _public_report_ref(db, report_id)
     now = _now()
-
-    if existing:
-        # 既存のドキュメントを更新
-        doc_ref = existing.reference
-        update_data = {
-            "visibility": visibility,
-            "display_name": display_name,
-            "summary": report_data.get("summary"),
-            "insights_summary": report_data.get("insights_summary"),
-            "context_analysis": report_data.get("context_analysis")
-            if include_context_analysis
-            else None,
-            "include_context_analysis": include_context_analysis,
-            "book": book_data,
-            "reading_status": report_data.get("reading_status"),
-        }
-        await doc_ref.update(update_data)
-        updated = await doc_ref.get()
-        return {"id": updated.id, **updated.to_dict()}
-    else:
-        # 新規作成
-        doc_ref = db.collection("publicReports").document()
-        doc_data = {
-            "report_id": report_id,
-            "user_id": user_id,
-            "reading_id": reading_id,
-            "summary": report_data.get("summary"),
-            "insights_summary": report_data.get("insights_summary"),
-            "context_analysis": report_data.get("context_analysis")
-            if include_context_analysis
-            else None,
-            "include_context_analysis": include_context_analysis,
-            "visibility": visibility,
-            "display_name": display_name,
-            "book": book_data,
-            "reading_status": report_data.get("reading_status"),
-            "created_at": report_data.get("created_at", now),
-            "published_at": now,
-        }
-        await doc_ref.set(doc_data)
-        return {"id": doc_ref.id, **doc_data}
+    doc_data = {
+        "report_id": report_id,
+        "user_id": user_id,
+        "reading_id": reading_id,
+        "summary": report_data.get("summary"),
+        "insights_summary": report_data.get("insights_summary"),
+        "context_analysis": report_data.get("context_analysis")
+        if include_context_analysis
+        else None,
+        "include_context_analysis": include_context_analysis,
+        "visibility": visibility,
+        "display_name": display_name,
+        "book": book_data,
+        "reading_status": report_data.get("reading_status"),
+        "created_at": report_data.get("created_at", now),
+        "published_at": now,
+    }
+    await doc_ref.set(doc_data, merge=True)
+    return {"id": doc_ref.id, **doc_data}
 
 
 async def delete_public_report(report_id: str) -> bool:
     """公開レポートを削除する。"""
     db: AsyncClient = get_firestore_client()
-    docs = db.collection("publicReports").where(filter=FieldFilter("report_id", "==", report_id))
-    deleted = False
-    async for doc in docs.stream():
-        await doc.reference.delete()
-        deleted = True
-    return deleted
+    await _public_report_ref(db, report_id).delete()
+    return True
+
+
+async def delete_public_reports(report_ids: list[str]) -> int:
+    """複数の公開レポートをWriteBatchでまとめて削除する。"""
+    db: AsyncClient = get_firestore_client()
+    refs = [_public_report_ref(db, report_id) for report_id in report_ids]
+    await _batch_delete(db, refs)
+    return len(refs)
+
+
+def _public_report_ref(db: AsyncClient, report_id: str) -> AsyncDocumentReference:
+    """公開レポートのドキュメントはreportIdをキーにする。"""
+    return db.collection("publicReports").document(report_id)
 
 
 async def list_public_reports(
@@ -1570,15 +1695,8 @@ async def delete_action_plan(user_id: str, reading_id: str, plan_id: str) -> boo
 
 async def get_onboarding_status(user_id: str) -> dict:
     """オンボーディングの完了状態を取得する。"""
-    db: AsyncClient = get_firestore_client()
-    doc = await db.collection("users").document(user_id).get()
-    if doc.exists:
-        data = doc.to_dict()
-        return {
-            "completed": data.get("onboarding_completed", False),
-            "completed_at": data.get("onboarding_completed_at"),
-        }
-    return {"completed": False, "completed_at": None}
+    user_doc = await user_service.get_user_document(user_id)
+    return user_doc.onboarding_status
 
 
 async def set_onboarding_completed(user_id: str) -> dict:
@@ -1592,6 +1710,7 @@ async def set_onboarding_completed(user_id: str) -> dict:
             "onboarding_completed_at": now,
         }
     )
+    user_service.invalidate(user_id)
     return {"completed": True, "completed_at": now}
 
 
@@ -1599,9 +1718,9 @@ async def update_user_profile(user_id: str, profile_data: dict) -> dict:
     """ユーザーのcurrent_profileを更新する。"""
     db: AsyncClient = get_firestore_client()
     doc_ref = db.collection("users").document(user_id)
-    doc = await doc_ref.get()
+    user_doc = await user_service.load_user_document(user_id)
 
-    if not doc.exists:
+    if not user_doc.exists:
         # ドキュメントが存在しない場合は作成
         data = {
             "email": None,
@@ -1611,12 +1730,13 @@ async def update_user_profile(user_id: str, profile_data: dict) -> dict:
             "created_at": _now(),
         }
         await doc_ref.set(data)
+        user_service.invalidate(user_id)
         return profile_data
 
     # 既存のcurrent_profileとマージ
-    current_profile = doc.to_dict().get("current_profile", {})
-    updated_profile = {**current_profile, **profile_data}
+    updated_profile = {**user_doc.current_profile, **profile_data}
     await doc_ref.update({"current_profile": updated_profile})
+    user_service.invalidate(user_id)
     return updated_profile
 
 
@@ -1627,6 +1747,8 @@ async def get_report_context(user_id: str, reading_id: str) -> dict:
     """レポート生成用のコンテキストを取得する。
 
     該当Readingのセッション全メッセージ + Insight + プロファイル情報を集約。
+    ローリング要約があるセッションは、要約（sessions[].conversation_summary）と
+    要約以降のメッセージのみを含める。
     """
     # 読書情報
     reading = await get_reading(user_id, reading_id)
@@ -1637,9 +1759,15 @@ async def get_report_context(user_id: str, reading_id: str) -> dict:
     sessions = await list_sessions(user_id, reading_id)
 
     # 全セッションのメッセージを集約
+    # ローリング要約があるセッションは要約済みの範囲を読まず、要約以降のメッセージのみ使う
     all_messages = []
     for session in sessions:
-        messages = await list_messages(user_id, reading_id, session["id"])
+        messages = await list_messages(
+            user_id,
+            reading_id,
+            session["id"],
+            after=session.get("rolling_summary_until") if session.get("rolling_summary") else None,
+        )
         all_messages.extend(
             [
                 {
@@ -1676,6 +1804,7 @@ async def get_report_context(user_id: str, reading_id: str) -> dict:
                 "id": s["id"],
                 "session_type": s.get("session_type"),
                 "started_at": s.get("started_at"),
+                "conversation_summary": s.get("rolling_summary"),
             }
             for s in sessions
         ],
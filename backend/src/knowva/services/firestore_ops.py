@@ -0,0 +1,183 @@
+"""リクエストごとのFirestore操作の計数と、エンドポイントの読み書き予算。
+
+get_firestore_client() が返すクライアントのGAPIC呼び出しを instrument() で包み、
+contextvar で束ねた FirestoreOps に数える。ドキュメント参照やスナップショットの
+reference から辿った呼び出しも同じクライアントを通るため、すべて数えられる。
+
+- reads:        読み取ったドキュメント数（課金と同じく、0件のクエリも1件）
+- writes:       書き込み（削除を含む）ドキュメント数
+- queries:      クエリ（run_query）の回数
+- lookups:      ドキュメントの直接取得（get / get_all）の回数
+- aggregations: count() などの集計クエリの回数
+- round_trips:  上記とトランザクションの開始・ロールバック・コミットを含むRPCの回数
+
+エンドポイントには @budget(reads=..., queries=...) で上限を宣言できる。
+上限を超えたリクエストは警告ログに残り、テストでは強制して失敗させる
+（knowva.testing.firestore_budget）。
+"""
+
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+from google.cloud.firestore import AsyncClient
+
+BUDGET_ATTR = "__firestore_budget__"
+
+
+class FirestoreBudgetExceededError(AssertionError):
+    """Firestore操作が宣言した予算を超えた。"""
+
+
+@dataclass
+class FirestoreOps:
+    reads: int = 0
+    writes: int = 0
+    queries: int = 0
+    lookups: int = 0
+    aggregations: int = 0
+    round_trips: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class Budget:
+    """1リクエストあたりのFirestore操作の上限（None は上限なし）。"""
+
+    reads: Optional[int] = None
+    writes: Optional[int] = None
+    queries: Optional[int] = None
+    aggregations: Optional[int] = None
+
+    def violations(self, ops: FirestoreOps) -> list[str]:
+        """上限を超えた項目を "reads 120 > 50" の形で返す。"""
+        return [
+            f"{name} {getattr(ops, name)} > {limit}"
+            for name, limit in asdict(self).items()
+            if limit is not None and getattr(ops, name) > limit
+        ]
+
+
+_current: ContextVar[Optional[FirestoreOps]] = ContextVar("firestore_ops", default=None)
+
+
+def current() -> Optional[FirestoreOps]:
+    """計数中の FirestoreOps（リクエスト外では None）。"""
+    return _current.get()
+
+
+@contextmanager
+def track() -> Iterator[FirestoreOps]:
+    """ブロック内（と、その中で作られたタスク）のFirestore操作を数える。"""
+    ops = FirestoreOps()
+    token = _current.set(ops)
+    try:
+        yield ops
+    finally:
+        _current.reset(token)
+
+
+def record(**counts: int) -> None:
+    """計数中であれば操作数を加算する。"""
+    ops = _current.get()
+    if ops is None:
+        return
+    for name, value in counts.items():
+        setattr(ops, name, getattr(ops, name) + value)
+
+
+def budget(
+    *,
+    reads: Optional[int] = None,
+    writes: Optional[int] = None,
+    queries: Optional[int] = None,
+    aggregations: Optional[int] = None,
+) -> Callable:
+    """エンドポイントのFirestore操作の上限を宣言するデコレーター。
+
+    ルートのデコレーターより内側（関数に近い側）に付ける。
+    """
+    declared = Budget(reads=reads, writes=writes, queries=queries, aggregations=aggregations)
+
+    def decorator(func: Callable) -> Callable:
+        setattr(func, BUDGET_ATTR, declared)
+        return func
+
+    return decorator
+
+
+def get_budget(endpoint: Any) -> Optional[Budget]:
+    return getattr(endpoint, BUDGET_ATTR, None)
+
+
+async def _count_documents(responses: AsyncIterator, is_document: Callable) -> AsyncIterator:
+    documents = 0
+    try:
+        async for response in responses:
+            if is_document(response):
+                documents += 1
+            yield response
+    finally:
+        # 途中で打ち切られたクエリも、受け取った分（最低1件）を読み取りとして数える
+        record(reads=max(1, documents))
+
+
+class _CountingFirestoreApi:
+    """GAPICクライアント（FirestoreAsyncClient）を包み、呼び出しを数える。"""
+
+    def __init__(self, api: Any):
+        self._api = api
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._api, name)
+
+    async def run_query(self, *args, **kwargs):
+        record(queries=1, round_trips=1)
+        responses = await self._api.run_query(*args, **kwargs)
+        return _count_documents(responses, lambda r: bool(r.document))
+
+    async def batch_get_documents(self, *args, **kwargs):
+        record(lookups=1, round_trips=1)
+        responses = await self._api.batch_get_documents(*args, **kwargs)
+        # 存在しないドキュメントの取得も読み取りとして課金される
+        return _count_documents(responses, lambda r: bool(r.found or r.missing))
+
+    async def run_aggregation_query(self, *args, **kwargs):
+        record(aggregations=1, reads=1, round_trips=1)
+        return await self._api.run_aggregation_query(*args, **kwargs)
+
+    async def commit(self, *args, **kwargs):
+        request = kwargs.get("request")
+        writes = request.get("writes", []) if isinstance(request, dict) else request.writes
+        record(writes=len(writes), round_trips=1)
+        return await self._api.commit(*args, **kwargs)
+
+    async def begin_transaction(self, *args, **kwargs):
+        record(round_trips=1)
+        return await self._api.begin_transaction(*args, **kwargs)
+
+    async def rollback(self, *args, **kwargs):
+        record(round_trips=1)
+        return await self._api.rollback(*args, **kwargs)
+
+
+def instrument(client: AsyncClient) -> AsyncClient:
+    """AsyncClient のRPCを数えるようにする（冪等）。"""
+    api = client._firestore_api
+    if not isinstance(api, _CountingFirestoreApi):
+        client._firestore_api_internal = _CountingFirestoreApi(api)
+    return client
+
+
+def server_timing(ops: FirestoreOps, duration_ms: float) -> str:
+    """Server-Timing ヘッダーの値。件数は desc に入れる。"""
+    entries = [
+        f'firestore-{name.replace("_", "-")};desc="{value}"'
+        for name, value in ops.as_dict().items()
+    ]
+    entries.append(f"app;dur={duration_ms:.1f}")
+    return ", ".join(entries)
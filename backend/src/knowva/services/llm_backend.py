@@ -0,0 +1,263 @@
+"""LLMバックエンドの切り替え（負荷試験・CI用の決定的なフェイクと、実トレースの記録・再生）。
+
+settings.llm_backend で選ぶ:
+- "gemini": 実際のGeminiを使う（デフォルト。エージェントにはモデル名をそのまま渡す）
+- "fake":   スクリプトどおりにツール呼び出しとテキストを返す FakeLlm
+- "record": Geminiの応答を settings.llm_trace_path（JSONL）に記録しながら返す
+- "replay": 記録したトレースを、記録時の間隔で再生する
+
+FakeLlm のスクリプト（settings.fake_llm_script のJSON）はエージェント名ごとに
+{"tool_calls": [{"name": ..., "args": {...}}], "text": "..."} を書く。ユーザーの発言ごとに
+tool_calls を1ターンに1つずつ（settings.fake_llm_tool_latency_seconds 待ってから）返し、
+最後に text を返す。エージェントに無いツールは飛ばす。記載のないエージェントは "default" を使う。
+ストリーミング呼び出しでは text を fake_llm_chunk_chars 文字ずつ
+fake_llm_chunk_delay_seconds 間隔で partial として返す。
+
+エージェントを使わない直接の生成（セッション要約など）は generate_text() を通す。
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import defaultdict
+from collections.abc import AsyncGenerator
+from functools import cache
+from typing import Union
+
+from google.adk.models import BaseLlm, Gemini
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from knowva.config import settings
+from knowva.services import agent_registry, metrics, tracing
+
+BACKEND_GEMINI = "gemini"
+BACKEND_FAKE = "fake"
+BACKEND_RECORD = "record"
+BACKEND_REPLAY = "replay"
+
+_DEFAULT_TEXT = "なるほど、とても興味深い読み方ですね。その場面でどんなことを感じましたか？"
+
+
+@cache
+def _load_script(path: str) -> dict:
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _steps_since_user_turn(contents: list[types.Content]) -> int:
+    """最後のユーザー発言の後に、モデルがツールを呼び出したターン数。"""
+    steps = 0
+    for content in reversed(contents):
+        parts = content.parts or []
+        if content.role == "model" and any(p.function_call for p in parts):
+            steps += 1
+        elif content.role == "user" and any(p.text for p in parts):
+            break
+    return steps
+
+
+def request_key(agent_name: str, contents: list[types.Content]) -> str:
+    """トレースの照合キー。ツールの結果（IDなど実行ごとに変わる値）は名前だけを使う。"""
+    shape = []
+    for content in contents:
+        for part in content.parts or []:
+            if part.text:
+                shape.append((content.role, "text", part.text))
+            elif part.function_call:
+                args = json.dumps(part.function_call.args or {}, sort_keys=True, ensure_ascii=False)
+                shape.append((content.role, "call", part.function_call.name, args))
+            elif part.function_response:
+                shape.append((content.role, "response", part.function_response.name))
+    payload = json.dumps([agent_name, shape], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FakeLlm(BaseLlm):
+    """スクリプトどおりに応答する決定的なLLM。"""
+
+    agent_name: str = "default"
+    script: dict = {}
+    chunk_chars: int = 20
+    chunk_delay: float = 0.02
+    tool_latency: float = 0.1
+
+    def _behavior(self) -> dict:
+        return self.script.get(self.agent_name) or self.script.get("default") or {}
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        behavior = self._behavior()
+        tool_calls = [
+            call
+            for call in behavior.get("tool_calls", [])
+            if call["name"] in llm_request.tools_dict
+        ]
+        step = _steps_since_user_turn(llm_request.contents)
+        if step < len(tool_calls):
+            call = tool_calls[step]
+            await asyncio.sleep(self.tool_latency)
+            part = types.Part(
+                function_call=types.FunctionCall(name=call["name"], args=call.get("args", {}))
+            )
+            yield LlmResponse(content=types.Content(role="model", parts=[part]))
+            return
+
+        text = behavior.get("text", _DEFAULT_TEXT)
+        chunks = [text[i : i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        if stream:
+            for chunk in chunks:
+                await asyncio.sleep(self.chunk_delay)
+                yield LlmResponse(
+                    content=types.Content(role="model", parts=[types.Part(text=chunk)]),
+                    partial=True,
+                )
+        else:
+            # 非ストリーミングでも、全文を生成し終えるまでの時間は同じだけかける
+            await asyncio.sleep(self.chunk_delay * len(chunks))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=text)]),
+            turn_complete=True,
+        )
+
+
+class RecordingLlm(BaseLlm):
+    """内側のLLMの応答を、応答間隔つきでJSONLに記録する。"""
+
+    agent_name: str = "default"
+    inner: BaseLlm
+    trace_path: str
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        key = request_key(self.agent_name, llm_request.contents)
+        recorded = []
+        last = time.perf_counter()
+        async for response in self.inner.generate_content_async(llm_request, stream=stream):
+            now = time.perf_counter()
+            recorded.append(
+                {
+                    "delay": round(now - last, 4),
+                    "response": response.model_dump(mode="json", exclude_none=True),
+                }
+            )
+            last = now
+            yield response
+        with open(self.trace_path, "a", encoding="utf-8") as f:
+            f.write(
+                json.dumps(
+                    {"key": key, "agent": self.agent_name, "responses": recorded},
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+
+
+class ReplayLlm(BaseLlm):
+    """記録したトレースを再生する。同じリクエストの記録が複数あれば順に使う。"""
+
+    agent_name: str = "default"
+    trace_path: str
+    realtime: bool = True
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        key = request_key(self.agent_name, llm_request.contents)
+        traces = _load_traces(self.trace_path)
+        if not traces.get(key):
+            raise KeyError(f"No recorded trace for {self.agent_name} ({key[:12]})")
+        recorded = traces[key].pop(0)
+        traces[key].append(recorded)
+        for item in recorded:
+            if self.realtime:
+                await asyncio.sleep(item["delay"])
+            yield LlmResponse.model_validate(item["response"])
+
+
+_traces: dict[str, dict[str, list]] = {}
+
+
+def _load_traces(path: str) -> dict[str, list]:
+    if path not in _traces:
+        traces: dict[str, list] = defaultdict(list)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    traces[record["key"]].append(record["responses"])
+        _traces[path] = traces
+    return _traces[path]
+
+
+def get_llm(model: str, agent_name: str) -> BaseLlm:
+    """設定されたバックエンドのLLMインスタンスを返す。"""
+    backend = settings.llm_backend
+    if backend == BACKEND_FAKE:
+        return FakeLlm(
+            model=model,
+            agent_name=agent_name,
+            script=_load_script(settings.fake_llm_script),
+            chunk_chars=settings.fake_llm_chunk_chars,
+            chunk_delay=settings.fake_llm_chunk_delay_seconds,
+            tool_latency=settings.fake_llm_tool_latency_seconds,
+        )
+    if backend == BACKEND_RECORD:
+        return RecordingLlm(
+            model=model,
+            agent_name=agent_name,
+            inner=Gemini(model=model),
+            trace_path=settings.llm_trace_path,
+        )
+    if backend == BACKEND_REPLAY:
+        return ReplayLlm(model=model, agent_name=agent_name, trace_path=settings.llm_trace_path)
+    return Gemini(model=model)
+
+
+def agent_model(model: str, agent_name: str) -> Union[str, BaseLlm]:
+    """エージェントに渡すモデル。Geminiの場合はモデル名をそのまま返す。"""
+    if settings.llm_backend == BACKEND_GEMINI:
+        return model
+    return get_llm(model, agent_name)
+
+
+async def generate_text(model: str, prompt: str, purpose: str) -> str:
+    """エージェントを使わずにテキストを生成する。
+
+    Args:
+        purpose: フェイク・トレースでエージェント名の代わりに使う名前（"session_summary" など）。
+            メトリクスのラベルにも使う。
+    """
+    started = time.perf_counter()
+    status = "error"
+    try:
+        with tracing.span("llm.generate_text", **{"knowva.purpose": purpose}):
+            text = await _generate_text(model, prompt, purpose)
+        status = "ok"
+        return text
+    finally:
+        metrics.LLM_CALL_DURATION.observe(time.perf_counter() - started, purpose, status)
+
+
+async def _generate_text(model: str, prompt: str, purpose: str) -> str:
+    if settings.llm_backend == BACKEND_GEMINI:
+        client = agent_registry.get_genai_client()
+        response = await client.aio.models.generate_content(model=model, contents=prompt)
+        metrics.record_llm_usage(purpose, response.usage_metadata)
+        return (response.text or "").strip()
+
+    request = LlmRequest(
+        model=model, contents=[types.Content(role="user", parts=[types.Part(text=prompt)])]
+    )
+    text = ""
+    async for response in get_llm(model, purpose).generate_content_async(request):
+        if response.content and response.content.parts and not response.partial:
+            text = "".join(p.text or "" for p in response.content.parts)
+            metrics.record_llm_usage(purpose, response.usage_metadata)
+    return text.strip()
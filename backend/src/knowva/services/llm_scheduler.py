@@ -0,0 +1,252 @@
+"""インスタンス内のLLM呼び出し並行数を制御するスケジューラ。
+
+Geminiへの同時呼び出し数をスロット数で制限し、空きがない場合は優先度順の
+待ち行列に入れる。待ち行列が上限に達した場合や待ち時間が上限を超えた場合は
+LLMOverloadedError を送出し、API側では 503 + Retry-After に変換する。
+
+1スロットは1回の ADK Runner 実行（ツール・サブエージェント内のモデル呼び出しを含む）
+または1回の generate_content 呼び出しに対応する。
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncGenerator, AsyncIterator, Optional, TypeVar
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from knowva.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """優先度クラス（値が小さいほど優先）。"""
+
+    INTERACTIVE = 0  # 対話ストリーミング・チャット
+    GENERATION = 1  # レポート生成・統合プレビュー
+    BACKGROUND = 2  # セッション要約などの後処理
+
+
+class LLMOverloadedError(Exception):
+    """LLMスロットを確保できなかった場合の例外。"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class LLMSlot:
+    """確保済みのスロット。release() は複数回呼んでも1度だけ解放する。"""
+
+    def __init__(self, scheduler: "LLMScheduler", priority: Priority):
+        self._scheduler = scheduler
+        self.priority = priority
+        self.acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._scheduler._release(self)
+
+
+class _PriorityStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_count = 0
+        self.wait_seconds_sum = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.wait_count += 1
+        self.wait_seconds_sum += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_count": self.wait_count,
+            "wait_seconds_sum": round(self.wait_seconds_sum, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+        }
+
+
+class LLMScheduler:
+    """優先度付きセマフォ + 上限付き待ち行列。"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout_seconds: float,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._active = 0
+        # (priority, seq, future)
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # スロット保持時間の指数移動平均（Retry-After の見積もりに使う）
+        self._avg_hold_seconds = 5.0
+        self._stats = {p: _PriorityStats() for p in Priority}
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def retry_after(self) -> int:
+        """現在の混雑から再試行までの目安秒数を見積もる。"""
+        rounds = (self.queue_depth + 1) / max(self.max_concurrency, 1)
+        return max(1, min(60, math.ceil(rounds * self._avg_hold_seconds)))
+
+    def _reject(self, priority: Priority, reason: str) -> LLMOverloadedError:
+        self._stats[priority].rejected += 1
+        logger.warning(
+            f"LLM request rejected ({priority.name}): {reason} "
+            f"active={self._active} queued={self.queue_depth}"
+        )
+        return LLMOverloadedError(self.retry_after(), reason)
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> LLMSlot:
+        """スロットを確保する。確保できない場合は LLMOverloadedError。"""
+        stats = self._stats[priority]
+        if self._active < self.max_concurrency and self.queue_depth == 0:
+            self._active += 1
+            stats.admitted += 1
+            stats.record_wait(0.0)
+            return LLMSlot(self, priority)
+
+        if self.queue_depth >= self.max_queue and not self._evict_lower_than(priority):
+            raise self._reject(priority, "queue full")
+
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        entry = (int(priority), next(self._seq), fut)
+        heapq.heappush(self._waiters, entry)
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                # タイムアウトと同時にスロットが渡された場合は使う
+                pass
+            else:
+                fut.cancel()
+                raise self._reject(priority, "queue timeout") from None
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                # 渡されたスロットを次の待機者に回す
+                self._active -= 1
+                self._wake_next()
+            else:
+                fut.cancel()
+            raise
+
+        stats.admitted += 1
+        stats.record_wait(time.monotonic() - queued_at)
+        return LLMSlot(self, priority)
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE) -> AsyncIterator[LLMSlot]:
+        """スロットを確保し、ブロックを抜けたら解放する。"""
+        llm_slot = await self.acquire(priority)
+        try:
+            yield llm_slot
+        finally:
+            llm_slot.release()
+
+    def _evict_lower_than(self, priority: Priority) -> bool:
+        """待ち行列が満杯のとき、より低優先度の最後尾を押し出して場所を空ける。"""
+        candidates = [e for e in self._waiters if not e[2].done() and e[0] > priority]
+        if not candidates:
+            return False
+        victim = max(candidates, key=lambda e: (e[0], e[1]))
+        victim_priority = Priority(victim[0])
+        victim[2].set_exception(self._reject(victim_priority, "preempted by higher priority"))
+        return True
+
+    def _release(self, llm_slot: LLMSlot) -> None:
+        held = time.monotonic() - llm_slot.acquired_at
+        self._avg_hold_seconds = 0.8 * self._avg_hold_seconds + 0.2 * held
+        self._active -= 1
+        self._wake_next()
+
+    def _wake_next(self) -> None:
+        while self._waiters and self._active < self.max_concurrency:
+            _, _, fut = heapq.heappop(self._waiters)
+            if fut.done():
+                continue
+            self._active += 1
+            fut.set_result(None)
+
+    def snapshot(self) -> dict:
+        """メトリクスのスナップショットを返す。"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "avg_hold_seconds": round(self._avg_hold_seconds, 3),
+            "priorities": {p.name.lower(): s.to_dict() for p, s in self._stats.items()},
+        }
+
+
+async def hold_slot(events: AsyncIterator[T], llm_slot: LLMSlot) -> AsyncGenerator[T, None]:
+    """ストリーム配信中はスロットを保持し、終了・切断・例外時に解放する。
+
+    閉じられた場合は events も閉じてから解放する（events 側の後始末を待つ）。
+    ReplayStream は生成の終了時にこのジェネレーターを閉じるため、
+    stream_hub に渡したものは呼び出し側で解放しなくてよい。
+    """
+    try:
+        async for event in events:
+            yield event
+    finally:
+        try:
+            aclose = getattr(events, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            llm_slot.release()
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """スケジューラのシングルトンを取得する。"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(
+            max_concurrency=settings.llm_max_concurrency,
+            max_queue=settings.llm_max_queue,
+            queue_timeout_seconds=settings.llm_queue_timeout_seconds,
+        )
+    return _scheduler
+
+
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError) -> JSONResponse:
+    """LLMOverloadedError を 503 + Retry-After に変換する。"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI is busy. Please retry later.", "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
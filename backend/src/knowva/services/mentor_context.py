@@ -0,0 +1,77 @@
+"""メンターの振り返り用コンテキストと活動フィンガープリント。
+
+振り返りの入力（期間内の読書・Insight・プロファイル）が変わったかを、
+全Insightを読まずに安いシグナルだけで判定する:
+- 期間内に更新された読書記録（id・status・updated_at）
+- users/{uid}.activity の Insight・プロファイルエントリの書き込みカウンターと最終更新時刻
+- current_profile
+
+get_mentor_context の結果はユーザー・期間ごとにキャッシュし、フィンガープリントが
+変わった時点（新しい活動があった時点）で作り直す。期間の境界から古いInsightが外れる
+変化はカウンターに現れないため、キャッシュとフィードバックの再利用には有効期限を設ける。
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from knowva.config import settings
+from knowva.services import firestore, user_service
+from knowva.services.cache import TTLCache
+from knowva.services.report_fingerprint import fingerprint
+
+# フィードバックの種類ごとの振り返り期間（日）
+FEEDBACK_PERIOD_DAYS = {"weekly": 7, "monthly": 30}
+
+_context_cache = TTLCache(
+    ttl_seconds=settings.mentor_context_cache_seconds, max_entries=2048, name="mentor_context"
+)
+
+
+def state_key(period_days: int) -> str:
+    """フィンガープリントを保存するADKセッションstateのキー。"""
+    return f"mentor_activity_fingerprint_{period_days}"
+
+
+async def activity_fingerprint(user_id: str, period_days: int) -> str:
+    """振り返り期間の活動のフィンガープリントを計算する。"""
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=period_days)
+    readings = await firestore.list_readings(user_id)
+    # インスタンス内キャッシュは他インスタンスでの書き込みを最大TTL秒まで反映しないため読み直す
+    user_doc = await user_service.load_user_document(user_id)
+    return fingerprint(
+        {
+            "period_days": period_days,
+            "readings": sorted(
+                (r["id"], r.get("status"), r["updated_at"])
+                for r in readings
+                if r.get("updated_at") and r["updated_at"] >= cutoff_date
+            ),
+            "activity": user_doc.activity,
+            "current_profile": user_doc.current_profile or {},
+        }
+    )
+
+
+async def get_mentor_context(user_id: str, period_days: int) -> tuple[dict, str]:
+    """振り返り用のコンテキストとフィンガープリントを返す（活動に変化がなければキャッシュ）。"""
+    current = await activity_fingerprint(user_id, period_days)
+    key = f"{user_id}:{period_days}"
+    cached = _context_cache.get(key)
+    if cached is not None and cached[0] == current:
+        return cached[1], current
+
+    context = await firestore.get_mentor_context(user_id=user_id, period_days=period_days)
+    _context_cache.set(key, (current, context))
+    return context, current
+
+
+async def find_reusable_feedback(user_id: str, feedback_type: str, activity: str) -> Optional[dict]:
+    """同じ種類の最新フィードバックが同じ活動から生成されていれば返す。"""
+    feedbacks = await firestore.list_mentor_feedbacks(user_id, limit=10)
+    latest = next((f for f in feedbacks if f.get("feedback_type") == feedback_type), None)
+    if not latest or latest.get("activity_fingerprint") != activity:
+        return None
+    reuse_after = datetime.now(timezone.utc) - timedelta(hours=settings.mentor_feedback_reuse_hours)
+    if latest["created_at"] < reuse_after:
+        return None
+    return latest
@@ -0,0 +1,329 @@
+"""Prometheus形式のメトリクス（/metrics で公開）。
+
+外部ライブラリを使わない最小限の Counter / Gauge / Histogram と、テキスト形式の出力。
+記録はイベントループ上の辞書操作と bisect だけで、ロックも文字列整形もしない
+（整形は /metrics の取得時にまとめて行う）。
+
+既存の統計（キャンセル件数・LLMスケジューラ・要約パイプライン・TTLキャッシュ）は
+collect に渡した関数で取得時に読み出すため、ホットパスに追加の処理はない。
+
+ラベル値はルートのテンプレートやエージェント名など種類の限られた値だけを使う
+（ユーザーIDやセッションIDは入れない）。
+"""
+
+import time
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins import BasePlugin
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LONG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = tuple[str, ...]
+
+_registry: list["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        collect: Optional[Callable[[], dict[LabelValues, float]]] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._collect = collect
+        self._values: dict[LabelValues, float] = {}
+        _registry.append(self)
+
+    def samples(self) -> dict[LabelValues, float]:
+        return self._collect() if self._collect is not None else self._values
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.samples().items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # ラベル値 → [バケットごとの件数..., 合計値, 件数]
+        self._series: dict[LabelValues, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            inf = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {series[-1]}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{plain} {series[-1]}")
+        return lines
+
+
+def render() -> str:
+    """全メトリクスをPrometheusのテキスト形式で返す。"""
+    lines: list[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- HTTP ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "knowva_http_request_duration_seconds",
+    "HTTP request latency by route template (SSE: until the stream ends).",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "knowva_http_requests_in_flight", "HTTP requests currently being handled.", ("method",)
+)
+
+# --- SSE ---
+
+SSE_STREAMS_ACTIVE = Gauge(
+    "knowva_sse_streams_active", "Generation streams currently running.", ("kind",)
+)
+SSE_STREAM_DURATION = Histogram(
+    "knowva_sse_stream_duration_seconds",
+    "Duration of a generation stream from start to its last event.",
+    ("kind",),
+    LONG_BUCKETS,
+)
+SSE_TIME_TO_FIRST_TOKEN = Histogram(
+    "knowva_sse_time_to_first_token_seconds",
+    "Time from stream start to the first text delta.",
+    ("kind",),
+    LONG_BUCKETS,
+)
+
+# --- LLM ---
+
+LLM_CALL_DURATION = Histogram(
+    "knowva_llm_call_duration_seconds",
+    "Duration of a model call per agent (or purpose for direct generation).",
+    ("agent", "status"),
+    LONG_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "knowva_llm_tokens_total", "Tokens reported by the model per agent.", ("agent", "type")
+)
+
+# --- 外部API ---
+
+EXTERNAL_API_DURATION = Histogram(
+    "knowva_external_api_duration_seconds",
+    "Latency of external API calls (Google Books, openBD).",
+    ("api", "outcome"),
+)
+
+
+def record_llm_usage(agent: str, usage_metadata) -> None:
+    if usage_metadata is None:
+        return
+    if usage_metadata.prompt_token_count:
+        LLM_TOKENS.inc(agent, "prompt", amount=usage_metadata.prompt_token_count)
+    if usage_metadata.candidates_token_count:
+        LLM_TOKENS.inc(agent, "completion", amount=usage_metadata.candidates_token_count)
+
+
+class LlmMetricsPlugin(BasePlugin):
+    """Runnerに登録し、エージェントごとのモデル呼び出し時間とトークン数を記録する。
+
+    ストリーミングでは部分応答ごとに after_model_callback が呼ばれるため、
+    部分応答でない最後の応答で1回として数える。
+    """
+
+    _MAX_PENDING = 1024
+
+    def __init__(self):
+        super().__init__(name="knowva_metrics")
+        # (invocation_id, agent_name) → 開始時刻
+        self._started: dict[tuple[str, str], float] = {}
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        if len(self._started) >= self._MAX_PENDING:
+            # 完了しなかった（キャンセルされた）呼び出しの記録を古い順に捨てる
+            del self._started[next(iter(self._started))]
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        self._started[key] = time.perf_counter()
+        return None
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        if llm_response.partial:
+            return None
+        agent = callback_context.agent_name
+        started = self._started.pop((callback_context.invocation_id, agent), None)
+        if started is not None:
+            LLM_CALL_DURATION.observe(time.perf_counter() - started, agent, "ok")
+        record_llm_usage(agent, llm_response.usage_metadata)
+        return None
+
+    async def on_model_error_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest, error: Exception
+    ) -> Optional[LlmResponse]:
+        agent = callback_context.agent_name
+        started = self._started.pop((callback_context.invocation_id, agent), None)
+        if started is not None:
+            LLM_CALL_DURATION.observe(time.perf_counter() - started, agent, "error")
+        return None
+
+
+# --- 既存の統計の読み出し（取得時のみ） ---
+
+
+def _cache_stats(attr: str) -> dict[LabelValues, float]:
+    from knowva.services import cache
+
+    return {(name,): getattr(c, attr) for name, c in cache.named_caches().items()}
+
+
+def _cache_hit_ratio() -> dict[LabelValues, float]:
+    from knowva.services import cache
+
+    return {
+        (name,): c.hits / (c.hits + c.misses)
+        for name, c in cache.named_caches().items()
+        if c.hits + c.misses
+    }
+
+
+def _generations() -> dict[LabelValues, float]:
+    from knowva.services import cancellation
+
+    return {
+        (kind, outcome): stats[outcome]
+        for kind, stats in cancellation.snapshot().items()
+        for outcome in ("started", "completed", "cancelled")
+    }
+
+
+def _scheduler(field: str) -> Callable[[], dict[LabelValues, float]]:
+    def collect() -> dict[LabelValues, float]:
+        from knowva.services.llm_scheduler import get_llm_scheduler
+
+        return {(): get_llm_scheduler().snapshot()[field]}
+
+    return collect
+
+
+def _scheduler_admissions() -> dict[LabelValues, float]:
+    from knowva.services.llm_scheduler import get_llm_scheduler
+
+    priorities = get_llm_scheduler().snapshot()["priorities"]
+    return {
+        (priority, outcome): stats[outcome]
+        for priority, stats in priorities.items()
+        for outcome in ("admitted", "rejected")
+    }
+
+
+def _summary_jobs() -> dict[LabelValues, float]:
+    from knowva.services.session_summary import get_summary_pipeline
+
+    snapshot = get_summary_pipeline().snapshot()
+    return {(state,): snapshot[state] for state in ("queued", "in_flight", "completed", "failed")}
+
+
+Counter("knowva_cache_hits_total", "TTL cache hits.", ("cache",), lambda: _cache_stats("hits"))
+Counter(
+    "knowva_cache_misses_total", "TTL cache misses.", ("cache",), lambda: _cache_stats("misses")
+)
+Gauge("knowva_cache_hit_ratio", "TTL cache hit ratio since start.", ("cache",), _cache_hit_ratio)
+Counter(
+    "knowva_generations_total",
+    "Agent generations by outcome (cancelled = client went away).",
+    ("kind", "outcome"),
+    _generations,
+)
+Gauge("knowva_llm_slots_active", "LLM scheduler slots in use.", (), _scheduler("active"))
+Gauge("knowva_llm_queue_depth", "Requests waiting for an LLM slot.", (), _scheduler("queue_depth"))
+Counter(
+    "knowva_llm_admissions_total",
+    "LLM scheduler admissions and rejections by priority.",
+    ("priority", "outcome"),
+    _scheduler_admissions,
+)
+Gauge("knowva_summary_jobs", "Session summary pipeline jobs by state.", ("state",), _summary_jobs)
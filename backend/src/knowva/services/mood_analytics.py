@@ -0,0 +1,192 @@
+"""読書横断の心境分析サービス。
+
+ユーザーの全心境記録を1回のコレクショングループクエリで取得し、
+NumPy配列で指標ごとの統計（平均・変化量・分布・時系列トレンド）を計算する。
+結果はユーザーごとにキャッシュする。心境記録を保存・削除した呼び出し元
+（ルーター・ツール）は invalidate() を呼ぶこと。
+"""
+
+from datetime import datetime, timezone
+from operator import itemgetter
+
+import numpy as np
+
+from knowva.services import firestore
+from knowva.services.cache import TTLCache
+
+METRIC_KEYS = firestore.MOOD_METRIC_KEYS
+SCALE_LEVELS = 5  # 各指標は1-5スケール
+DEFAULT_WINDOW = 5  # トレンドの移動平均ウィンドウ（読書数）
+DEFAULT_TREND_LIMIT = 100  # レスポンスに含めるトレンド点数の上限
+_SECONDS_PER_30_DAYS = 30 * 24 * 60 * 60
+
+_analytics_cache = TTLCache(ttl_seconds=600, name="mood_analytics")
+
+_EPOCH = datetime.fromtimestamp(0, tz=timezone.utc)
+
+
+def _recorded_at(mood: dict) -> datetime:
+    return mood.get("recorded_at") or mood.get("created_at") or _EPOCH
+
+
+def _mean(values: np.ndarray) -> list:
+    """列ごとの平均。空の場合は指標数ぶんのNone。"""
+    if not len(values):
+        return [None] * len(METRIC_KEYS)
+    return values.mean(axis=0).tolist()
+
+
+def _distribution(values: np.ndarray) -> np.ndarray:
+    """指標ごとの1-5各値の件数を (指標数, 5) の配列で返す。"""
+    n_metrics = len(METRIC_KEYS)
+    if not len(values):
+        return np.zeros((n_metrics, SCALE_LEVELS), dtype=np.int64)
+    levels = np.clip(values.astype(np.int64) - 1, 0, SCALE_LEVELS - 1)
+    flat = levels + np.arange(n_metrics) * SCALE_LEVELS
+    return np.bincount(flat.ravel(), minlength=n_metrics * SCALE_LEVELS).reshape(
+        n_metrics, SCALE_LEVELS
+    )
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """先頭からの移動平均（ウィンドウに満たない区間は利用可能な件数で平均）。"""
+    n = len(values)
+    cumsum = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)])
+    ends = np.arange(1, n + 1)
+    starts = np.maximum(ends - window, 0)
+    return (cumsum[ends] - cumsum[starts]) / (ends - starts)[:, None]
+
+
+def compute_mood_analytics(
+    moods: list[dict],
+    window: int = DEFAULT_WINDOW,
+    trend_limit: int = DEFAULT_TREND_LIMIT,
+) -> dict:
+    """心境記録のリストから指標ごとの統計を計算する。
+
+    指標の値が欠けている（キーが無い・None）記録は集計から除く。
+
+    Args:
+        moods: 心境記録（reading_id, mood_type, metrics, recorded_at を含む）
+        window: トレンドの移動平均ウィンドウ
+        trend_limit: 返却するトレンド点数の上限（新しいものから）
+
+    Returns:
+        dict: MoodAnalyticsResponse 形式の集計結果
+    """
+    get_metrics = itemgetter(*METRIC_KEYS)
+
+    # 辞書からの取り出しは1パスで行い、以降の計算はすべて配列演算で行う
+    rows = []
+    times = []
+    before_index: dict[str, int] = {}
+    after_index: dict[str, int] = {}
+    for mood in moods:
+        try:
+            row = get_metrics(mood.get("metrics") or {})
+        except KeyError:
+            continue
+        if None in row:
+            continue
+        i = len(rows)
+        rows.append(row)
+        times.append(_recorded_at(mood).timestamp())
+        # 同じ読書の before/after を対にする（読書ごと・typeごとに1件の前提）
+        mood_type = mood.get("mood_type")
+        if mood_type == "before":
+            before_index[mood.get("reading_id")] = i
+        elif mood_type == "after":
+            after_index[mood.get("reading_id")] = i
+
+    n = len(rows)
+    values = np.array(rows, dtype=np.float64).reshape(n, len(METRIC_KEYS))
+    timestamps = np.array(times, dtype=np.float64)
+    before_rows = np.fromiter(before_index.values(), dtype=np.int64, count=len(before_index))
+    after_rows = np.fromiter(after_index.values(), dtype=np.int64, count=len(after_index))
+
+    paired_ids = [rid for rid in after_index if rid in before_index]
+    b_idx = np.array([before_index[rid] for rid in paired_ids], dtype=np.int64)
+    a_idx = np.array([after_index[rid] for rid in paired_ids], dtype=np.int64)
+
+    deltas = values[a_idx] - values[b_idx]
+    pair_times = timestamps[a_idx]
+    order = np.argsort(pair_times, kind="stable")
+    deltas_sorted = deltas[order]
+    times_sorted = pair_times[order]
+
+    before_values = values[before_rows]
+    after_values = values[after_rows]
+    before_mean = _mean(before_values)
+    after_mean = _mean(after_values)
+    delta_mean = _mean(deltas)
+    delta_std = deltas.std(axis=0).tolist() if len(deltas) else [None] * len(METRIC_KEYS)
+    improved = (deltas > 0).sum(axis=0).tolist()
+    declined = (deltas < 0).sum(axis=0).tolist()
+    unchanged = (deltas == 0).sum(axis=0).tolist()
+    before_dist = _distribution(before_values).tolist()
+    after_dist = _distribution(after_values).tolist()
+
+    # 時系列トレンド：変化量の傾き（30日あたり）
+    slopes = [None] * len(METRIC_KEYS)
+    if len(times_sorted) >= 2 and np.ptp(times_sorted) > 0:
+        x = (times_sorted - times_sorted[0]) / _SECONDS_PER_30_DAYS
+        slopes = np.polyfit(x, deltas_sorted, 1)[0].tolist()
+
+    trend = []
+    if len(deltas_sorted):
+        rolling = _rolling_mean(deltas_sorted, window)
+        start = max(len(deltas_sorted) - trend_limit, 0)
+        sorted_ids = [paired_ids[i] for i in order[start:]]
+        for offset, reading_id in enumerate(sorted_ids):
+            i = start + offset
+            trend.append(
+                {
+                    "reading_id": reading_id,
+                    "recorded_at": datetime.fromtimestamp(times_sorted[i], tz=timezone.utc),
+                    "deltas": dict(zip(METRIC_KEYS, deltas_sorted[i].tolist())),
+                    "rolling_deltas": dict(zip(METRIC_KEYS, rolling[i].tolist())),
+                }
+            )
+
+    metrics = {
+        key: {
+            "before_mean": before_mean[j],
+            "after_mean": after_mean[j],
+            "delta_mean": delta_mean[j],
+            "delta_std": delta_std[j],
+            "improved": improved[j],
+            "declined": declined[j],
+            "unchanged": unchanged[j],
+            "before_distribution": before_dist[j],
+            "after_distribution": after_dist[j],
+            "trend_slope_per_30_days": slopes[j],
+        }
+        for j, key in enumerate(METRIC_KEYS)
+    }
+
+    return {
+        "record_count": n,
+        "reading_count": len(before_index.keys() | after_index.keys()),
+        "paired_count": len(paired_ids),
+        "window": window,
+        "metrics": metrics,
+        "trend": trend,
+        "computed_at": datetime.now(timezone.utc),
+    }
+
+
+async def get_mood_analytics(user_id: str) -> dict:
+    """ユーザーの心境分析を取得する（キャッシュ優先）。"""
+    cached = _analytics_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    moods = await firestore.list_user_moods(user_id)
+    result = compute_mood_analytics(moods)
+    _analytics_cache.set(user_id, result)
+    return result
+
+
+def invalidate(user_id: str) -> None:
+    """ユーザーの心境分析キャッシュを無効化する。"""
+    _analytics_cache.invalidate(user_id)
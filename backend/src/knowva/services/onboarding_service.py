@@ -0,0 +1,113 @@
+"""オンボーディング回答の保存サービス。
+
+ニックネーム・current_profile・profileEntries・完了フラグ・バッジ付与を
+1つのトランザクションでまとめてコミットする。
+profileEntries とバッジのドキュメントIDは決定的に生成するため、
+クライアントがリトライしても重複は作られない（冪等）。
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional
+
+from google.cloud.firestore import AsyncClient, AsyncTransaction, async_transactional
+
+from knowva.dependencies import get_firestore_client
+from knowva.services import badge_service, user_service
+
+ONBOARDING_BADGE_ID = "onboarding_complete"
+ONBOARDING_ENTRY_NOTE = "オンボーディングで登録"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _entry_id(entry_type: str, content: str) -> str:
+    """内容から決定的なprofileEntryのIDを作る。"""
+    digest = hashlib.sha256(f"{entry_type}:{content}".encode()).hexdigest()[:20]
+    return f"onboarding_{digest}"
+
+
+async def submit_onboarding(
+    user_id: str,
+    nickname: Optional[str],
+    profile_data: dict,
+    book_wishes: list[str],
+) -> dict:
+    """オンボーディング回答を1回のコミットで保存する。
+
+    Args:
+        user_id: ユーザーID
+        nickname: ニックネーム（空の場合は更新しない）
+        profile_data: current_profile にマージする構造化情報
+        book_wishes: profileEntries (book_wish) として保存する読みたい本
+
+    Returns:
+        dict: badges_earned（今回新たに獲得したバッジID）を含む
+    """
+    db: AsyncClient = get_firestore_client()
+    user_ref = db.collection("users").document(user_id)
+    badge_ref = badge_service.get_badge_ref(db, user_id, ONBOARDING_BADGE_ID)
+    entries_ref = user_ref.collection("profileEntries")
+    entry_contents = {
+        _entry_id("book_wish", content): content
+        for content in (w for w in book_wishes if w.strip())  # 空文字は除外
+    }
+
+    @async_transactional
+    async def _submit(transaction: AsyncTransaction) -> dict:
+        refs = [user_ref, badge_ref, *(entries_ref.document(i) for i in entry_contents)]
+        existing = set()
+        async for snapshot in db.get_all(refs, transaction=transaction):
+            if snapshot.exists:
+                existing.add(snapshot.reference.path)
+
+        now = _now()
+
+        # 1. ユーザードキュメント（ニックネーム・current_profile・完了フラグ）
+        user_data: dict = {
+            # current_profile はネストしたフィールド単位でマージされる
+            "current_profile": profile_data,
+            "onboarding_completed": True,
+            "onboarding_completed_at": now,
+        }
+        if nickname:
+            user_data["name"] = nickname
+        if user_ref.path not in existing:
+            user_data = {
+                "email": None,
+                "name": None,
+                "settings": {"interaction_mode": "guided"},
+                "created_at": now,
+                **user_data,
+            }
+        transaction.set(user_ref, user_data, merge=True)
+
+        # 2. profileEntries（読みたい本）
+        for entry_id, content in entry_contents.items():
+            entry_ref = entries_ref.document(entry_id)
+            if entry_ref.path in existing:
+                continue
+            transaction.set(
+                entry_ref,
+                {
+                    "entry_type": "book_wish",
+                    "content": content,
+                    "note": ONBOARDING_ENTRY_NOTE,
+                    "created_at": now,
+                    "updated_at": now,
+                },
+            )
+
+        # 3. バッジ付与（badges/{badge_id} が無い場合のみ）
+        badges_earned = []
+        if badge_ref.path not in existing:
+            transaction.set(badge_ref, badge_service.build_badge_doc(ONBOARDING_BADGE_ID))
+            badges_earned.append(ONBOARDING_BADGE_ID)
+
+        return {"badges_earned": badges_earned}
+
+    result = await _submit(db.transaction())
+    user_service.invalidate(user_id)
+    return result
@@ -0,0 +1,152 @@
+"""読書対話エージェント用のコンテキスト事前取得。
+
+reading_agent が毎回 get_reading_context ツールを呼ぶと、LLMの往復が1回増え、
+Firestore読み取りも3回（読書記録・ユーザー設定・本）発生する。
+ADKセッションの作成・復元時にこれらを並行して取得してセッションstateに格納し、
+エージェントには instruction のテンプレート（{reading_context_text?}）で渡す。
+"""
+
+import asyncio
+import time
+from typing import Optional
+
+from google.adk.sessions import Session
+
+from knowva.services import firestore
+from knowva.services.session_service import FirestoreSessionService
+
+# stateのコンテキストを再取得するまでの秒数（REST経由の更新を拾うため）
+CONTEXT_TTL_SECONDS = 300
+
+# エージェントに渡すあらすじの最大文字数
+_DESCRIPTION_MAX_CHARS = 800
+
+_STATUS_LABELS = {
+    "not_started": "not_started（これから読む）",
+    "reading": "reading（読書中）",
+    "completed": "completed（読了）",
+}
+
+
+async def load_reading_context(
+    user_id: str,
+    reading_id: str,
+    session_type: Optional[str],
+    reading: Optional[dict] = None,
+) -> Optional[dict]:
+    """読書記録・本の詳細・ユーザー設定を並行して取得し、state用のdictを返す。
+
+    呼び出し元が読書記録を取得済みの場合は reading に渡すと読み取りを省略する。
+    読書記録が存在しない場合はNone。
+    """
+    if reading is None:
+        reading, user_settings = await asyncio.gather(
+            firestore.get_reading(user_id, reading_id),
+            firestore.get_user_settings(user_id),
+        )
+        if not reading:
+            return None
+        book_id = reading.get("book_id")
+        book_details = await firestore.get_book(book_id) if book_id else None
+    else:
+        book_id = reading.get("book_id")
+        user_settings, book_details = await asyncio.gather(
+            firestore.get_user_settings(user_id),
+            firestore.get_book(book_id) if book_id else _none(),
+        )
+
+    session_type = session_type or "during_reading"
+    return {
+        "reading_context": reading,
+        "book_details": book_details,
+        "user_settings": user_settings,
+        "interaction_mode": user_settings.get("interaction_mode", "guided"),
+        "reading_context_text": format_reading_context(
+            reading, book_details, user_settings, session_type
+        ),
+        "context_loaded_at": time.time(),
+    }
+
+
+async def _none() -> None:
+    return None
+
+
+def format_reading_context(
+    reading: dict,
+    book_details: Optional[dict],
+    user_settings: dict,
+    session_type: str,
+) -> str:
+    """instruction に埋め込む読書コンテキストのテキストを組み立てる。"""
+    book = reading.get("book", {})
+    status = reading.get("status", "not_started")
+    lines = [
+        f"- 書籍タイトル: {book.get('title', '')}",
+        f"- 著者: {book.get('author', '')}",
+        f"- 読書ステータス（status）: {_STATUS_LABELS.get(status, status)}",
+        f"- セッションタイプ: {session_type}",
+        f"- 対話モード（user_settings.interaction_mode）: "
+        f"{user_settings.get('interaction_mode', 'guided')}",
+    ]
+    motivation = (reading.get("reading_context") or {}).get("motivation")
+    if motivation:
+        lines.append(f"- 読む動機: {motivation}")
+    if reading.get("latest_summary"):
+        lines.append(f"- これまでの対話の要約: {reading['latest_summary']}")
+    description = (book_details or {}).get("description")
+    if description:
+        if len(description) > _DESCRIPTION_MAX_CHARS:
+            description = description[:_DESCRIPTION_MAX_CHARS] + "…"
+        lines.append(f"- 本の概要（book_details.description）: {description}")
+    return "\n".join(lines)
+
+
+def _is_fresh(state: dict) -> bool:
+    loaded_at = state.get("context_loaded_at")
+    return (
+        "reading_context_text" in state
+        and loaded_at is not None
+        and time.time() - loaded_at < CONTEXT_TTL_SECONDS
+    )
+
+
+async def ensure_reading_session(
+    session_service: FirestoreSessionService,
+    *,
+    app_name: str,
+    user_id: str,
+    session_id: str,
+    reading_id: str,
+    session_type: Optional[str],
+    reading: Optional[dict] = None,
+) -> Session:
+    """ADKセッションを取得（なければ作成）し、読書コンテキストをstateに揃える。
+
+    コンテキストが無いか古い場合のみ再取得するため、同一インスタンスでの
+    連続したメッセージでは追加のFirestore読み取りは発生しない。
+    """
+    session_type = session_type or "during_reading"
+    adk_session = await session_service.get_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    )
+    if adk_session and _is_fresh(adk_session.state):
+        return adk_session
+
+    context = await load_reading_context(user_id, reading_id, session_type, reading=reading)
+    if not adk_session:
+        return await session_service.create_session(
+            app_name=app_name,
+            user_id=user_id,
+            session_id=session_id,
+            state={
+                "reading_id": reading_id,
+                "user_id": user_id,
+                "session_type": session_type,
+                **(context or {}),
+            },
+        )
+
+    if context:
+        await session_service.update_session_state(adk_session, context)
+    return adk_session
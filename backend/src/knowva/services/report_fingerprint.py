@@ -0,0 +1,100 @@
+"""レポート生成の入力フィンガープリント。
+
+レポートの入力（読書情報・セッション・Insight・プロファイル・心境）から
+ハッシュを計算し、レポートに保存する。最新レポートと一致すれば入力に変化がないため、
+レポートAgent（最もコストの高いLLM呼び出し）を実行せずに既存のレポートを返す。
+
+メッセージ本文は読まず、セッションごとの message_count で対話の変化を検出する
+（ローリング要約の更新のような派生データの変化では再生成しない）。
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+import orjson
+
+from knowva.services import firestore
+
+# レポートのプロンプトや出力形式を変えたら上げる（既存レポートを一律に再生成対象にする）
+FINGERPRINT_VERSION = 1
+
+STATE_KEY = "input_fingerprint"
+
+
+def _default(obj):
+    # Firestore の DatetimeWithNanoseconds など
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def fingerprint(inputs: dict) -> str:
+    """入力データのハッシュ（キー順に依存しない）を返す。"""
+    payload = orjson.dumps(
+        inputs,
+        default=_default,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+    )
+    return hashlib.sha256(payload).hexdigest()
+
+
+async def compute_report_fingerprint(user_id: str, reading_id: str) -> Optional[str]:
+    """レポート生成の入力のフィンガープリントを計算する。読書記録がなければNone。"""
+    (
+        reading,
+        sessions,
+        insights,
+        profile_entries,
+        mood_comparison,
+        current_profile,
+    ) = await asyncio.gather(
+        firestore.get_reading(user_id, reading_id),
+        firestore.list_sessions(user_id, reading_id),
+        firestore.list_insights(user_id, reading_id),
+        firestore.list_profile_entries(user_id),
+        firestore.get_mood_comparison(user_id, reading_id),
+        firestore.get_user_profile(user_id),
+    )
+    if not reading:
+        return None
+
+    return fingerprint(
+        {
+            "version": FINGERPRINT_VERSION,
+            "reading": {
+                "book": reading.get("book", {}),
+                "status": reading.get("status"),
+                "reading_context": reading.get("reading_context"),
+            },
+            "sessions": [
+                {
+                    "id": s["id"],
+                    "session_type": s.get("session_type"),
+                    "message_count": s.get("message_count", 0),
+                }
+                for s in sessions
+            ],
+            "insights": [
+                {
+                    "id": i.get("id"),
+                    "content": i.get("content"),
+                    "type": i.get("type"),
+                    "reading_status": i.get("reading_status"),
+                }
+                for i in insights
+            ],
+            "profile_entries": [
+                {
+                    "id": e.get("id"),
+                    "entry_type": e.get("entry_type"),
+                    "content": e.get("content"),
+                    "note": e.get("note"),
+                }
+                for e in profile_entries
+            ],
+            "current_profile": current_profile or {},
+            "mood_comparison": mood_comparison,
+        }
+    )
@@ -13,11 +13,15 @@ from google.adk.events import Event
 from google.adk.sessions import BaseSessionService, Session
 from google.genai import types
 
+from knowva.config import settings
 from knowva.dependencies import get_firestore_client
-from knowva.services import firestore
+from knowva.services import firestore, tracing
 
 logger = logging.getLogger(__name__)
 
+# 復元したセッションの state に入れるローリング要約のキー（エージェントの指示から参照する）
+SUMMARY_STATE_KEY = "session_summary"
+
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
@@ -31,6 +35,7 @@ class FirestoreSessionService(BaseSessionService):
     セッションを復元できるようにする。
 
     会話履歴は既存のmessagesコレクションから復元する。
+    ローリング要約があるセッションは、要約を state に入れ、直近のメッセージだけを復元する。
     """
 
     def __init__(self):
@@ -93,10 +98,16 @@ class FirestoreSessionService(BaseSessionService):
         session_id: str,
     ) -> Optional[Session]:
         """既存のセッションを取得する。メッセージ履歴から会話コンテキストを復元する。"""
+        with tracing.span("session.get", **{"knowva.session_id": session_id}):
+            return await self._get_session(app_name, user_id, session_id)
+
+    async def _get_session(self, app_name: str, user_id: str, session_id: str) -> Optional[Session]:
         key = self._get_session_key(app_name, user_id, session_id)
+        current = tracing.current_span()
 
         # キャッシュにあればそれを返す
         if key in self._sessions:
+            current.set_attribute("session.cached", True)
             return self._sessions[key]
 
         db = get_firestore_client()
@@ -114,11 +125,13 @@ class FirestoreSessionService(BaseSessionService):
 
         events = []
         if reading_id:
-            events = await self._restore_events_from_messages(
+            events, summary = await self._restore_events_from_messages(
                 user_id=user_id,
                 reading_id=reading_id,
                 session_id=session_id,
             )
+            if summary:
+                state = {**state, SUMMARY_STATE_KEY: summary}
 
         session = Session(
             app_name=app_name,
@@ -128,6 +141,9 @@ class FirestoreSessionService(BaseSessionService):
             events=events,
         )
 
+        current.set_attribute("session.cached", False)
+        current.set_attribute("session.restored_events", len(events))
+
         # キャッシュに保存
         self._sessions[key] = session
 
@@ -139,9 +155,29 @@ class FirestoreSessionService(BaseSessionService):
         user_id: str,
         reading_id: str,
         session_id: str,
-    ) -> list[Event]:
-        """Firestoreのmessagesコレクションから会話履歴をEventとして復元する。"""
-        messages = await firestore.list_messages(user_id, reading_id, session_id)
+    ) -> tuple[list[Event], Optional[str]]:
+        """Firestoreのmessagesコレクションから会話履歴をEventとして復元する。
+
+        ローリング要約がある場合は、要約済みの範囲を読み直さず、直近のメッセージ
+        （未要約のものはすべて）だけを復元し、要約と合わせて返す。
+        """
+        session = await firestore.get_session(user_id, reading_id, session_id) or {}
+        summary = session.get("rolling_summary")
+        if summary:
+            until = session.get("rolling_summary_until")
+            keep = settings.session_restore_recent_messages
+            messages = await firestore.list_messages(user_id, reading_id, session_id, last=keep)
+            if (
+                until is not None
+                and len(messages) == keep
+                and (not messages or messages[0]["created_at"] > until)
+            ):
+                # 直近の件数より未要約のメッセージが多い場合は、要約済みの位置以降をすべて読む
+                messages = await firestore.list_messages(
+                    user_id, reading_id, session_id, after=until
+                )
+        else:
+            messages = await firestore.list_messages(user_id, reading_id, session_id)
 
         events = []
         for msg in messages:
@@ -159,7 +195,7 @@ class FirestoreSessionService(BaseSessionService):
             )
             events.append(event)
 
-        return events
+        return events, summary
 
     async def delete_session(
         self,
@@ -178,6 +214,10 @@ class FirestoreSessionService(BaseSessionService):
 
         logger.info(f"Deleted session: {session_id}")
 
+    def evict_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        """メモリ上のキャッシュだけを破棄する。次回の取得時にFirestoreから復元される。"""
+        self._sessions.pop(self._get_session_key(app_name, user_id, session_id), None)
+
     async def list_sessions(
         self,
         *,
@@ -207,15 +247,42 @@ class FirestoreSessionService(BaseSessionService):
 
         return sessions
 
+    async def update_session_state(self, session: Session, delta: dict) -> None:
+        """セッションのstateを部分更新する（メモリ上とFirestoreの両方）。"""
+        session.state.update(delta)
+
+        db = get_firestore_client()
+        await (
+            db.collection("adk_sessions")
+            .document(session.id)
+            .update(
+                {
+                    **{f"state.{key}": value for key, value in delta.items()},
+                    "updated_at": _now(),
+                }
+            )
+        )
+
     async def append_event(
         self,
         session: Session,
         event: Event,
     ) -> Event:
         """セッションにイベントを追加する。"""
+        with tracing.span("session.append_event", **{"event.author": event.author or ""}):
+            return await self._append_event(session, event)
+
+    async def _append_event(self, session: Session, event: Event) -> Event:
         # メモリ上のセッションに追加
         session.events.append(event)
 
+        # ツールによるstate変更も永続化する（temp:は揮発値なので除外）
+        state_delta = {
+            f"state.{key}": value
+            for key, value in (event.actions.state_delta if event.actions else {}).items()
+            if not key.startswith("temp:")
+        }
+
         # Firestoreのupdated_atを更新
         db = get_firestore_client()
         await (
@@ -223,6 +290,7 @@ class FirestoreSessionService(BaseSessionService):
             .document(session.id)
             .update(
                 {
+                    **state_delta,
                     "updated_at": _now(),
                 }
             )
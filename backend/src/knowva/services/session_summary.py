@@ -0,0 +1,371 @@
+"""セッション要約の生成とバックグラウンド処理。
+
+セッション終了時は summary_status を "pending" にして要約ジョブを登録するだけで、
+HTTPレスポンスは要約の生成を待たない。ジョブはプロセス内のワーカーが
+並行数を制限して処理し、失敗時は指数バックオフで再試行したうえで
+要約と summary_status（"completed" / "failed"）を書き戻す。
+
+プロセスの停止などで処理されなかったジョブは summary_status が "pending" のまま残るため、
+移行スクリプト（knowva.migrations.backfill_session_summaries）で拾い直せる。
+
+対話中は N 件ごとに、前回の要約と新しいメッセージだけから「ローリング要約」を
+更新してセッションに保存する（rolling_summary / rolling_summary_until /
+rolling_summary_count）。1回の更新のプロンプトは要約の上限文字数 + N 件分で一定になる。
+終了時の一行要約・レポートのコンテキスト・セッション復元はこの要約を使い、
+要約済みの範囲のメッセージを読み直さない。
+
+ローリング要約がない長い対話はチャンクに分けて部分要約を作り（map）、部分要約をまとめて
+一行要約にする（reduce）ことで、1回のプロンプトの長さを一定以下に保つ。
+"""
+
+import asyncio
+import contextvars
+import logging
+from typing import Optional
+
+from knowva.config import settings
+from knowva.services import firestore, llm_backend
+from knowva.services.llm_scheduler import LLMOverloadedError, Priority, get_llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODEL = "gemini-2.0-flash"
+# map フェーズで同時に要約するチャンク数
+_MAP_CONCURRENCY = 3
+
+STATUS_PENDING = "pending"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+# ジョブの種類
+JOB_FINAL = "final"
+JOB_ROLLING = "rolling"
+
+# ローリング要約の更新時に1メッセージから使う最大文字数
+_ROLLING_MESSAGE_CHARS = 1000
+
+_ONE_LINE_PROMPT = """以下は読書についての対話内容です。
+この対話で話された内容を、20〜40文字程度の日本語で一行にまとめてください。
+要約のみを返してください。
+
+対話内容:
+{text}
+
+要約:"""
+
+_CHUNK_PROMPT = """以下は読書についての対話の一部です。
+話題・ユーザーの気づき・感想を、200文字程度の日本語で要約してください。
+要約のみを返してください。
+
+対話内容:
+{text}
+
+要約:"""
+
+_MERGE_PROMPT = """以下は読書についての1つの対話を、前から順に区切って要約したものです。
+対話全体で話された内容を、20〜40文字程度の日本語で一行にまとめてください。
+要約のみを返してください。
+
+部分要約:
+{text}
+
+要約:"""
+
+
+_ROLLING_PROMPT = """以下は読書についての対話の、これまでの要約と新しいやりとりです。
+新しいやりとりの内容を反映して、対話全体の要約を{max_chars}文字以内の日本語で書き直してください。
+話題の流れ・ユーザーの気づきや感想・未解決の問いを残してください。
+要約のみを返してください。
+
+これまでの要約:
+{summary}
+
+新しいやりとり:
+{text}
+
+要約:"""
+
+_ONE_LINE_FROM_SUMMARY_PROMPT = """以下は読書についての対話の要約です。
+この対話で話された内容を、20〜40文字程度の日本語で一行にまとめてください。
+要約のみを返してください。
+
+対話の要約:
+{text}
+
+要約:"""
+
+
+def format_transcript(messages: list[dict]) -> list[str]:
+    """メッセージを「話者: 本文」の行に変換する。"""
+    return [
+        f"{'ユーザー' if msg['role'] == 'user' else 'AI'}: {msg['message']}" for msg in messages
+    ]
+
+
+def chunk_lines(lines: list[str], max_chars: int) -> list[str]:
+    """行を区切らずに、1チャンクが max_chars 程度になるようまとめる。
+
+    1行だけで max_chars を超える場合はその行を切り詰める。
+    """
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in lines:
+        line = line[:max_chars]
+        if current and size + len(line) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+async def _generate(prompt: str) -> str:
+    """要約用のモデル呼び出し（LLMスケジューラのBACKGROUND優先度）。"""
+    async with get_llm_scheduler().slot(Priority.BACKGROUND):
+        return await llm_backend.generate_text(SUMMARY_MODEL, prompt, "session_summary")
+
+
+async def summarize_messages(messages: list[dict]) -> Optional[str]:
+    """対話履歴から一行の要約を生成する。
+
+    生成に失敗した場合は例外をそのまま送出する（再試行は呼び出し側で行う）。
+    """
+    if not messages:
+        return None
+    max_chars = settings.summary_chunk_chars
+    chunks = chunk_lines(format_transcript(messages), max_chars)
+    if len(chunks) == 1:
+        text = await _generate(_ONE_LINE_PROMPT.format(text=chunks[0]))
+    else:
+        semaphore = asyncio.Semaphore(_MAP_CONCURRENCY)
+
+        async def summarize_chunk(chunk: str) -> str:
+            async with semaphore:
+                return await _generate(_CHUNK_PROMPT.format(text=chunk))
+
+        # map: チャンクごとの部分要約。部分要約がまだ長ければ繰り返し畳み込む
+        while len(chunks) > 1:
+            partials = await asyncio.gather(*(summarize_chunk(chunk) for chunk in chunks))
+            chunks = chunk_lines([p for p in partials if p], max_chars)
+        if not chunks:
+            return None
+        # reduce: 部分要約から一行要約を作る
+        text = await _generate(_MERGE_PROMPT.format(text=chunks[0]))
+    # 改行を除去して一行に
+    return text.replace("\n", " ") or None
+
+
+async def fold_messages(summary: Optional[str], messages: list[dict]) -> str:
+    """これまでの要約に新しいメッセージを畳み込んだ要約を返す。
+
+    メッセージが多い場合もチャンクごとに順に畳み込み、プロンプトの長さを一定以下に保つ。
+    """
+    max_chars = settings.session_rolling_summary_max_chars
+    lines = [line[:_ROLLING_MESSAGE_CHARS] for line in format_transcript(messages)]
+    for chunk in chunk_lines(lines, settings.summary_chunk_chars):
+        summary = await _generate(
+            _ROLLING_PROMPT.format(max_chars=max_chars, summary=summary or "（なし）", text=chunk)
+        )
+    return (summary or "")[: max_chars * 2]
+
+
+def _rolling_fields(session: dict, summary: str, messages: list[dict]) -> dict:
+    return {
+        "rolling_summary": summary,
+        "rolling_summary_until": messages[-1]["created_at"],
+        "rolling_summary_count": (session.get("rolling_summary_count") or 0) + len(messages),
+    }
+
+
+async def update_rolling_summary(user_id: str, reading_id: str, session_id: str) -> Optional[str]:
+    """前回の要約以降のメッセージだけを読み、ローリング要約を更新する。"""
+    session = await firestore.get_session(user_id, reading_id, session_id)
+    if not session:
+        return None
+    messages = await firestore.list_messages(
+        user_id, reading_id, session_id, after=session.get("rolling_summary_until")
+    )
+    if not messages:
+        return session.get("rolling_summary")
+    summary = await fold_messages(session.get("rolling_summary"), messages)
+    await firestore.update_session(
+        user_id, reading_id, session_id, _rolling_fields(session, summary, messages)
+    )
+    return summary
+
+
+def schedule_rolling_update(
+    user_id: str, reading_id: str, session: dict, added_messages: int
+) -> bool:
+    """未要約のメッセージが一定数たまったらローリング要約の更新を登録する。
+
+    Args:
+        session: メッセージ保存前に取得したセッション。
+        added_messages: このリクエストで保存したメッセージ数。
+    """
+    interval = settings.session_rolling_summary_interval
+    if interval <= 0:
+        return False
+    message_count = (session.get("message_count") or 0) + added_messages
+    if message_count - (session.get("rolling_summary_count") or 0) < interval:
+        return False
+    return get_summary_pipeline().enqueue(user_id, reading_id, session["id"], kind=JOB_ROLLING)
+
+
+async def summarize_session(user_id: str, reading_id: str, session_id: str) -> Optional[str]:
+    """セッションの一行要約を生成して書き戻す。
+
+    ローリング要約がある場合は、それと未要約のメッセージだけから生成する。
+    """
+    session = await firestore.get_session(user_id, reading_id, session_id) or {}
+    rolling = session.get("rolling_summary")
+    update: dict = {"summary_status": STATUS_COMPLETED}
+    if rolling:
+        messages = await firestore.list_messages(
+            user_id, reading_id, session_id, after=session.get("rolling_summary_until")
+        )
+        if messages:
+            rolling = await fold_messages(rolling, messages)
+            update.update(_rolling_fields(session, rolling, messages))
+        text = await _generate(_ONE_LINE_FROM_SUMMARY_PROMPT.format(text=rolling))
+        summary = text.replace("\n", " ") or None
+    else:
+        messages = await firestore.list_messages(user_id, reading_id, session_id)
+        summary = await summarize_messages(messages)
+    update["summary"] = summary
+    await firestore.update_session(user_id, reading_id, session_id, update)
+    return summary
+
+
+class SummaryPipeline:
+    """セッション要約ジョブを並行数を制限して処理するワーカー群。
+
+    同じセッションのジョブ（ローリング要約と終了時の要約）は1件ずつ順に処理する。
+    並行すると同じメッセージを二重に畳み込んだり、rolling_summary_* を
+    互いに上書きしたりするため。
+    """
+
+    def __init__(self, concurrency: int, max_retries: int, retry_base_seconds: float):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        # (種類, user_id, reading_id, session_id)
+        self._queue: asyncio.Queue[tuple[str, str, str, str]] = asyncio.Queue()
+        # 待機中・処理中のジョブ（同じセッション・種類の重複登録を防ぐ）
+        self._jobs: set[tuple[str, str, str, str]] = set()
+        # session_id → 同じセッションのジョブを順に処理するためのロック
+        self._session_locks: dict[str, asyncio.Lock] = {}
+        self._workers: list[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def enqueue(
+        self, user_id: str, reading_id: str, session_id: str, kind: str = JOB_FINAL
+    ) -> bool:
+        """要約ジョブを登録する。既に登録済みの場合はFalse。"""
+        job = (kind, user_id, reading_id, session_id)
+        if job in self._jobs:
+            return False
+        self._ensure_workers()
+        self._jobs.add(job)
+        self._queue.put_nowait(job)
+        return True
+
+    def _ensure_workers(self) -> None:
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self.concurrency:
+            # 最初に登録したリクエストの contextvars（Firestoreの操作数・トレース）を
+            # 引き継がないよう、空のコンテキストで開始する
+            worker = asyncio.create_task(self._worker(), context=contextvars.Context())
+            self._workers.append(worker)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            session_id = job[3]
+            lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+            try:
+                async with lock:
+                    await self._run(*job)
+            finally:
+                self._jobs.discard(job)
+                if not any(j[3] == session_id for j in self._jobs):
+                    self._session_locks.pop(session_id, None)
+                self._queue.task_done()
+
+    async def _run(self, kind: str, user_id: str, reading_id: str, session_id: str) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                if kind == JOB_ROLLING:
+                    await update_rolling_summary(user_id, reading_id, session_id)
+                else:
+                    await summarize_session(user_id, reading_id, session_id)
+                self.completed += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Session summary ({kind}) failed: {session_id}: {e}")
+                    break
+                self.retried += 1
+                delay = self.retry_base_seconds * 2**attempt
+                if isinstance(e, LLMOverloadedError):
+                    delay = max(delay, e.retry_after)
+                logger.warning(f"Retrying session summary in {delay:.1f}s: {session_id}: {e}")
+                await asyncio.sleep(delay)
+
+        self.failed += 1
+        if kind == JOB_ROLLING:
+            # ローリング要約は次の更新や終了時の要約で追いつくため、状態は変えない
+            return
+        try:
+            await firestore.update_session(
+                user_id, reading_id, session_id, {"summary_status": STATUS_FAILED}
+            )
+        except Exception as e:
+            logger.error(f"Failed to mark session summary as failed: {session_id}: {e}")
+
+    async def join(self) -> None:
+        """登録済みのジョブがすべて終わるまで待つ。"""
+        await self._queue.join()
+
+    async def shutdown(self) -> None:
+        """ワーカーを停止する。未処理のジョブは pending のまま残る。"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "in_flight": len(self._jobs) - self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+_pipeline: Optional[SummaryPipeline] = None
+
+
+def get_summary_pipeline() -> SummaryPipeline:
+    """要約パイプラインのシングルトンを取得する。"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = SummaryPipeline(
+            concurrency=settings.summary_concurrency,
+            max_retries=settings.summary_max_retries,
+            retry_base_seconds=settings.summary_retry_base_seconds,
+        )
+    return _pipeline
+
+
+async def shutdown() -> None:
+    if _pipeline is not None:
+        await _pipeline.shutdown()
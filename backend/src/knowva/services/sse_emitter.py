@@ -0,0 +1,155 @@
+"""SSEの送出レイヤー（テキスト差分のまとめ送り・ハートビート・フレームメトリクス）。
+
+- テキスト差分は生成側では TextDelta として生の文字列のまま扱い、
+  配信時に短い時間窓・文字数の範囲で連続する差分を1フレームにまとめてから
+  JSONにエンコードする（フレーム数と1フレームごとのエンコードを減らす）
+- 送出するイベントがない状態が続く場合は ping イベントを送る
+  （プロキシのアイドルタイムアウト対策。リプレイバッファには入れない）
+- 送出したフレームの件数・サイズをイベント種別ごとに記録する
+
+まとめたフレームの id には、含めた最後の差分の id を使う。
+再接続時の Last-Event-ID はその続きから再開するため、取りこぼしも重複も起きない。
+"""
+
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+import orjson
+from sse_starlette import EventSourceResponse, ServerSentEvent
+
+TEXT_DELTA = "text_delta"
+
+# フレームサイズの分布のバケット境界（バイト）
+_SIZE_BUCKETS = (64, 256, 1024, 4096)
+# フレームレートの算出に使う直近の秒数
+_RATE_WINDOW_SECONDS = 60
+
+
+class TextDelta(NamedTuple):
+    """生成側が送出するテキスト差分（エンコード前）。"""
+
+    text: str
+
+
+def _json_default(obj: Any) -> Any:
+    # Firestore の DatetimeWithNanoseconds など datetime のサブクラス
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(payload: Any) -> str:
+    """SSEのデータをJSONにエンコードする（orjson を使用）。"""
+    return orjson.dumps(payload, default=_json_default).decode()
+
+
+def encode_delta(text: str) -> str:
+    return encode_json({"delta": text})
+
+
+def ping_event() -> ServerSentEvent:
+    """ハートビート用の ping イベント（id は付けない）。"""
+    return ServerSentEvent(data=encode_json({"ts": datetime.now(timezone.utc)}), event="ping")
+
+
+class _FrameStats:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.max_bytes = 0
+        self.size_buckets = [0] * (len(_SIZE_BUCKETS) + 1)
+
+    def record(self, size: int) -> None:
+        self.frames += 1
+        self.bytes += size
+        self.max_bytes = max(self.max_bytes, size)
+        for i, bound in enumerate(_SIZE_BUCKETS):
+            if size <= bound:
+                self.size_buckets[i] += 1
+                break
+        else:
+            self.size_buckets[-1] += 1
+
+    def to_dict(self) -> dict:
+        labels = [f"le_{bound}" for bound in _SIZE_BUCKETS] + ["gt_" + str(_SIZE_BUCKETS[-1])]
+        return {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "avg_bytes": round(self.bytes / self.frames, 1) if self.frames else 0.0,
+            "size_buckets": dict(zip(labels, self.size_buckets)),
+        }
+
+
+class FrameMetrics:
+    """送出フレームの件数・サイズ・直近のフレームレート。"""
+
+    def __init__(self):
+        self._by_event: dict[str, _FrameStats] = {}
+        # (秒, その秒に送ったフレーム数)
+        self._per_second: deque[list[int]] = deque(maxlen=_RATE_WINDOW_SECONDS)
+        # まとめ送り前の差分数とまとめた後のフレーム数
+        self.delta_chunks = 0
+        self.delta_frames = 0
+        self.pings = 0
+
+    def record_frame(self, event: str, size: int) -> None:
+        self._by_event.setdefault(event, _FrameStats()).record(size)
+        now = int(time.monotonic())
+        if self._per_second and self._per_second[-1][0] == now:
+            self._per_second[-1][1] += 1
+        else:
+            self._per_second.append([now, 1])
+
+    def record_coalesced(self, chunks: int) -> None:
+        self.delta_chunks += chunks
+        self.delta_frames += 1
+
+    def frames_per_second(self) -> float:
+        """直近 _RATE_WINDOW_SECONDS 秒間の平均フレームレート。"""
+        since = int(time.monotonic()) - _RATE_WINDOW_SECONDS
+        frames = sum(count for second, count in self._per_second if second > since)
+        return round(frames / _RATE_WINDOW_SECONDS, 3)
+
+    def snapshot(self) -> dict:
+        return {
+            "frames_per_second": self.frames_per_second(),
+            "events": {event: stats.to_dict() for event, stats in self._by_event.items()},
+            "delta_chunks": self.delta_chunks,
+            "delta_frames": self.delta_frames,
+            "pings": self.pings,
+        }
+
+
+_metrics = FrameMetrics()
+
+
+def get_frame_metrics() -> FrameMetrics:
+    return _metrics
+
+
+async def metered(events: AsyncIterator[ServerSentEvent]) -> AsyncGenerator[ServerSentEvent, None]:
+    """送出するフレームをメトリクスに記録する。"""
+    async for sse in events:
+        event = sse.event or "message"
+        if event == "ping":
+            _metrics.pings += 1
+        _metrics.record_frame(event, len((sse.data or "").encode()))
+        yield sse
+
+
+def stream_response(events: AsyncIterator[ServerSentEvent]) -> EventSourceResponse:
+    """メトリクス記録付きのSSEレスポンスを返す。
+
+    ハートビートは送出側（ReplayStream）が ping イベントとして送るため、
+    sse_starlette 組み込みのコメント ping は無効にする。
+    """
+    return EventSourceResponse(metered(events), headers={"Cache-Control": "no-cache"}, ping=0)
+
+
+def snapshot() -> dict:
+    """フレームメトリクスのスナップショットを返す。"""
+    return _metrics.snapshot()
@@ -0,0 +1,384 @@
+"""再接続可能なSSEストリーム。
+
+生成（ADK実行）はHTTP接続とは独立したタスクで動かし、送出したイベントに
+単調増加の id を振ってメモリ上のリプレイバッファに保持する。
+接続が切れたクライアントは Last-Event-ID を付けて再接続すると、
+取りこぼしたイベントを受け取ったあと、生成中であればそのまま続きを受信できる。
+
+- バッファはストリームごとに上限件数まで保持し、溢れた古いイベントは
+  設定で有効な場合のみ Firestore に退避する（完了時には残りも退避し、
+  他インスタンスからの再接続でもリプレイできるようにする）
+- 購読者が一人もいない状態が猶予時間を超えると生成タスクをキャンセルする
+  （キャンセル時の後始末は cancellation.cancellable_run が行う）
+- 完了したストリームは保持期間が過ぎるとメモリから破棄する
+- テキスト差分は生の文字列で保持し、購読側でまとめてから送る。
+  待機中は一定間隔で ping を送る（sse_emitter を参照）
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sse_starlette import ServerSentEvent
+
+from knowva.config import settings
+from knowva.services import firestore, metrics
+from knowva.services.sse_emitter import (
+    TEXT_DELTA,
+    TextDelta,
+    encode_delta,
+    get_frame_metrics,
+    ping_event,
+)
+
+logger = logging.getLogger(__name__)
+
+# Firestoreに退避する際のまとめ書き件数
+_SPILL_FLUSH_SIZE = 50
+
+
+def _spill_record(event_id: int, event: Optional[str], data: str) -> dict:
+    if event == TEXT_DELTA:
+        data = encode_delta(data)
+    return {"id": event_id, "event": event, "data": data}
+
+
+class ReplayStream:
+    """1つの生成のイベントを保持し、複数の購読者に配信する。"""
+
+    def __init__(
+        self, stream_id: str, owner_id: str, scope: str, buffer_size: int, kind: str = "stream"
+    ):
+        self.stream_id = stream_id
+        self.owner_id = owner_id
+        # 再接続先のURLと対応づけるための識別子（例: "reading_id/session_id"）
+        self.scope = scope
+        # メトリクス用の生成種別（"reading_chat" など）
+        self.kind = kind
+        self._started_at = 0.0
+        self._first_token_recorded = False
+        self.done = False
+        # (id, event, data)。text_delta の data はエンコード前の差分文字列
+        self._events: deque[tuple[int, Optional[str], str]] = deque(maxlen=buffer_size)
+        self._last_id = 0
+        self._spilled_up_to = 0
+        self._pending_spill: list[dict] = []
+        self._changed = asyncio.Condition()
+        self._subscribers = 0
+        self._task: Optional[asyncio.Task] = None
+        self._idle_handle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_id
+
+    @property
+    def _first_buffered_id(self) -> int:
+        return self._events[0][0] if self._events else self._last_id + 1
+
+    def _spill_enabled(self) -> bool:
+        return settings.sse_replay_spill_to_firestore
+
+    async def _produce(self, source: AsyncIterator[ServerSentEvent | TextDelta]) -> None:
+        try:
+            async for item in source:
+                if isinstance(item, TextDelta):
+                    await self._append(TEXT_DELTA, item.text)
+                elif item.event == TEXT_DELTA:
+                    await self._append(TEXT_DELTA, json.loads(item.data)["delta"])
+                else:
+                    await self._append(item.event, item.data)
+        except asyncio.CancelledError:
+            logger.info(f"Stream producer cancelled: {self.stream_id}")
+        except Exception as e:
+            logger.error(f"Stream producer failed: {self.stream_id}: {e}", exc_info=True)
+        finally:
+            try:
+                await self._close_source(source)
+            finally:
+                await self._finish()
+
+    async def _close_source(self, source: AsyncIterator[ServerSentEvent | TextDelta]) -> None:
+        """生成元を閉じ、その後始末（スロットの解放・キャンセル時の処理）を待つ。
+
+        生成元の待機中以外（_append など）でキャンセルされた場合、生成元は途中のまま残り、
+        閉じなければ後始末がガベージコレクションまで実行されない。
+        """
+        aclose = getattr(source, "aclose", None)
+        if aclose is None:
+            return
+        try:
+            await asyncio.shield(aclose())
+        except Exception as e:
+            logger.warning(f"Failed to close stream source: {self.stream_id}: {e}")
+
+    async def _append(self, event: Optional[str], data: str) -> None:
+        if event == TEXT_DELTA and not self._first_token_recorded:
+            self._first_token_recorded = True
+            metrics.SSE_TIME_TO_FIRST_TOKEN.observe(
+                time.perf_counter() - self._started_at, self.kind
+            )
+        self._last_id += 1
+        if len(self._events) == self._events.maxlen:
+            if self._spill_enabled():
+                self._pending_spill.append(_spill_record(*self._events[0]))
+        self._events.append((self._last_id, event, data))
+        async with self._changed:
+            self._changed.notify_all()
+        if len(self._pending_spill) >= _SPILL_FLUSH_SIZE:
+            await self._flush_spill()
+
+    async def _finish(self) -> None:
+        self.done = True
+        self._cancel_idle_timer()
+        async with self._changed:
+            self._changed.notify_all()
+        if self._spill_enabled():
+            # 完了時は残りも退避し、他インスタンスからもリプレイできるようにする
+            self._pending_spill.extend(
+                _spill_record(*entry) for entry in self._events if entry[0] > self._spilled_up_to
+            )
+            await self._flush_spill()
+
+    async def _flush_spill(self) -> None:
+        events, self._pending_spill = self._pending_spill, []
+        if not events:
+            return
+        expires_at = datetime.now(timezone.utc) + timedelta(
+            seconds=settings.sse_stream_retention_seconds
+        )
+        try:
+            await firestore.save_stream_events(self.owner_id, self.stream_id, events, expires_at)
+            self._spilled_up_to = max(self._spilled_up_to, events[-1]["id"])
+        except Exception as e:
+            logger.warning(f"Failed to spill stream events: {self.stream_id}: {e}")
+
+    async def subscribe(
+        self, last_event_id: Optional[int] = None
+    ) -> AsyncGenerator[ServerSentEvent, None]:
+        """last_event_id より後のイベントを配信し、完了するまで続きを待つ。"""
+        self._subscribers += 1
+        self._cancel_idle_timer()
+        cursor = last_event_id or 0
+        try:
+            while True:
+                # バッファ内のidは連番なので、cursor の次の位置から読む
+                while cursor < self._last_id:
+                    if cursor + 1 < self._first_buffered_id:
+                        # 初回のリプレイ、または配信が遅れて次のイベントがバッファから溢れた
+                        missed, cursor = await self._fill_gap(cursor)
+                        for sse in missed:
+                            yield sse
+                        continue
+                    event_id, event, data = self._entry(cursor + 1)
+                    if event == TEXT_DELTA:
+                        sse, cursor = await self._coalesce_deltas(event_id, data)
+                        yield sse
+                        continue
+                    yield ServerSentEvent(id=str(event_id), event=event, data=data)
+                    cursor = event_id
+                if self.done and cursor >= self._last_id:
+                    return
+                if not await self._wait_for_event(cursor, settings.sse_heartbeat_seconds):
+                    yield ping_event()
+        finally:
+            self._subscribers -= 1
+            if self._subscribers == 0 and not self.done:
+                self._start_idle_timer()
+
+    def _entry(self, event_id: int) -> tuple[int, Optional[str], str]:
+        """バッファ内のイベント（溢れていないことを呼び出し側で確かめること）。"""
+        return self._events[event_id - self._first_buffered_id]
+
+    async def _fill_gap(self, cursor: int) -> tuple[list[ServerSentEvent], int]:
+        """バッファから溢れた cursor 以降の範囲を退避先から補う。
+
+        補えなかった範囲は replay_gap で知らせる。送るイベントと進めた cursor を返す。
+        """
+        first_buffered = self._first_buffered_id
+        missed = []
+        if self._spill_enabled():
+            # 退避の書き込みが済んでいない範囲は取れず、下の replay_gap になる
+            missed = await firestore.list_stream_events(
+                self.owner_id, self.stream_id, cursor, first_buffered
+            )
+        events = []
+        for event in missed:
+            events.append(
+                ServerSentEvent(id=str(event["id"]), event=event["event"], data=event["data"])
+            )
+            cursor = event["id"]
+        # 退避先を読む間にもバッファは進むため、最新の先頭で判定する
+        first_buffered = self._first_buffered_id
+        if cursor + 1 < first_buffered:
+            logger.warning(f"Replay gap in stream {self.stream_id} after id {cursor}")
+            gap = {"missed_from": cursor + 1, "missed_to": first_buffered - 1}
+            events.append(ServerSentEvent(data=json.dumps(gap), event="replay_gap"))
+            cursor = first_buffered - 1
+        return events, cursor
+
+    async def _wait_for_event(self, cursor: int, timeout: float) -> bool:
+        """cursor より後のイベントか完了を待つ。タイムアウトした場合はFalse。"""
+        try:
+            async with asyncio.timeout(timeout):
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self._last_id > cursor or self.done)
+        except TimeoutError:
+            return False
+        return True
+
+    async def _coalesce_deltas(self, first_id: int, first_text: str) -> tuple[ServerSentEvent, int]:
+        """連続するテキスト差分を時間窓・文字数の範囲で1フレームにまとめる。
+
+        まとめたフレームと、含めた最後の差分の id を返す。
+        """
+        parts = [first_text]
+        size = len(first_text)
+        cursor = first_id
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.sse_delta_coalesce_seconds
+        while size < settings.sse_delta_coalesce_max_chars:
+            if cursor < self._last_id:
+                if cursor + 1 < self._first_buffered_id:
+                    # 待つ間に次の差分が溢れた。ここまでを送り、欠けた範囲は呼び出し側で扱う
+                    break
+                event_id, event, data = self._entry(cursor + 1)
+                if event != TEXT_DELTA:
+                    break
+                parts.append(data)
+                size += len(data)
+                cursor = event_id
+                continue
+            remaining = deadline - loop.time()
+            if self.done or remaining <= 0 or not await self._wait_for_event(cursor, remaining):
+                break
+        get_frame_metrics().record_coalesced(len(parts))
+        sse = ServerSentEvent(id=str(cursor), event=TEXT_DELTA, data=encode_delta("".join(parts)))
+        return sse, cursor
+
+    def start(self, source: AsyncIterator[ServerSentEvent | TextDelta]) -> None:
+        """生成を接続から独立したタスクとして開始する。"""
+        self._started_at = time.perf_counter()
+        metrics.SSE_STREAMS_ACTIVE.inc(self.kind)
+        self._task = asyncio.create_task(self._produce(source))
+        self._task.add_done_callback(self._record_finished)
+        # 最初の接続が購読を始めないまま切れた場合もキャンセルされるようにする
+        self._start_idle_timer()
+
+    def _record_finished(self, _task: asyncio.Task) -> None:
+        metrics.SSE_STREAMS_ACTIVE.dec(self.kind)
+        metrics.SSE_STREAM_DURATION.observe(time.perf_counter() - self._started_at, self.kind)
+
+    def add_done_callback(self, callback) -> None:
+        if self._task is not None:
+            self._task.add_done_callback(lambda _: callback())
+
+    def _start_idle_timer(self) -> None:
+        self._cancel_idle_timer()
+        loop = asyncio.get_running_loop()
+        self._idle_handle = loop.call_later(settings.sse_detach_grace_seconds, self._on_idle)
+
+    def _cancel_idle_timer(self) -> None:
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    def _on_idle(self) -> None:
+        self._idle_handle = None
+        if self._subscribers == 0 and self._task is not None and not self._task.done():
+            logger.info(f"No subscribers left, cancelling stream: {self.stream_id}")
+            self._task.cancel()
+
+
+class StreamHub:
+    """プロセス内のストリーム一覧。"""
+
+    def __init__(self):
+        self._streams: dict[str, ReplayStream] = {}
+
+    def start(
+        self,
+        stream_id: str,
+        owner_id: str,
+        scope: str,
+        source: AsyncIterator[ServerSentEvent | TextDelta],
+        kind: str = "stream",
+    ) -> ReplayStream:
+        """生成を接続から独立したタスクとして開始する。
+
+        Args:
+            kind: メトリクス用の生成種別（"reading_chat" など）。
+        """
+        stream = ReplayStream(
+            stream_id, owner_id, scope, settings.sse_replay_buffer_size, kind=kind
+        )
+        self._streams[stream_id] = stream
+        stream.start(source)
+        stream.add_done_callback(lambda: self._schedule_removal(stream_id))
+        return stream
+
+    def get(self, stream_id: str, owner_id: str, scope: str) -> Optional[ReplayStream]:
+        """所有者とスコープが一致するストリームを返す。"""
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.owner_id != owner_id or stream.scope != scope:
+            return None
+        return stream
+
+    def _schedule_removal(self, stream_id: str) -> None:
+        loop = asyncio.get_running_loop()
+        loop.call_later(settings.sse_stream_retention_seconds, self._streams.pop, stream_id, None)
+
+
+async def replay_from_spill(
+    owner_id: str, stream_id: str, last_event_id: Optional[int]
+) -> Optional[AsyncGenerator[ServerSentEvent, None]]:
+    """別インスタンスで生成されたストリームを退避先からリプレイする。無ければNone。"""
+    if not settings.sse_replay_spill_to_firestore:
+        return None
+    events = await firestore.list_stream_events(owner_id, stream_id, last_event_id or 0)
+    if not events and not last_event_id:
+        return None
+
+    async def replay() -> AsyncGenerator[ServerSentEvent, None]:
+        for event in events:
+            yield ServerSentEvent(id=str(event["id"]), event=event["event"], data=event["data"])
+
+    return replay()
+
+
+async def open_stream(
+    stream_id: str, owner_id: str, scope: str, last_event_id: Optional[int]
+) -> Optional[AsyncGenerator[ServerSentEvent, None]]:
+    """再接続用のイベント列を返す。
+
+    このインスタンスで生成中・保持中であればバッファから（続きも含めて）配信し、
+    無ければ Firestore の退避分をリプレイする。どちらにも無ければNone。
+    """
+    stream = get_stream_hub().get(stream_id, owner_id, scope)
+    if stream is not None:
+        return stream.subscribe(last_event_id)
+    return await replay_from_spill(owner_id, stream_id, last_event_id)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Last-Event-ID ヘッダーを整数に変換する（不正な値は先頭から）。"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+_stream_hub: Optional[StreamHub] = None
+
+
+def get_stream_hub() -> StreamHub:
+    """ストリームハブのシングルトンを取得する。"""
+    global _stream_hub
+    if _stream_hub is None:
+        _stream_hub = StreamHub()
+    return _stream_hub
@@ -0,0 +1,117 @@
+"""ADKイベントからSSEイベントへの変換（対話・セッション初期化・レポートで共通）。
+
+- 1イベントのパートは1回の走査で処理する（ツール呼び出し・ツール結果・テキスト）
+- テキスト差分は増分で追跡する
+  - 部分イベント（ストリーミングモードの partial）はパートのテキストがそのまま差分
+  - それ以外は直前のテキストの続きであれば増えた分だけを差分とし、
+    続きでなければ新しい応答として全体を送る（最終的な応答テキストも置き換わる）
+- ツール結果に id がない場合は、ツール名ごとの未完了呼び出しから対応づける
+- SSEのデータは sse_emitter.encode_json で1回だけエンコードする
+"""
+
+import time
+from collections import deque
+from collections.abc import Iterator
+from typing import Any, Optional
+
+from google.adk.events import Event
+from sse_starlette import ServerSentEvent
+
+from knowva.services.sse_emitter import TextDelta, encode_json
+
+PRESENT_OPTIONS_TOOL = "present_options"
+
+
+def sse_event(event: str, payload: Any) -> ServerSentEvent:
+    """ペイロードをエンコードしてSSEイベントを作る。"""
+    return ServerSentEvent(data=encode_json(payload), event=event)
+
+
+def error_event(code: str, message: str) -> ServerSentEvent:
+    return sse_event("error", {"code": code, "message": message})
+
+
+class StreamTranslator:
+    """1回の実行分のADKイベントを順にSSEイベントへ変換する。"""
+
+    def __init__(self):
+        # 現在の応答テキスト（部分イベントの断片を連結前のまま保持する）
+        self._segments: list[str] = []
+        self._text_cache: Optional[str] = ""
+        self._text_length = 0
+        # ツール名 -> 未完了の tool_call_id（呼び出し順）
+        self._pending_tool_calls: dict[str, deque[str]] = {}
+        # present_options で提示した選択肢（メッセージに永続化するため）
+        self.options: Optional[dict] = None
+
+    @property
+    def text(self) -> str:
+        """これまでに受信した応答テキスト。"""
+        if self._text_cache is None:
+            self._text_cache = "".join(self._segments)
+            self._segments = [self._text_cache]
+        return self._text_cache
+
+    def translate(self, event: Event) -> Iterator[ServerSentEvent | TextDelta]:
+        """1つのADKイベントを対応するSSEイベントに変換する。"""
+        if not event.content or not event.content.parts:
+            return
+        partial = bool(event.partial)
+        for part in event.content.parts:
+            if part.function_call:
+                yield self._tool_call_start(part.function_call)
+            if part.function_response:
+                yield from self._tool_call_done(part.function_response)
+            if part.text:
+                delta = self._append_partial(part.text) if partial else self._replace(part.text)
+                if delta:
+                    yield TextDelta(delta)
+
+    def _append_partial(self, chunk: str) -> str:
+        self._segments.append(chunk)
+        self._text_length += len(chunk)
+        self._text_cache = None
+        return chunk
+
+    def _replace(self, new_text: str) -> str:
+        if len(new_text) == self._text_length and new_text == self.text:
+            # 部分イベントの後に届く集約済みの最終イベント
+            return ""
+        if len(new_text) > self._text_length and new_text.startswith(self.text):
+            delta = new_text[self._text_length :]
+        else:
+            delta = new_text
+        self._segments = [new_text]
+        self._text_cache = new_text
+        self._text_length = len(new_text)
+        return delta
+
+    def _tool_call_start(self, function_call) -> ServerSentEvent:
+        tool_name = function_call.name or "unknown"
+        tool_id = function_call.id or f"tc_{int(time.time() * 1000)}"
+        self._pending_tool_calls.setdefault(tool_name, deque()).append(tool_id)
+        return sse_event("tool_call_start", {"tool_name": tool_name, "tool_call_id": tool_id})
+
+    def _tool_call_done(self, function_response) -> Iterator[ServerSentEvent]:
+        tool_name = function_response.name
+        result = function_response.response or {}
+        pending = self._pending_tool_calls.get(tool_name)
+        tool_id = function_response.id
+        if tool_id:
+            if pending and tool_id in pending:
+                pending.remove(tool_id)
+        elif pending:
+            # id がない場合は同名ツールの最も古い未完了呼び出しに対応づける
+            tool_id = pending.popleft()
+
+        if tool_name == PRESENT_OPTIONS_TOOL and result.get("status") == "options_presented":
+            self.options = {
+                "prompt": result.get("prompt", ""),
+                "options": result.get("options", []),
+                "allow_multiple": result.get("allow_multiple", True),
+                "allow_freeform": result.get("allow_freeform", True),
+            }
+            yield sse_event("options_request", self.options)
+
+        if tool_id:
+            yield sse_event("tool_call_done", {"tool_call_id": tool_id, "result": result})
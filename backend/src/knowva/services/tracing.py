@@ -0,0 +1,247 @@
+"""エージェントの1ターンを分解するトレーシング（OpenTelemetry）。
+
+ADK は Runner の実行ごとに次のスパンを作る（トレーサーが設定されていれば記録される）:
+- invocation:               runner.run_async の1ターン
+- agent_run [<エージェント>]: エージェント・サブエージェント（AgentTool の book_guide_agent など）
+- call_llm:                 モデル呼び出し
+- execute_tool <ツール>:     agents/*/tools.py のツール呼び出し
+
+ここではそれに加えて、セッションの取得・イベント追加（session.get / session.append_event）と
+直接の生成（llm.generate_text）のスパンを作り、TracingPlugin でツールのスパンに
+Firestoreの操作数（firestore.reads / firestore.writes など）を付ける。
+
+settings.tracing_exporter で出力先を選ぶ:
+- "":       無効（既定。スパンは作られず、記録のコストもない）
+- "memory": プロセス内に保持する（テスト・ローカル調査用。get_memory_exporter() で取り出す）
+- "otlp":   OTLP/HTTP で settings.tracing_otlp_endpoint（ローカルのコレクターなど）へ送る
+
+サンプリングは settings.tracing_sample_ratio（ターン単位。親のサンプリング結果に従う）。
+
+OpenTelemetry のグローバルなプロバイダーは一度しか設定できず、ADK のトレーサーも
+最初に得たものを使い続けるため、プロバイダーは1つだけ登録し、サンプラーと
+スパンプロセッサーを差し替えて設定・解除する（reset_tracing() はテスト用）。
+"""
+
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any, Optional
+
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.plugins import BasePlugin
+from google.adk.tools import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace import Span as SdkSpan
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import ALWAYS_OFF, ParentBased, Sampler, TraceIdRatioBased
+from opentelemetry.trace import Span
+
+from knowva.config import settings
+from knowva.services import firestore_ops
+
+logger = logging.getLogger(__name__)
+
+EXPORTER_MEMORY = "memory"
+EXPORTER_OTLP = "otlp"
+
+tracer = trace.get_tracer("knowva")
+
+
+class _SwitchableSampler(Sampler):
+    """設定に応じて差し替えるサンプラー（未設定の間は何も記録しない）。"""
+
+    def __init__(self):
+        self.delegate: Sampler = ALWAYS_OFF
+
+    def should_sample(self, *args, **kwargs):
+        return self.delegate.should_sample(*args, **kwargs)
+
+    def get_description(self) -> str:
+        return f"Switchable{{{self.delegate.get_description()}}}"
+
+
+class _SwitchableSpanProcessor(SpanProcessor):
+    """設定に応じて差し替えるスパンプロセッサー。"""
+
+    def __init__(self):
+        self.delegate: Optional[SpanProcessor] = None
+
+    def on_start(self, span: SdkSpan, parent_context: Optional[Context] = None) -> None:
+        if self.delegate is not None:
+            self.delegate.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if self.delegate is not None:
+            self.delegate.on_end(span)
+
+    def shutdown(self) -> None:
+        if self.delegate is not None:
+            self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if self.delegate is None:
+            return True
+        return self.delegate.force_flush(timeout_millis)
+
+
+_sampler = _SwitchableSampler()
+_processor = _SwitchableSpanProcessor()
+_provider: Optional[TracerProvider] = None
+_memory_exporter: Optional[InMemorySpanExporter] = None
+
+
+def _install_provider() -> None:
+    global _provider
+    if _provider is not None:
+        return
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": "knowva-backend"}), sampler=_sampler
+    )
+    _provider.add_span_processor(_processor)
+    # ADK のトレーサーもグローバルのプロバイダーを使う
+    trace.set_tracer_provider(_provider)
+
+
+def setup_tracing(
+    exporter: Optional[str] = None,
+    sample_ratio: Optional[float] = None,
+    otlp_endpoint: Optional[str] = None,
+) -> None:
+    """トレーシングを有効にする（引数を省略すると settings の値）。設定済みなら何もしない。"""
+    global _memory_exporter
+    exporter = settings.tracing_exporter if exporter is None else exporter
+    if not exporter or _processor.delegate is not None:
+        return
+    ratio = settings.tracing_sample_ratio if sample_ratio is None else sample_ratio
+
+    if exporter == EXPORTER_MEMORY:
+        _memory_exporter = InMemorySpanExporter()
+        processor: SpanProcessor = SimpleSpanProcessor(_memory_exporter)
+    elif exporter == EXPORTER_OTLP:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        endpoint = otlp_endpoint or settings.tracing_otlp_endpoint
+        processor = BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint))
+    else:
+        raise ValueError(f"Unknown tracing exporter: {exporter}")
+
+    _install_provider()
+    _processor.delegate = processor
+    _sampler.delegate = ParentBased(TraceIdRatioBased(ratio))
+    logger.info(f"Tracing enabled: exporter={exporter}, sample_ratio={ratio}")
+
+
+def shutdown_tracing() -> None:
+    """送信待ちのスパンを送り切って終了する。"""
+    _processor.shutdown()
+
+
+def reset_tracing() -> None:
+    """トレーシングを無効に戻す（テスト用）。以降のスパンは記録されない。"""
+    global _memory_exporter
+    _sampler.delegate = ALWAYS_OFF
+    processor, _processor.delegate = _processor.delegate, None
+    if processor is not None:
+        processor.shutdown()
+    _memory_exporter = None
+
+
+def get_memory_exporter() -> Optional[InMemorySpanExporter]:
+    """exporter="memory" で有効にした場合のエクスポーター。"""
+    return _memory_exporter
+
+
+def current_span() -> Span:
+    """現在のスパン（記録していなければ何もしないスパン）。"""
+    return trace.get_current_span()
+
+
+def _firestore_snapshot(current: Span) -> Optional[dict[str, int]]:
+    ops = firestore_ops.current()
+    if ops is None or not current.is_recording():
+        return None
+    return ops.as_dict()
+
+
+def _set_firestore_attributes(current: Span, before: Optional[dict[str, int]]) -> None:
+    ops = firestore_ops.current()
+    if before is None or ops is None:
+        return
+    for name, value in ops.as_dict().items():
+        if value != before[name]:
+            current.set_attribute(f"firestore.{name}", value - before[name])
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """スパンを開始し、ブロック内のFirestore操作数を属性に付ける。"""
+    with tracer.start_as_current_span(name, attributes=attributes) as current:
+        before = _firestore_snapshot(current)
+        try:
+            yield current
+        finally:
+            _set_firestore_attributes(current, before)
+
+
+class TracingPlugin(BasePlugin):
+    """ADKが作るスパンにアプリ側の属性を付ける。
+
+    ツールのコールバックは execute_tool スパンの中で呼ばれるため、
+    前後のFirestore操作数の差をそのスパンに付けられる。
+    """
+
+    _MAX_PENDING = 1024
+
+    def __init__(self):
+        super().__init__(name="knowva_tracing")
+        # function_call_id → ツール開始時のFirestore操作数
+        self._before: dict[str, dict[str, int]] = {}
+
+    async def before_run_callback(self, *, invocation_context: InvocationContext) -> None:
+        current = current_span()
+        if current.is_recording():
+            current.set_attribute("knowva.app_name", invocation_context.app_name)
+            current.set_attribute("knowva.agent", invocation_context.agent.name)
+            current.set_attribute("knowva.session_id", invocation_context.session.id)
+        return None
+
+    async def before_tool_callback(
+        self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext
+    ) -> Optional[dict]:
+        before = _firestore_snapshot(current_span())
+        if before is not None and tool_context.function_call_id:
+            if len(self._before) >= self._MAX_PENDING:
+                del self._before[next(iter(self._before))]
+            self._before[tool_context.function_call_id] = before
+        return None
+
+    async def after_tool_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        result: dict,
+    ) -> Optional[dict]:
+        self._finish_tool(tool_context)
+        return None
+
+    async def on_tool_error_callback(
+        self,
+        *,
+        tool: BaseTool,
+        tool_args: dict[str, Any],
+        tool_context: ToolContext,
+        error: Exception,
+    ) -> Optional[dict]:
+        self._finish_tool(tool_context)
+        return None
+
+    def _finish_tool(self, tool_context: ToolContext) -> None:
+        before = self._before.pop(tool_context.function_call_id or "", None)
+        _set_firestore_attributes(current_span(), before)
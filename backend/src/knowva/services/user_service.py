@@ -0,0 +1,123 @@
+"""ユーザードキュメント（users/{uid}）のローダー。
+
+プロフィール・設定・ニックネーム・オンボーディング状態はすべて同じ
+users/{uid} ドキュメントに格納されている。1回の読み取りで得たスナップショットから
+各ビューを返し、短いTTLのインスタンス内キャッシュで同一ドキュメントの
+重複読み取りを避ける。書き込み側は invalidate() を呼ぶこと。
+
+キャッシュは他インスタンスでの更新を最大TTL秒まで反映しないため、既存の値と
+マージして書き込む処理は load_user_document() で最新のドキュメントを読むこと。
+返す dict はコピーなので、呼び出し側で変更してもキャッシュには影響しない。
+"""
+
+import asyncio
+import copy
+from typing import Optional
+
+from google.cloud.firestore import AsyncClient
+
+from knowva.dependencies import get_firestore_client
+from knowva.services.cache import TTLCache
+
+# 設定のデフォルト値
+DEFAULT_SETTINGS = {
+    "interaction_mode": "guided",
+    "timeline_order": "random",
+    "fab_position": "left",
+    "chat_initiator": "ai",
+}
+
+# 他インスタンスでの更新はこの秒数で反映される
+USER_CACHE_TTL_SECONDS = 30
+
+_user_cache = TTLCache(ttl_seconds=USER_CACHE_TTL_SECONDS, max_entries=4096, name="user")
+# 同時に来た同一ユーザーの読み込みを1回にまとめる
+_inflight: dict[str, asyncio.Task] = {}
+
+
+class UserDocument:
+    """users/{uid} のスナップショットと型付きアクセサ。"""
+
+    def __init__(self, user_id: str, data: Optional[dict]):
+        self.user_id = user_id
+        self.exists = data is not None
+        self._data = data or {}
+
+    def to_dict(self) -> dict:
+        return copy.deepcopy(self._data)
+
+    @property
+    def name(self) -> Optional[str]:
+        return self._data.get("name")
+
+    @property
+    def email(self) -> Optional[str]:
+        return self._data.get("email")
+
+    @property
+    def current_profile(self) -> Optional[dict]:
+        """current_profile。ドキュメントが無い場合はNone。"""
+        if not self.exists:
+            return None
+        return copy.deepcopy(self._data.get("current_profile", {}))
+
+    @property
+    def activity(self) -> dict:
+        """活動カウンター（{kind}_count / {kind}_updated_at）。"""
+        return copy.deepcopy(self._data.get("activity", {}))
+
+    @property
+    def raw_settings(self) -> dict:
+        """保存されている settings（デフォルト補完なし）。"""
+        return copy.deepcopy(self._data.get("settings", {}))
+
+    @property
+    def settings(self) -> dict:
+        """デフォルト値を補完したユーザー設定。"""
+        stored = self._data.get("settings", {})
+        return {key: stored.get(key, default) for key, default in DEFAULT_SETTINGS.items()}
+
+    @property
+    def onboarding_status(self) -> dict:
+        return {
+            "completed": self._data.get("onboarding_completed", False),
+            "completed_at": self._data.get("onboarding_completed_at"),
+        }
+
+
+async def load_user_document(user_id: str) -> UserDocument:
+    """ユーザードキュメントをキャッシュを通さずに読む（書き込み前のマージ用）。"""
+    db: AsyncClient = get_firestore_client()
+    doc = await db.collection("users").document(user_id).get()
+    return UserDocument(user_id, doc.to_dict() if doc.exists else None)
+
+
+def _on_loaded(user_id: str, task: asyncio.Task) -> None:
+    failed = task.cancelled() or task.exception() is not None
+    # 読み込み中に invalidate された場合は古い可能性があるのでキャッシュしない
+    if _inflight.get(user_id) is not task:
+        return
+    del _inflight[user_id]
+    if not failed:
+        _user_cache.set(user_id, task.result())
+
+
+async def get_user_document(user_id: str) -> UserDocument:
+    """ユーザードキュメントを取得する（キャッシュ優先）。"""
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    task = _inflight.get(user_id)
+    if task is None:
+        task = asyncio.create_task(load_user_document(user_id))
+        _inflight[user_id] = task
+        task.add_done_callback(lambda t: _on_loaded(user_id, t))
+    # 呼び出し元がキャンセルされても、同じ読み込みを待つ他のリクエストには影響させない
+    return await asyncio.shield(task)
+
+
+def invalidate(user_id: str) -> None:
+    """ユーザードキュメントのキャッシュを無効化する。"""
+    _user_cache.invalidate(user_id)
+    _inflight.pop(user_id, None)
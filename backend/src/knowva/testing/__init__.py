@@ -0,0 +1 @@
+"""テスト・ベンチマーク用の部品（本番コードからは使わない）。"""
@@ -0,0 +1,43 @@
+"""Firestore操作の予算をテストで確かめるヘルパー。
+
+- enforce_budgets(): エンドポイントに宣言した予算（firestore_ops.budget）の超過で
+  リクエストを失敗させる
+- assert_firestore_budget(): ブロック内の操作数が上限を超えたら失敗させる
+
+使い方:
+    with fake_firestore(), assert_firestore_budget(queries=2):
+        await firestore.list_all_insights(user_id)
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Optional
+
+from knowva.config import settings
+from knowva.services.firestore_ops import Budget, FirestoreBudgetExceededError, FirestoreOps, track
+
+
+@contextmanager
+def enforce_budgets() -> Iterator[None]:
+    previous = settings.firestore_budget_enforce
+    settings.firestore_budget_enforce = True
+    try:
+        yield
+    finally:
+        settings.firestore_budget_enforce = previous
+
+
+@contextmanager
+def assert_firestore_budget(
+    *,
+    reads: Optional[int] = None,
+    writes: Optional[int] = None,
+    queries: Optional[int] = None,
+    aggregations: Optional[int] = None,
+) -> Iterator[FirestoreOps]:
+    declared = Budget(reads=reads, writes=writes, queries=queries, aggregations=aggregations)
+    with track() as ops:
+        yield ops
+    violations = declared.violations(ops)
+    if violations:
+        raise FirestoreBudgetExceededError("Firestore budget exceeded: " + ", ".join(violations))
@@ -0,0 +1,615 @@
+"""プロセス内で動く非同期Firestoreのフェイク（テスト・ベンチマーク用）。
+
+services/firestore.py・session_service.py・badge_service.py などが使う
+google.cloud.firestore.AsyncClient のサブセットを実装する:
+
+- コレクション・ドキュメントのパス、サブコレクション、collection_group
+- where（FieldFilter / 位置引数）・order_by・limit・offset・start_after・select・stream
+- get / set（merge）/ update（ドット区切りのフィールドパス）/ create / delete
+- get_all・WriteBatch・トランザクション（async_transactional から使える。
+  読み取ったドキュメントがコミット前に更新されていれば Aborted で再試行させる）
+- count() 集計
+- Increment・ArrayUnion・ArrayRemove・SERVER_TIMESTAMP・DELETE_FIELD
+
+読み取り（返したドキュメント数。0件のクエリも1件）・書き込み・削除・ラウンドトリップ数を
+stats に数え（リクエストごとの firestore_ops にも同じ基準で記録する）、latency を
+指定すると各RPCの前に待つ。データ層の変更による読み取り回数・往復回数・処理時間の
+変化を、エミュレーターなしで測れる。
+
+使い方:
+    with fake_firestore(latency=0.005) as db:
+        await firestore.save_message(...)
+        print(db.stats)
+"""
+
+import asyncio
+import copy
+import uuid
+from collections.abc import AsyncGenerator, Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from google.api_core.exceptions import Aborted, AlreadyExists, NotFound
+from google.cloud.firestore_v1.transforms import (
+    DELETE_FIELD,
+    SERVER_TIMESTAMP,
+    ArrayRemove,
+    ArrayUnion,
+    Increment,
+)
+
+from knowva import dependencies
+from knowva.services import firestore_ops
+
+_MISSING = object()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _get_field(data: dict, field_path: str) -> Any:
+    value: Any = data
+    for key in field_path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def _apply_value(current: Any, value: Any) -> Any:
+    if isinstance(value, Increment):
+        base = current if isinstance(current, (int, float)) else 0
+        return base + value.value
+    if isinstance(value, ArrayUnion):
+        items = list(current) if isinstance(current, list) else []
+        return items + [v for v in value.values if v not in items]
+    if isinstance(value, ArrayRemove):
+        items = list(current) if isinstance(current, list) else []
+        return [v for v in items if v not in value.values]
+    if value is SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, dict):
+        return {k: _apply_value(_MISSING, v) for k, v in value.items() if v is not DELETE_FIELD}
+    return copy.deepcopy(value)
+
+
+def _set_field(data: dict, field_path: str, value: Any) -> None:
+    keys = field_path.split(".")
+    target = data
+    for key in keys[:-1]:
+        if not isinstance(target.get(key), dict):
+            target[key] = {}
+        target = target[key]
+    if value is DELETE_FIELD:
+        target.pop(keys[-1], None)
+    else:
+        target[keys[-1]] = _apply_value(target.get(keys[-1], _MISSING), value)
+
+
+def _merge(data: dict, updates: dict) -> None:
+    """set(merge=True) の深いマージ。"""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            _merge(data[key], value)
+        elif value is DELETE_FIELD:
+            data.pop(key, None)
+        else:
+            data[key] = _apply_value(data.get(key, _MISSING), value)
+
+
+def _compare(op: str, value: Any, target: Any) -> bool:
+    if value is _MISSING:
+        return False
+    try:
+        if op == "==":
+            return value == target
+        if op == "!=":
+            return value != target and value is not None
+        if op == "<":
+            return value < target
+        if op == "<=":
+            return value <= target
+        if op == ">":
+            return value > target
+        if op == ">=":
+            return value >= target
+        if op == "in":
+            return value in target
+        if op == "not-in":
+            return value not in target and value is not None
+        if op == "array-contains":
+            return isinstance(value, list) and target in value
+        if op == "array-contains-any":
+            return isinstance(value, list) and any(t in value for t in target)
+    except TypeError:
+        # Firestore は型の異なる値を比較しない
+        return False
+    raise ValueError(f"Unsupported operator: {op}")
+
+
+class _Stats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.round_trips = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "deletes": self.deletes,
+            "round_trips": self.round_trips,
+        }
+
+    def __repr__(self) -> str:
+        return f"FirestoreStats({self.as_dict()})"
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: "FakeDocumentReference", data: Optional[dict]):
+        self.reference = reference
+        self._data = data
+        self.exists = data is not None
+
+    @property
+    def id(self) -> str:
+        return self.reference.id
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class FakeAggregationResult:
+    def __init__(self, alias: str, value: Any):
+        self.alias = alias
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query: "FakeQuery", alias: str):
+        self._query = query
+        self._alias = alias
+
+    async def get(self, transaction=None) -> list[list[FakeAggregationResult]]:
+        client = self._query._client
+        await client._rpc()
+        # 集計は1000件ごとに1読み取りとして課金される
+        count = len(self._query._matching())
+        reads = max(1, (count + 999) // 1000)
+        client.stats.reads += reads
+        firestore_ops.record(aggregations=1, reads=reads)
+        return [[FakeAggregationResult(self._alias, count)]]
+
+
+class FakeQuery:
+    def __init__(
+        self,
+        client: "FakeAsyncClient",
+        parent_path: Optional[str] = None,
+        group_id: Optional[str] = None,
+    ):
+        self._client = client
+        self._parent_path = parent_path
+        self._group_id = group_id
+        self._filters: list[tuple[str, str, Any]] = []
+        self._orders: list[tuple[str, str]] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._start_after: Optional[Any] = None
+        self._projection: Optional[list[str]] = None
+
+    def _copy(self) -> "FakeQuery":
+        query = copy.copy(self)
+        query._filters = list(self._filters)
+        query._orders = list(self._orders)
+        return query
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None) -> "FakeQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        query = self._copy()
+        query._filters.append((field_path, op_string, value))
+        return query
+
+    def order_by(self, field_path: str, direction: str = "ASCENDING") -> "FakeQuery":
+        query = self._copy()
+        query._orders.append((field_path, direction))
+        return query
+
+    def limit(self, count: int) -> "FakeQuery":
+        query = self._copy()
+        query._limit = count
+        return query
+
+    def offset(self, num_to_skip: int) -> "FakeQuery":
+        query = self._copy()
+        query._offset = num_to_skip
+        return query
+
+    def start_after(self, document_fields_or_snapshot) -> "FakeQuery":
+        query = self._copy()
+        query._start_after = document_fields_or_snapshot
+        return query
+
+    def select(self, field_paths) -> "FakeQuery":
+        query = self._copy()
+        query._projection = list(field_paths)
+        return query
+
+    def count(self, alias: Optional[str] = None) -> FakeAggregationQuery:
+        return FakeAggregationQuery(self, alias or "field_1")
+
+    def _candidates(self) -> Iterator[tuple[str, dict]]:
+        collections = self._client._collections
+        if self._group_id is None:
+            yield from collections.get(self._parent_path, {}).items()
+            return
+        for collection_path, docs in collections.items():
+            if collection_path.rpartition("/")[2] == self._group_id:
+                yield from docs.items()
+
+    def _sort_key(self, path: str, data: dict) -> tuple:
+        key = []
+        for field_path, direction in self._orders:
+            value = _get_field(data, field_path)
+            key.append(_Ordered(value, direction))
+        key.append(_Ordered(path, "ASCENDING"))
+        return tuple(key)
+
+    def _matching(self) -> list[tuple[str, dict]]:
+        docs = [
+            (path, data)
+            for path, data in self._candidates()
+            if all(_compare(op, _get_field(data, f), v) for f, op, v in self._filters)
+            # order_by したフィールドを持たないドキュメントは結果に含まれない
+            and all(_get_field(data, f) is not _MISSING for f, _ in self._orders)
+        ]
+        docs.sort(key=lambda item: self._sort_key(*item))
+
+        if self._start_after is not None:
+            cursor = self._cursor_key()
+            docs = [(p, d) for p, d in docs if self._sort_key(p, d)[: len(cursor)] > cursor]
+        docs = docs[self._offset :]
+        if self._limit is not None:
+            docs = docs[: self._limit]
+        return docs
+
+    def _cursor_key(self) -> tuple:
+        cursor = self._start_after
+        if isinstance(cursor, FakeDocumentSnapshot):
+            return self._sort_key(cursor.reference.path, cursor._data or {})
+        return tuple(_Ordered(cursor[f], direction) for f, direction in self._orders)
+
+    def _project(self, data: dict) -> dict:
+        if self._projection is None:
+            return copy.deepcopy(data)
+        projected: dict = {}
+        for field_path in self._projection:
+            value = _get_field(data, field_path)
+            if value is not _MISSING:
+                _set_field(projected, field_path, value)
+        return projected
+
+    async def stream(self, transaction=None) -> AsyncGenerator[FakeDocumentSnapshot, None]:
+        await self._client._rpc()
+        docs = self._matching()
+        self._client.stats.reads += max(1, len(docs))
+        firestore_ops.record(queries=1, reads=max(1, len(docs)))
+        for path, data in docs:
+            yield FakeDocumentSnapshot(self._client.document(path), self._project(data))
+
+    async def get(self, transaction=None) -> list[FakeDocumentSnapshot]:
+        return [doc async for doc in self.stream(transaction=transaction)]
+
+
+class _Ordered:
+    """order_by の方向を考慮して比較するラッパー。"""
+
+    __slots__ = ("value", "descending")
+
+    def __init__(self, value: Any, direction: str):
+        self.value = value
+        self.descending = direction == "DESCENDING"
+
+    def __eq__(self, other: "_Ordered") -> bool:
+        return self.value == other.value
+
+    def __lt__(self, other: "_Ordered") -> bool:
+        if self.value == other.value:
+            return False
+        try:
+            less = self.value < other.value
+        except TypeError:
+            # 型が異なる値は型名で並べる（Firestore の型順の近似）
+            less = type(self.value).__name__ < type(other.value).__name__
+        return not less if self.descending else less
+
+    def __gt__(self, other: "_Ordered") -> bool:
+        return other < self
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: "FakeAsyncClient", path: str):
+        super().__init__(client, parent_path=path)
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rpartition("/")[2]
+
+    @property
+    def parent(self) -> Optional["FakeDocumentReference"]:
+        parent = self.path.rpartition("/")[0]
+        return self._client.document(parent) if parent else None
+
+    def document(self, document_id: Optional[str] = None) -> "FakeDocumentReference":
+        return self._client.document(f"{self.path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    async def add(self, document_data: dict) -> tuple[datetime, "FakeDocumentReference"]:
+        ref = self.document()
+        await ref.create(document_data)
+        return _now(), ref
+
+
+class FakeDocumentReference:
+    def __init__(self, client: "FakeAsyncClient", path: str):
+        self._client = client
+        self.path = path
+
+    @property
+    def id(self) -> str:
+        return self.path.rpartition("/")[2]
+
+    @property
+    def parent(self) -> FakeCollectionReference:
+        return FakeCollectionReference(self._client, self.path.rpartition("/")[0])
+
+    def collection(self, collection_id: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self._client, f"{self.path}/{collection_id}")
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+    async def get(self, field_paths=None, transaction=None) -> FakeDocumentSnapshot:
+        await self._client._rpc()
+        self._client.stats.reads += 1
+        firestore_ops.record(lookups=1, reads=1)
+        if transaction is not None:
+            transaction._record_read(self.path)
+        data = self._client._docs.get(self.path)
+        return FakeDocumentSnapshot(self, copy.deepcopy(data) if data is not None else None)
+
+    async def set(self, document_data: dict, merge: bool = False) -> None:
+        batch = self._client.batch()
+        batch.set(self, document_data, merge=merge)
+        await batch.commit()
+
+    async def update(self, field_updates: dict) -> None:
+        batch = self._client.batch()
+        batch.update(self, field_updates)
+        await batch.commit()
+
+    async def create(self, document_data: dict) -> None:
+        batch = self._client.batch()
+        batch.create(self, document_data)
+        await batch.commit()
+
+    async def delete(self) -> None:
+        batch = self._client.batch()
+        batch.delete(self)
+        await batch.commit()
+
+
+class FakeWriteBatch:
+    def __init__(self, client: "FakeAsyncClient"):
+        self._client = client
+        self._writes: list[tuple[str, FakeDocumentReference, Any, bool]] = []
+
+    def set(self, reference: FakeDocumentReference, document_data: dict, merge=False):
+        self._writes.append(("set", reference, document_data, bool(merge)))
+        return self
+
+    def update(self, reference: FakeDocumentReference, field_updates: dict):
+        self._writes.append(("update", reference, field_updates, False))
+        return self
+
+    def create(self, reference: FakeDocumentReference, document_data: dict):
+        self._writes.append(("create", reference, document_data, False))
+        return self
+
+    def delete(self, reference: FakeDocumentReference):
+        self._writes.append(("delete", reference, None, False))
+        return self
+
+    async def commit(self) -> list:
+        await self._client._rpc()
+        self._client._apply(self._writes)
+        firestore_ops.record(writes=len(self._writes))
+        results = [_now() for _ in self._writes]
+        self._writes = []
+        return results
+
+
+class FakeTransaction(FakeWriteBatch):
+    """async_transactional から使えるトランザクション。
+
+    読み取ったドキュメントのバージョンを覚えておき、コミット時に他の書き込みで
+    変わっていれば Aborted を送出する（async_transactional が再試行する）。
+    """
+
+    def __init__(self, client: "FakeAsyncClient", max_attempts: int = 5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id: Optional[bytes] = None
+        self._read_versions: dict[str, int] = {}
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self) -> None:
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    async def _begin(self, retry_id=None) -> None:
+        await self._client._rpc()
+        self._id = uuid.uuid4().bytes
+
+    def _record_read(self, path: str) -> None:
+        self._read_versions.setdefault(path, self._client._versions.get(path, 0))
+
+    async def _commit(self) -> list:
+        for path, version in self._read_versions.items():
+            if self._client._versions.get(path, 0) != version:
+                self._clean_up()
+                raise Aborted("Transaction contention on " + path)
+        results = await self.commit()
+        self._clean_up()
+        return results
+
+    async def _rollback(self) -> None:
+        self._clean_up()
+
+
+class FakeAsyncClient:
+    """AsyncClient のフェイク。ドキュメントはパスをキーにした辞書で持つ。"""
+
+    def __init__(self, latency: float = 0.0, project: str = "fake-project"):
+        self.project = project
+        self.latency = latency
+        self.stats = _Stats()
+        self._docs: dict[str, dict] = {}
+        # コレクションのパス → そのコレクション直下のドキュメント（クエリの走査範囲）
+        self._collections: dict[str, dict[str, dict]] = {}
+        self._versions: dict[str, int] = {}
+
+    async def _rpc(self) -> None:
+        self.stats.round_trips += 1
+        firestore_ops.record(round_trips=1)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            # 実際のRPCと同じく他のタスクに制御を渡す
+            await asyncio.sleep(0)
+
+    def collection(self, *path: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, "/".join(path))
+
+    def document(self, *path: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, "/".join(path))
+
+    def collection_group(self, collection_id: str) -> FakeQuery:
+        return FakeQuery(self, group_id=collection_id)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> FakeTransaction:
+        return FakeTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    async def get_all(
+        self, references, field_paths=None, transaction=None
+    ) -> AsyncGenerator[FakeDocumentSnapshot, None]:
+        references = list(references)
+        await self._rpc()
+        self.stats.reads += len(references)
+        firestore_ops.record(lookups=1, reads=len(references))
+        for ref in references:
+            if transaction is not None:
+                transaction._record_read(ref.path)
+            data = self._docs.get(ref.path)
+            yield FakeDocumentSnapshot(ref, copy.deepcopy(data) if data is not None else None)
+
+    def close(self) -> None:
+        pass
+
+    def _apply(self, writes: list) -> None:
+        # 書き込みの前提条件を先に確認し、1件でも満たさなければ何も書き込まない
+        for kind, ref, _, _ in writes:
+            if kind == "create" and ref.path in self._docs:
+                raise AlreadyExists(f"Document already exists: {ref.path}")
+            if kind == "update" and ref.path not in self._docs:
+                raise NotFound(f"No document to update: {ref.path}")
+
+        for kind, ref, data, merge in writes:
+            path = ref.path
+            if kind == "delete":
+                self._remove(path)
+                self.stats.deletes += 1
+            elif kind == "update":
+                for field_path, value in data.items():
+                    _set_field(self._docs[path], field_path, value)
+                self.stats.writes += 1
+            elif kind == "set" and merge:
+                if path not in self._docs:
+                    self._store(path, {})
+                _merge(self._docs[path], data)
+                self.stats.writes += 1
+            else:
+                self._store(path, _apply_value(_MISSING, data))
+                self.stats.writes += 1
+            self._versions[path] = self._versions.get(path, 0) + 1
+
+    def _store(self, path: str, data: dict) -> None:
+        self._docs[path] = data
+        self._collections.setdefault(path.rpartition("/")[0], {})[path] = data
+
+    def _remove(self, path: str) -> None:
+        self._docs.pop(path, None)
+        self._collections.get(path.rpartition("/")[0], {}).pop(path, None)
+
+    # --- テスト用ヘルパー ---
+
+    def load(self, documents: dict[str, dict]) -> None:
+        """パス→内容の辞書で初期データを投入する（統計・レイテンシの対象外）。"""
+        for path, data in documents.items():
+            self._store(path, _apply_value(_MISSING, data))
+
+    def dump(self, path: str) -> Optional[dict]:
+        """ドキュメントの内容を返す（統計には数えない）。"""
+        data = self._docs.get(path)
+        return copy.deepcopy(data) if data is not None else None
+
+    def paths(self, prefix: str = "") -> list[str]:
+        """保存されているドキュメントのパス一覧。"""
+        return sorted(p for p in self._docs if p.startswith(prefix))
+
+
+@contextmanager
+def fake_firestore(latency: float = 0.0) -> Iterator[FakeAsyncClient]:
+    """get_firestore_client() がフェイクを返すようにする。"""
+    client = FakeAsyncClient(latency=latency)
+    previous = dependencies._firestore_client
+    dependencies._firestore_client = client
+    try:
+        yield client
+    finally:
+        dependencies._firestore_client = previous
+
+
+__all__ = [
+    "FakeAsyncClient",
+    "FakeDocumentReference",
+    "FakeDocumentSnapshot",
+    "FakeQuery",
+    "FakeTransaction",
+    "FakeWriteBatch",
+    "fake_firestore",
+]
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1 import async_transactional
+
+from knowva.services import firestore
+from knowva.testing.firestore_fake import fake_firestore
+
+
+@pytest.fixture
+def db():
+    with fake_firestore() as client:
+        yield client
+
+
+async def test_messages_are_saved_in_one_batch_and_listed_in_order(db):
+    session_path = "users/u1/readings/r1/sessions/s1"
+    await db.document(session_path).set({"message_count": 0})
+    db.stats.reset()
+
+    for i in range(3):
+        await firestore.save_message("u1", "r1", "s1", {"role": "user", "message": f"m{i}"})
+
+    assert db.dump(session_path)["message_count"] == 3
+    assert db.stats.as_dict() == {"reads": 0, "writes": 6, "deletes": 0, "round_trips": 3}
+
+    messages = await firestore.list_messages("u1", "r1", "s1", last=2)
+    assert [m["message"] for m in messages] == ["m1", "m2"]
+    after = await firestore.list_messages("u1", "r1", "s1", after=messages[0]["created_at"])
+    assert [m["message"] for m in after] == ["m2"]
+
+
+async def test_merge_insights_runs_in_a_transaction(db):
+    for i, insight_id in enumerate(["a", "b"]):
+        await db.document(f"users/u1/readings/r1/insights/{insight_id}").set(
+            {"content": insight_id, "type": "learning", "created_at": f"2026-01-0{i + 1}"}
+        )
+
+    merged = await firestore.merge_insights("u1", "r1", "ab", "learning", ["b", "a", "x"])
+
+    assert [m["insight_id"] for m in merged["merged_from"]] == ["b", "a"]
+    assert db.paths("users/u1/readings/r1/insights/") == [
+        f"users/u1/readings/r1/insights/{merged['id']}"
+    ]
+    assert db.dump("users/u1")["activity"]["insights_count"] == 1
+
+
+async def test_delete_insights_commits_activity_counter_with_deletes(db):
+    for insight_id in ["a", "b"]:
+        await db.document(f"users/u1/readings/r1/insights/{insight_id}").set({"content": "x"})
+    db.stats.reset()
+
+    result = await firestore.delete_insights("u1", "r1", ["a", "b", "missing"])
+
+    assert result == {"deleted_count": 2}
+    assert db.paths("users/u1/readings/r1/insights/") == []
+    assert db.dump("users/u1")["activity"]["insights_count"] == 1
+    # get_all と、削除・カウンターをまとめた1回のコミット
+    assert db.stats.round_trips == 2
+
+
+async def test_transaction_retries_when_a_read_document_changes(db):
+    ref = db.document("counters/c1")
+    await ref.set({"value": 0})
+    attempts = 0
+
+    @async_transactional
+    async def increment(transaction):
+        nonlocal attempts
+        attempts += 1
+        snapshot = await ref.get(transaction=transaction)
+        if attempts == 1:
+            # 読み取り後、コミット前に別の書き込みが入る
+            await ref.update({"value": 10})
+        transaction.update(ref, {"value": snapshot.get("value") + 1})
+
+    await increment(db.transaction())
+
+    assert attempts == 2
+    assert db.dump("counters/c1") == {"value": 11}
+
+
+async def test_queries_collection_groups_and_create(db):
+    now = datetime.now(timezone.utc)
+    await db.document("users/u1/readings/r1").set({"user_id": "u1", "updated_at": now})
+    await db.document("users/u2/readings/r1").set(
+        {"user_id": "u2", "updated_at": now - timedelta(days=30)}
+    )
+    await db.document("users/u3").set({"activity": {"updated_at": now}})
+
+    assert await firestore.list_active_user_ids(now - timedelta(days=7)) == ["u1", "u3"]
+
+    for i in range(5):
+        await db.document(f"publicInsights/p{i}").set({"published_at": now - timedelta(minutes=i)})
+    page, cursor, has_more = await firestore.list_public_insights(limit=2)
+    assert [p["id"] for p in page] == ["p0", "p1"] and has_more
+    page, _, _ = await firestore.list_public_insights(limit=2, cursor=cursor)
+    assert [p["id"] for p in page] == ["p2", "p3"]
+
+    count = await db.collection("publicInsights").count().get()
+    assert count[0][0].value == 5
+
+    badge = db.document("users/u1/badges/first")
+    await badge.create({"awarded": True})
+    with pytest.raises(AlreadyExists):
+        await badge.create({"awarded": True})
+
+
+async def test_latency_is_applied_per_round_trip():
+    with fake_firestore(latency=0.02) as db:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(*(db.document(f"docs/d{i}").get() for i in range(5)))
+        assert loop.time() - started < 0.08
+        assert db.stats.round_trips == 5 and db.stats.reads == 5
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from knowva.main import app
+from knowva.middleware.firebase_auth import get_current_user
+from knowva.services import firestore, firestore_ops
+from knowva.services.firestore_ops import FirestoreBudgetExceededError
+from knowva.testing.firestore_budget import assert_firestore_budget, enforce_budgets
+from knowva.testing.firestore_fake import fake_firestore
+
+USER_ID = "user_1"
+
+
+@pytest.fixture
+def db():
+    app.dependency_overrides[get_current_user] = lambda: {"uid": USER_ID}
+    with fake_firestore() as client, enforce_budgets():
+        now = datetime.now(timezone.utc)
+        client.load(
+            {
+                f"publicInsights/p{i}": {
+                    "insight_id": f"i{i}",
+                    "content": "気づき",
+                    "type": "learning",
+                    "display_name": "読書家さん",
+                    "book": {"title": "本", "author": "著者"},
+                    "published_at": now - timedelta(minutes=i),
+                }
+                for i in range(30)
+            }
+        )
+        yield client
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+async def _get(path: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path)
+
+
+async def test_server_timing_reports_ops_and_budget_is_enforced(db, monkeypatch):
+    response = await _get("/api/timeline?order=newest&limit=20")
+
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    assert 'firestore-queries;desc="1"' in timing
+    assert 'firestore-reads;desc="21"' in timing
+
+    list_public_insights = firestore.list_public_insights
+
+    async def list_twice(limit=20, cursor=None):
+        await list_public_insights(limit=limit, cursor=cursor)
+        return await list_public_insights(limit=limit, cursor=cursor)
+
+    monkeypatch.setattr(firestore, "list_public_insights", list_twice)
+    with pytest.raises(FirestoreBudgetExceededError, match="queries 2 > 1"):
+        await _get("/api/timeline?order=newest&limit=20")
+
+
+async def test_budget_helper_catches_n_plus_one(db):
+    for i in range(3):
+        db.load({f"users/{USER_ID}/readings/r{i}": {"created_at": i, "book": {"title": "本"}}})
+
+    with pytest.raises(FirestoreBudgetExceededError, match="queries 4 > 2"):
+        with assert_firestore_budget(queries=2):
+            await firestore.list_all_insights(USER_ID)
+
+
+async def test_instrumented_client_counts_gapic_calls():
+    async def responses(items):
+        for item in items:
+            yield item
+
+    class Api:
+        async def run_query(self, **kwargs):
+            return responses([SimpleNamespace(document=d) for d in ("a", "b", None)])
+
+        async def batch_get_documents(self, **kwargs):
+            return responses(
+                [SimpleNamespace(found="a", missing=""), SimpleNamespace(found=None, missing="b")]
+            )
+
+        async def commit(self, **kwargs):
+            return None
+
+    api = firestore_ops._CountingFirestoreApi(Api())
+    with firestore_ops.track() as ops:
+        async for _ in await api.run_query(request={}):
+            pass
+        async for _ in await api.batch_get_documents(request={}):
+            pass
+        await api.commit(request={"writes": [1, 2, 3]})
+
+    assert ops.as_dict() == {
+        "reads": 4,
+        "writes": 3,
+        "queries": 1,
+        "lookups": 1,
+        "aggregations": 0,
+        "round_trips": 3,
+    }
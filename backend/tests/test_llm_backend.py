@@ -0,0 +1,70 @@
+from google.adk.agents import LlmAgent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from knowva.services.llm_backend import FakeLlm, RecordingLlm, ReplayLlm
+
+SCRIPT = {
+    "test_agent": {
+        "tool_calls": [
+            {"name": "save_note", "args": {"content": "気づき"}},
+            {"name": "unknown_tool", "args": {}},
+        ],
+        "text": "記録しました。ほかに印象に残った場面はありますか？",
+    }
+}
+
+
+async def _run(llm, notes: list[str]) -> list:
+    async def save_note(content: str) -> dict:
+        """メモを保存する。"""
+        notes.append(content)
+        return {"status": "success"}
+
+    agent = LlmAgent(name="test_agent", model=llm, tools=[save_note])
+    runner = Runner(agent=agent, app_name="test", session_service=InMemorySessionService())
+    await runner.session_service.create_session(app_name="test", user_id="u1", session_id="s1")
+    message = types.Content(role="user", parts=[types.Part(text="こんにちは")])
+    return [
+        event
+        async for event in runner.run_async(user_id="u1", session_id="s1", new_message=message)
+    ]
+
+
+def _texts(events) -> list[str]:
+    return [p.text for e in events if e.content for p in e.content.parts or [] if p.text]
+
+
+async def test_fake_llm_calls_scripted_tools_then_answers():
+    notes: list[str] = []
+    llm = FakeLlm(
+        model="fake", agent_name="test_agent", script=SCRIPT, chunk_delay=0, tool_latency=0
+    )
+
+    events = await _run(llm, notes)
+
+    assert notes == ["気づき"]
+    calls = [p.function_call.name for e in events for p in e.content.parts or [] if p.function_call]
+    assert calls == ["save_note"]
+    assert _texts(events) == [SCRIPT["test_agent"]["text"]]
+
+
+async def test_recorded_trace_replays_the_same_run(tmp_path):
+    trace_path = str(tmp_path / "trace.jsonl")
+    fake = FakeLlm(
+        model="fake", agent_name="test_agent", script=SCRIPT, chunk_delay=0, tool_latency=0
+    )
+    recorded = await _run(
+        RecordingLlm(model="fake", agent_name="test_agent", inner=fake, trace_path=trace_path),
+        [],
+    )
+
+    notes: list[str] = []
+    replayed = await _run(
+        ReplayLlm(model="fake", agent_name="test_agent", trace_path=trace_path, realtime=False),
+        notes,
+    )
+
+    assert notes == ["気づき"]
+    assert _texts(replayed) == _texts(recorded)
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from knowva.services.llm_scheduler import LLMOverloadedError, LLMScheduler, Priority
+
+
+def _scheduler(max_concurrency=1, max_queue=8, queue_timeout_seconds=5.0) -> LLMScheduler:
+    return LLMScheduler(
+        max_concurrency=max_concurrency,
+        max_queue=max_queue,
+        queue_timeout_seconds=queue_timeout_seconds,
+    )
+
+
+async def _queued(scheduler: LLMScheduler, priority: Priority) -> asyncio.Task:
+    """待ち行列に入った acquire のタスクを返す。"""
+    depth = scheduler.queue_depth
+    task = asyncio.create_task(scheduler.acquire(priority))
+    while scheduler.queue_depth == depth and not task.done():
+        await asyncio.sleep(0)
+    return task
+
+
+async def test_limits_concurrent_slots():
+    scheduler = _scheduler(max_concurrency=2)
+    first = await scheduler.acquire()
+    second = await scheduler.acquire()
+    waiter = await _queued(scheduler, Priority.INTERACTIVE)
+
+    assert scheduler.active == 2
+    assert not waiter.done()
+
+    first.release()
+    third = await waiter
+    assert scheduler.active == 2
+
+    second.release()
+    third.release()
+    third.release()  # 二重解放しても数は狂わない
+    assert scheduler.snapshot()["active"] == 0
+
+
+async def test_wakes_waiters_by_priority_then_fifo():
+    scheduler = _scheduler()
+    holder = await scheduler.acquire()
+    order = []
+
+    async def run(name: str, priority: Priority) -> None:
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    tasks = []
+    for name, priority in [
+        ("background", Priority.BACKGROUND),
+        ("generation", Priority.GENERATION),
+        ("interactive_1", Priority.INTERACTIVE),
+        ("interactive_2", Priority.INTERACTIVE),
+    ]:
+        depth = scheduler.queue_depth
+        tasks.append(asyncio.create_task(run(name, priority)))
+        while scheduler.queue_depth == depth:
+            await asyncio.sleep(0)
+
+    holder.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["interactive_1", "interactive_2", "generation", "background"]
+    assert scheduler.active == 0
+
+
+async def test_rejects_when_queue_is_full_with_retry_after():
+    scheduler = _scheduler(max_queue=1)
+    holder = await scheduler.acquire()
+    waiter = await _queued(scheduler, Priority.INTERACTIVE)
+
+    with pytest.raises(LLMOverloadedError) as exc_info:
+        await scheduler.acquire(Priority.INTERACTIVE)
+
+    # (待ち1件 + 1) / 1スロット × 平均保持時間 5秒
+    assert exc_info.value.retry_after == 10
+    assert exc_info.value.reason == "queue full"
+    assert scheduler.snapshot()["priorities"]["interactive"]["rejected"] == 1
+
+    holder.release()
+    (await waiter).release()
+
+
+async def test_higher_priority_preempts_lower_priority_waiter():
+    scheduler = _scheduler(max_queue=1)
+    holder = await scheduler.acquire()
+    background = await _queued(scheduler, Priority.BACKGROUND)
+    interactive = asyncio.create_task(scheduler.acquire(Priority.INTERACTIVE))
+
+    with pytest.raises(LLMOverloadedError, match="preempted by higher priority"):
+        await background
+
+    holder.release()
+    (await interactive).release()
+    assert scheduler.snapshot()["active"] == 0
+
+
+async def test_queue_timeout_rejects_and_leaves_queue():
+    scheduler = _scheduler(queue_timeout_seconds=0.05)
+    holder = await scheduler.acquire()
+
+    with pytest.raises(LLMOverloadedError, match="queue timeout"):
+        await scheduler.acquire(Priority.BACKGROUND)
+
+    assert scheduler.queue_depth == 0
+    holder.release()
+    assert scheduler.active == 0
+
+
+async def test_slot_granted_to_cancelled_waiter_passes_to_next():
+    scheduler = _scheduler()
+    holder = await scheduler.acquire()
+    cancelled = await _queued(scheduler, Priority.INTERACTIVE)
+    next_waiter = await _queued(scheduler, Priority.INTERACTIVE)
+
+    # スロットが渡された直後（待機者が再開する前）にキャンセルされる
+    holder.release()
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+    slot = await asyncio.wait_for(next_waiter, timeout=1)
+    assert scheduler.active == 1
+    slot.release()
+    assert scheduler.snapshot()["active"] == 0
+    assert scheduler.queue_depth == 0
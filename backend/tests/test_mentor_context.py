@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from knowva.services import firestore, mentor_context, user_service
+from knowva.services.user_service import UserDocument
+
+
+@pytest.fixture
+def fake_activity(monkeypatch):
+    now = datetime.now(timezone.utc)
+    user = {"activity": {"insights_count": 1}, "current_profile": {}}
+    readings = [{"id": "r1", "status": "reading", "updated_at": now}]
+    feedbacks: list[dict] = []
+    calls = {"context": 0}
+
+    async def list_readings(user_id):
+        return readings
+
+    async def load_user_document(user_id):
+        return UserDocument(user_id, user)
+
+    async def get_mentor_context(user_id, period_days):
+        calls["context"] += 1
+        return {"period_days": period_days}
+
+    async def list_mentor_feedbacks(user_id, limit=10):
+        return feedbacks
+
+    monkeypatch.setattr(firestore, "list_readings", list_readings)
+    monkeypatch.setattr(user_service, "load_user_document", load_user_document)
+    monkeypatch.setattr(firestore, "get_mentor_context", get_mentor_context)
+    monkeypatch.setattr(firestore, "list_mentor_feedbacks", list_mentor_feedbacks)
+    mentor_context._context_cache.clear()
+    return user, feedbacks, calls
+
+
+async def test_context_is_cached_until_new_activity(fake_activity):
+    user, _, calls = fake_activity
+
+    _, first = await mentor_context.get_mentor_context("u1", 7)
+    _, second = await mentor_context.get_mentor_context("u1", 7)
+    assert first == second and calls["context"] == 1
+
+    user["activity"] = {"insights_count": 2}
+    _, third = await mentor_context.get_mentor_context("u1", 7)
+    assert third != first and calls["context"] == 2
+
+
+async def test_recent_feedback_with_same_activity_is_reused(fake_activity):
+    user, feedbacks, _ = fake_activity
+    activity = await mentor_context.activity_fingerprint("u1", 7)
+    feedbacks.append(
+        {
+            "id": "f1",
+            "feedback_type": "weekly",
+            "activity_fingerprint": activity,
+            "created_at": datetime.now(timezone.utc) - timedelta(hours=1),
+        }
+    )
+
+    assert (await mentor_context.find_reusable_feedback("u1", "weekly", activity))["id"] == "f1"
+    assert await mentor_context.find_reusable_feedback("u1", "monthly", activity) is None
+
+    user["activity"] = {"insights_count": 2}
+    changed = await mentor_context.activity_fingerprint("u1", 7)
+    assert await mentor_context.find_reusable_feedback("u1", "weekly", changed) is None
@@ -0,0 +1,52 @@
+import asyncio
+
+from knowva.jobs import mentor_feedback_batch
+from knowva.jobs.mentor_feedback_batch import MentorFeedbackBatch
+from knowva.services import firestore, mentor_context
+
+
+async def test_batch_resumes_skips_unchanged_and_bounds_llm_concurrency(monkeypatch):
+    feedbacks = {
+        "done": [{"feedback_type": "weekly", "batch_job_id": "job_1"}],
+        "same": [{"feedback_type": "weekly", "activity_fingerprint": "fp_same"}],
+    }
+    saved: list[tuple[str, dict]] = []
+    checkpoints: list[str] = []
+    active = {"now": 0, "max": 0}
+
+    async def list_mentor_feedbacks(user_id, limit=10):
+        return feedbacks.get(user_id, [])
+
+    async def get_mentor_context(user_id, period_days):
+        return {"user": user_id}, f"fp_{user_id}"
+
+    async def save_mentor_feedback(user_id, data):
+        saved.append((user_id, data))
+        return {"id": f"f_{user_id}", **data}
+
+    async def checkpoint(self, status):
+        checkpoints.append(status)
+
+    async def generate(prompt):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return "よく読みましたね"
+
+    monkeypatch.setattr(firestore, "list_mentor_feedbacks", list_mentor_feedbacks)
+    monkeypatch.setattr(firestore, "save_mentor_feedback", save_mentor_feedback)
+    monkeypatch.setattr(mentor_context, "get_mentor_context", get_mentor_context)
+    monkeypatch.setattr(MentorFeedbackBatch, "_checkpoint", checkpoint)
+    monkeypatch.setattr(mentor_feedback_batch, "_CHECKPOINT_EVERY", 2)
+
+    batch = MentorFeedbackBatch("weekly", "job_1", generate=generate, llm_concurrency=2)
+    results = await batch.run(["done", "same", "u1", "u2", "u3", "u4"])
+
+    assert (results["resumed"], results["unchanged"], results["generated"]) == (1, 1, 4)
+    assert active["max"] == 2
+    assert {user_id for user_id, _ in saved} == {"u1", "u2", "u3", "u4"}
+    assert all(data["batch_job_id"] == "job_1" for _, data in saved)
+    assert saved[0][1]["activity_fingerprint"] == f"fp_{saved[0][0]}"
+    assert checkpoints[0] == "running" and checkpoints[-1] == "completed"
+    assert len(checkpoints) == 2 + 3
@@ -0,0 +1,52 @@
+import httpx
+
+from knowva.config import settings
+from knowva.main import app
+from knowva.services import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_duration_seconds", "test.", ("kind",), (0.1, 1.0))
+    try:
+        histogram.observe(0.05, "a")
+        histogram.observe(0.5, "a")
+        histogram.observe(5.0, "a")
+
+        assert histogram.render()[2:] == [
+            'test_duration_seconds_bucket{kind="a",le="0.1"} 1',
+            'test_duration_seconds_bucket{kind="a",le="1.0"} 2',
+            'test_duration_seconds_bucket{kind="a",le="+Inf"} 3',
+            'test_duration_seconds_sum{kind="a"} 5.55',
+            'test_duration_seconds_count{kind="a"} 3',
+        ]
+    finally:
+        metrics._registry.remove(histogram)
+
+
+async def test_metrics_endpoint_labels_requests_by_route_template(monkeypatch):
+    monkeypatch.setattr(settings, "use_emulator", True)
+    monkeypatch.setattr(settings, "metrics_token", "")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.get("/api/health")
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'knowva_http_request_duration_seconds_count{method="GET",route="/api/health",status="200"}'
+        in response.text
+    )
+    assert "# TYPE knowva_sse_time_to_first_token_seconds histogram" in response.text
+
+
+async def test_metrics_endpoint_is_hidden_without_token_outside_local(monkeypatch):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        monkeypatch.setattr(settings, "use_emulator", False)
+        assert (await client.get("/metrics")).status_code == 404
+
+        monkeypatch.setattr(settings, "metrics_token", "secret")
+        assert (await client.get("/metrics")).status_code == 401
+        response = await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert response.status_code == 200
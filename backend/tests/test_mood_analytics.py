@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from knowva.services.mood_analytics import METRIC_KEYS, compute_mood_analytics
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _mood(reading_id: str, mood_type: str, value, days: int = 0, **overrides) -> dict:
+    return {
+        "reading_id": reading_id,
+        "mood_type": mood_type,
+        "metrics": {key: overrides.get(key, value) for key in METRIC_KEYS},
+        "recorded_at": START + timedelta(days=days),
+    }
+
+
+def test_pairs_before_and_after_of_the_same_reading():
+    result = compute_mood_analytics(
+        [
+            _mood("r1", "before", 2),
+            _mood("r1", "after", 4, days=1),
+            _mood("r2", "before", 3),
+            _mood("r3", "after", 5, days=2),
+        ]
+    )
+
+    assert result["record_count"] == 4
+    assert result["reading_count"] == 3
+    assert result["paired_count"] == 1
+    energy = result["metrics"]["energy"]
+    assert energy["before_mean"] == 2.5
+    assert energy["after_mean"] == 4.5
+    assert energy["delta_mean"] == 2.0
+    assert (energy["improved"], energy["declined"], energy["unchanged"]) == (1, 0, 0)
+    assert [point["reading_id"] for point in result["trend"]] == ["r1"]
+
+
+def test_distributions_count_each_scale_level():
+    result = compute_mood_analytics(
+        [
+            _mood("r1", "before", 1),
+            _mood("r2", "before", 1),
+            _mood("r3", "before", 5),
+            _mood("r1", "after", 3, days=1),
+        ]
+    )
+
+    assert result["metrics"]["clarity"]["before_distribution"] == [2, 0, 0, 0, 1]
+    assert result["metrics"]["clarity"]["after_distribution"] == [0, 0, 1, 0, 0]
+
+
+def test_trend_uses_rolling_mean_in_recorded_order():
+    moods = []
+    # 変化量 energy: r_a=+1, r_b=+2, r_c=+3（保存順とは逆の時刻で記録）
+    for reading_id, delta, days in [("r_c", 3, 30), ("r_a", 1, 10), ("r_b", 2, 20)]:
+        moods.append(_mood(reading_id, "before", 1, days=days - 1))
+        moods.append(_mood(reading_id, "after", 1 + delta, days=days))
+
+    result = compute_mood_analytics(moods, window=2)
+
+    assert [point["reading_id"] for point in result["trend"]] == ["r_a", "r_b", "r_c"]
+    assert [point["deltas"]["energy"] for point in result["trend"]] == [1.0, 2.0, 3.0]
+    assert [point["rolling_deltas"]["energy"] for point in result["trend"]] == [1.0, 1.5, 2.5]
+    assert result["metrics"]["energy"]["trend_slope_per_30_days"] == pytest.approx(3.0)
+
+
+def test_empty_input():
+    result = compute_mood_analytics([])
+
+    assert result["record_count"] == 0
+    assert result["paired_count"] == 0
+    assert result["trend"] == []
+    energy = result["metrics"]["energy"]
+    assert energy["before_mean"] is None
+    assert energy["delta_std"] is None
+    assert energy["trend_slope_per_30_days"] is None
+    assert energy["before_distribution"] == [0, 0, 0, 0, 0]
+
+
+def test_records_with_missing_metric_values_are_skipped():
+    incomplete = _mood("r2", "before", 3, openness=None)
+    no_key = _mood("r3", "before", 3)
+    del no_key["metrics"]["clarity"]
+
+    result = compute_mood_analytics(
+        [_mood("r1", "before", 2), _mood("r1", "after", 3, days=1), incomplete, no_key]
+    )
+
+    assert result["record_count"] == 2
+    assert result["reading_count"] == 1
+    assert result["metrics"]["openness"]["before_distribution"] == [0, 1, 0, 0, 0]
+    assert result["metrics"]["openness"]["before_mean"] == 2.0
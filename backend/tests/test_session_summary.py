@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from knowva.config import settings
+from knowva.services import firestore, firestore_ops, session_summary
+from knowva.services.session_service import FirestoreSessionService
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def fake_store(monkeypatch):
+    messages = [
+        {"role": "user" if i % 2 == 0 else "assistant", "message": f"m{i}", "created_at": T0}
+        for i in range(30)
+    ]
+    for i, m in enumerate(messages):
+        m["created_at"] = T0 + timedelta(seconds=i)
+    session = {"id": "s1", "message_count": len(messages)}
+    prompts: list[str] = []
+
+    async def get_session(user_id, reading_id, session_id):
+        return dict(session)
+
+    async def list_messages(user_id, reading_id, session_id, after=None, last=None):
+        found = [m for m in messages if after is None or m["created_at"] > after]
+        return found[-last:] if last else found
+
+    async def update_session(user_id, reading_id, session_id, data):
+        session.update(data)
+        return dict(session)
+
+    async def generate(prompt: str) -> str:
+        prompts.append(prompt)
+        return f"summary{len(prompts)}"
+
+    monkeypatch.setattr(firestore, "get_session", get_session)
+    monkeypatch.setattr(firestore, "list_messages", list_messages)
+    monkeypatch.setattr(firestore, "update_session", update_session)
+    monkeypatch.setattr(session_summary, "_generate", generate)
+    return session, messages, prompts
+
+
+async def test_rolling_update_reads_only_new_messages(fake_store):
+    session, messages, prompts = fake_store
+    session.update(
+        rolling_summary="previous",
+        rolling_summary_until=messages[19]["created_at"],
+        rolling_summary_count=20,
+    )
+
+    summary = await session_summary.update_rolling_summary("u1", "r1", "s1")
+
+    assert summary == "summary1"
+    assert "previous" in prompts[0]
+    assert "m20" in prompts[0] and "m19" not in prompts[0]
+    assert session["rolling_summary_until"] == messages[-1]["created_at"]
+    assert session["rolling_summary_count"] == 30
+
+
+async def test_restore_keeps_every_message_after_rolling_summary(fake_store, monkeypatch):
+    session, messages, _ = fake_store
+    monkeypatch.setattr(settings, "session_restore_recent_messages", 10)
+    # message_count が補完される前に畳み込まれ、件数同士が食い違っているセッション
+    session.update(
+        message_count=10,
+        rolling_summary="previous",
+        rolling_summary_until=messages[14]["created_at"],
+        rolling_summary_count=15,
+    )
+
+    events, summary = await FirestoreSessionService()._restore_events_from_messages(
+        "u1", "r1", "s1"
+    )
+
+    assert summary == "previous"
+    assert [e.content.parts[0].text for e in events] == [f"m{i}" for i in range(15, 30)]
+
+
+async def test_final_summary_reuses_rolling_summary(fake_store):
+    session, messages, prompts = fake_store
+    session.update(
+        rolling_summary="previous",
+        rolling_summary_until=messages[-1]["created_at"],
+        rolling_summary_count=30,
+    )
+
+    summary = await session_summary.summarize_session("u1", "r1", "s1")
+
+    # 未要約のメッセージがないため、要約から一行要約を作る1回の呼び出しのみ
+    assert summary == "summary1"
+    assert len(prompts) == 1 and "m0" not in prompts[0]
+    assert session["summary_status"] == session_summary.STATUS_COMPLETED
+
+
+async def test_long_transcript_without_rolling_summary_is_map_reduced(fake_store, monkeypatch):
+    _, _, prompts = fake_store
+    monkeypatch.setattr(settings, "summary_chunk_chars", 60)
+
+    await session_summary.summarize_session("u1", "r1", "s1")
+
+    assert len(prompts) > 2
+    assert all(len(p) < 60 + 200 for p in prompts)
+
+
+async def test_jobs_for_the_same_session_do_not_overlap(monkeypatch):
+    running: set[str] = set()
+    overlaps: list[str] = []
+    order: list[tuple[str, str]] = []
+
+    def job(kind: str):
+        async def run(user_id, reading_id, session_id):
+            if session_id in running:
+                overlaps.append(session_id)
+            running.add(session_id)
+            await asyncio.sleep(0.01)
+            running.discard(session_id)
+            order.append((kind, session_id))
+
+        return run
+
+    monkeypatch.setattr(session_summary, "update_rolling_summary", job("rolling"))
+    monkeypatch.setattr(session_summary, "summarize_session", job("final"))
+    pipeline = session_summary.SummaryPipeline(concurrency=3, max_retries=0, retry_base_seconds=0)
+
+    pipeline.enqueue("u1", "r1", "s1", kind=session_summary.JOB_ROLLING)
+    pipeline.enqueue("u1", "r1", "s1", kind=session_summary.JOB_FINAL)
+    pipeline.enqueue("u1", "r1", "s2", kind=session_summary.JOB_FINAL)
+    await pipeline.join()
+    await pipeline.shutdown()
+
+    assert overlaps == []
+    assert [o for o in order if o[1] == "s1"] == [("rolling", "s1"), ("final", "s1")]
+    assert pipeline._session_locks == {}
+
+
+async def test_workers_do_not_inherit_the_enqueuing_request_context(monkeypatch):
+    async def update_rolling_summary(user_id, reading_id, session_id):
+        firestore_ops.record(reads=1)
+
+    monkeypatch.setattr(session_summary, "update_rolling_summary", update_rolling_summary)
+    pipeline = session_summary.SummaryPipeline(concurrency=1, max_retries=0, retry_base_seconds=0)
+
+    with firestore_ops.track() as request_ops:
+        pipeline.enqueue("u1", "r1", "s1", kind=session_summary.JOB_ROLLING)
+    await pipeline.join()
+    await pipeline.shutdown()
+
+    assert pipeline.completed == 1
+    assert request_ops.reads == 0
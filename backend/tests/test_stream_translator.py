@@ -0,0 +1,71 @@
+import json
+
+from google.adk.events import Event
+from google.genai import types
+
+from knowva.services.sse_emitter import TextDelta
+from knowva.services.stream_translator import StreamTranslator
+
+
+def _event(*parts: types.Part, partial: bool = False) -> Event:
+    return Event(
+        author="agent",
+        invocation_id="inv",
+        partial=partial,
+        content=types.Content(role="model", parts=list(parts)),
+    )
+
+
+def _translate(translator: StreamTranslator, *events: Event) -> list:
+    return [item for event in events for item in translator.translate(event)]
+
+
+def test_partial_chunks_are_not_resent_by_final_event():
+    translator = StreamTranslator()
+    items = _translate(
+        translator,
+        _event(types.Part(text="こんにちは"), partial=True),
+        _event(types.Part(text="、読書"), partial=True),
+        _event(types.Part(text="こんにちは、読書")),
+    )
+    assert items == [TextDelta("こんにちは"), TextDelta("、読書")]
+    assert translator.text == "こんにちは、読書"
+
+
+def test_cumulative_text_yields_suffix_and_new_reply_replaces_text():
+    translator = StreamTranslator()
+    items = _translate(
+        translator,
+        _event(types.Part(text="abc")),
+        _event(types.Part(text="abcdef")),
+        _event(types.Part(text="xyz")),
+    )
+    assert items == [TextDelta("abc"), TextDelta("def"), TextDelta("xyz")]
+    assert translator.text == "xyz"
+
+
+def test_tool_response_without_id_matches_oldest_pending_call():
+    translator = StreamTranslator()
+    items = _translate(
+        translator,
+        _event(
+            types.Part(function_call=types.FunctionCall(id="c1", name="present_options")),
+            types.Part(function_call=types.FunctionCall(id="c2", name="present_options")),
+        ),
+        _event(
+            types.Part(
+                function_response=types.FunctionResponse(
+                    name="present_options",
+                    response={"status": "options_presented", "prompt": "どれ？", "options": []},
+                )
+            )
+        ),
+    )
+    assert [item.event for item in items] == [
+        "tool_call_start",
+        "tool_call_start",
+        "options_request",
+        "tool_call_done",
+    ]
+    assert json.loads(items[-1].data)["tool_call_id"] == "c1"
+    assert translator.options["prompt"] == "どれ？"
@@ -0,0 +1,397 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from typing import AsyncGenerator
+
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from sse_starlette import ServerSentEvent
+
+from knowva.config import settings
+from knowva.main import app
+from knowva.middleware.firebase_auth import get_current_user
+from knowva.routers import mentor, reports, sessions
+from knowva.services import (
+    agent_registry,
+    cancellation,
+    chat_stream,
+    firestore,
+    reading_context,
+    report_fingerprint,
+    sse_emitter,
+)
+from knowva.services.llm_scheduler import Priority, get_llm_scheduler, hold_slot
+from knowva.services.stream_hub import ReplayStream
+
+USER_ID = "user_1"
+READING_ID = "reading_1"
+SESSION_ID = "session_1"
+
+
+class SlowStreamingAgent(BaseAgent):
+    """一定間隔でテキストを少しずつ返すだけのエージェント。"""
+
+    chunks: int = 50
+    interval: float = 0.02
+    progress: dict = {}
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        self.progress["started"] = True
+        text = ""
+        try:
+            for i in range(self.chunks):
+                await asyncio.sleep(self.interval)
+                text += f"chunk{i} "
+                self.progress["emitted"] = i + 1
+                yield Event(
+                    author=self.name,
+                    invocation_id=ctx.invocation_id,
+                    content=types.Content(role="model", parts=[types.Part(text=text)]),
+                )
+            self.progress["finished"] = True
+        finally:
+            self.progress["closed"] = True
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    agent = SlowStreamingAgent(name="slow_agent", progress={})
+    session_service = InMemorySessionService()
+    runner = Runner(agent=agent, app_name=sessions.APP_NAME, session_service=session_service)
+    monkeypatch.setitem(agent_registry._runners, sessions.APP_NAME, runner)
+
+    saved_messages: list[dict] = []
+
+    async def get_session(user_id, reading_id, session_id):
+        return {"id": session_id, "session_type": "during_reading"}
+
+    async def save_message(user_id, reading_id, session_id, data):
+        saved_messages.append(data)
+        return {"id": f"msg_{len(saved_messages)}", **data}
+
+    async def ensure_reading_session(_service, *, app_name, user_id, session_id, **kwargs):
+        existing = await session_service.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+        return existing or await session_service.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, state={}
+        )
+
+    monkeypatch.setattr(firestore, "get_session", get_session)
+    monkeypatch.setattr(firestore, "save_message", save_message)
+    monkeypatch.setattr(reading_context, "ensure_reading_session", ensure_reading_session)
+    # 切断後の再接続猶予を短くして即座にキャンセルさせる（再接続のテストでは延ばす）
+    monkeypatch.setattr(settings, "sse_detach_grace_seconds", 0.05)
+    app.dependency_overrides[get_current_user] = lambda: {"uid": USER_ID}
+    yield agent, saved_messages
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+async def _stream_until(
+    path: str,
+    body: dict | None,
+    disconnect_after_deltas: int | None,
+    headers: list[tuple[bytes, bytes]] | None = None,
+) -> list[str]:
+    """ASGIアプリを直接呼び、指定数の text_delta を受け取った時点で切断する。"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    disconnected = asyncio.Event()
+    received: list[str] = []
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"].decode())
+            deltas = sum(chunk.count("event: text_delta") for chunk in received)
+            if disconnect_after_deltas is not None and deltas >= disconnect_after_deltas:
+                disconnected.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST" if body is not None else "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"host", b"testserver")]
+        + (headers or []),
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+        "app": app,
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=10)
+    return received
+
+
+async def test_disconnect_cancels_run_and_discards_partial_reply(fake_backend):
+    agent, saved_messages = fake_backend
+    before = cancellation.snapshot().get("reading_chat", {}).get("cancelled", 0)
+
+    await _stream_until(
+        f"/api/readings/{READING_ID}/sessions/{SESSION_ID}/messages/stream",
+        {"message": "こんにちは", "input_type": "text"},
+        disconnect_after_deltas=3,
+    )
+    # 再接続猶予の経過と後始末（ジェネレーターのクローズ）を待つ
+    await asyncio.sleep(0.3)
+
+    assert agent.progress["started"]
+    assert agent.progress["closed"]
+    assert not agent.progress.get("finished")
+    assert agent.progress["emitted"] < agent.chunks
+    # ユーザーメッセージのみ保存され、途中までの応答は保存されない
+    assert [m["role"] for m in saved_messages] == ["user"]
+    assert cancellation.snapshot()["reading_chat"]["cancelled"] == before + 1
+    assert get_llm_scheduler().active == 0
+
+
+async def test_completed_stream_saves_reply(fake_backend):
+    agent, saved_messages = fake_backend
+    agent.chunks = 3
+
+    received = await _stream_until(
+        f"/api/readings/{READING_ID}/sessions/{SESSION_ID}/messages/stream",
+        {"message": "こんにちは", "input_type": "text"},
+        disconnect_after_deltas=None,
+    )
+
+    assert agent.progress["finished"]
+    assert any("event: message_done" in chunk for chunk in received)
+    assert [m["role"] for m in saved_messages] == ["user", "assistant"]
+    assert saved_messages[-1]["message"] == "chunk0 chunk1 chunk2 "
+    assert get_llm_scheduler().active == 0
+
+
+def _parse_events(chunks: list[str]) -> list[dict]:
+    events = []
+    for block in "".join(chunks).replace("\r\n", "\n").split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in block.splitlines() if ": " in line and line[0] != ":"
+        )
+        if "event" in fields:
+            events.append(fields)
+    return events
+
+
+async def test_reattach_replays_missed_events_and_live_tail(fake_backend, monkeypatch):
+    agent, saved_messages = fake_backend
+    agent.chunks = 20
+    monkeypatch.setattr(settings, "sse_detach_grace_seconds", 5.0)
+    base = f"/api/readings/{READING_ID}/sessions/{SESSION_ID}"
+
+    first = _parse_events(
+        await _stream_until(
+            f"{base}/messages/stream",
+            {"message": "こんにちは", "input_type": "text"},
+            disconnect_after_deltas=3,
+        )
+    )
+    message_id = json.loads(first[0]["data"])["message_id"]
+    last_id = first[-1]["id"]
+
+    # 切断後も生成は続いている
+    await asyncio.sleep(0.1)
+    assert not agent.progress.get("closed")
+
+    second = _parse_events(
+        await _stream_until(
+            f"{base}/streams/{message_id}",
+            None,
+            disconnect_after_deltas=None,
+            headers=[(b"last-event-id", last_id.encode())],
+        )
+    )
+
+    # まとめ送りで id は飛ぶことがあるが、取りこぼしも重複もない
+    ids = [int(e["id"]) for e in first + second]
+    assert ids == sorted(set(ids))
+    deltas = [json.loads(e["data"])["delta"] for e in first + second if e["event"] == "text_delta"]
+    assert "".join(deltas) == "".join(f"chunk{i} " for i in range(agent.chunks))
+    assert second[-1]["event"] == "message_done"
+    assert agent.progress["finished"]
+    assert [m["role"] for m in saved_messages] == ["user", "assistant"]
+    assert get_llm_scheduler().active == 0
+
+
+async def test_slow_subscriber_gets_replay_gap_when_buffer_overtakes_it():
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def source():
+        while (item := await queue.get()) is not None:
+            yield item
+
+    stream = ReplayStream("stream_1", USER_ID, "scope", buffer_size=3)
+    stream.start(source())
+    subscriber = stream.subscribe()
+
+    await queue.put(ServerSentEvent(event="tool_status", data="1"))
+    assert (await anext(subscriber)).id == "1"
+
+    # 購読者が止まっている間に、次のイベントがバッファから溢れる
+    for i in range(2, 7):
+        await queue.put(ServerSentEvent(event="tool_status", data=str(i)))
+    while stream.last_event_id < 6:
+        await asyncio.sleep(0)
+
+    gap = await anext(subscriber)
+    assert gap.event == "replay_gap"
+    assert json.loads(gap.data) == {"missed_from": 2, "missed_to": 3}
+    assert [(await anext(subscriber)).id for _ in range(3)] == ["4", "5", "6"]
+
+    await queue.put(None)
+    assert [event async for event in subscriber] == []
+
+
+async def test_cancel_while_appending_closes_source_and_releases_slot(monkeypatch):
+    closed = asyncio.Event()
+    appending = asyncio.Event()
+
+    async def source():
+        try:
+            yield ServerSentEvent(event="tool_status", data="1")
+            await asyncio.Event().wait()
+        finally:
+            closed.set()
+
+    async def blocked_append(event, data):
+        # 生成元ではなく _append の中で待っている間にキャンセルされる
+        appending.set()
+        await asyncio.Event().wait()
+
+    scheduler = get_llm_scheduler()
+    slot = await scheduler.acquire(Priority.INTERACTIVE)
+    stream = ReplayStream("stream_1", USER_ID, "scope", buffer_size=3)
+    monkeypatch.setattr(stream, "_append", blocked_append)
+    stream.start(hold_slot(source(), slot))
+    await appending.wait()
+
+    stream._task.cancel()
+    await asyncio.wait_for(stream._task, 1)
+
+    assert closed.is_set()
+    assert stream.done
+    assert scheduler.active == 0
+
+
+async def test_reattach_unknown_stream_returns_404(fake_backend):
+    received = await _stream_until(
+        f"/api/readings/{READING_ID}/sessions/{SESSION_ID}/streams/unknown",
+        None,
+        disconnect_after_deltas=None,
+    )
+    assert "Stream not found" in "".join(received)
+
+
+async def test_deltas_are_coalesced_and_idle_stream_sends_ping(fake_backend, monkeypatch):
+    agent, saved_messages = fake_backend
+    agent.chunks = 10
+    agent.interval = 0.01
+    monkeypatch.setattr(settings, "sse_delta_coalesce_seconds", 0.05)
+    monkeypatch.setattr(settings, "sse_heartbeat_seconds", 0.005)
+    before = sse_emitter.snapshot()
+
+    events = _parse_events(
+        await _stream_until(
+            f"/api/readings/{READING_ID}/sessions/{SESSION_ID}/messages/stream",
+            {"message": "こんにちは", "input_type": "text"},
+            disconnect_after_deltas=None,
+        )
+    )
+
+    deltas = [json.loads(e["data"])["delta"] for e in events if e["event"] == "text_delta"]
+    assert "".join(deltas) == saved_messages[-1]["message"]
+    assert len(deltas) < agent.chunks
+    # ping は id を持たず、再接続位置に影響しない
+    pings = [e for e in events if e["event"] == "ping"]
+    assert pings and all("id" not in e for e in pings)
+
+    after = sse_emitter.snapshot()
+    assert after["delta_chunks"] - before["delta_chunks"] == agent.chunks
+    assert after["delta_frames"] - before["delta_frames"] == len(deltas)
+    assert after["events"]["text_delta"]["frames"] >= len(deltas)
+
+
+async def test_mentor_chat_stream_uses_reading_event_model(fake_backend, monkeypatch):
+    agent, _ = fake_backend
+    agent.chunks = 3
+    session_service = InMemorySessionService()
+    runner = Runner(agent=agent, app_name=mentor.APP_NAME, session_service=session_service)
+    monkeypatch.setitem(agent_registry._runners, mentor.APP_NAME, runner)
+
+    async def ensure_chat_session(app_name, user_id, session_id):
+        return await session_service.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, state={}
+        )
+
+    monkeypatch.setattr(chat_stream, "ensure_chat_session", ensure_chat_session)
+
+    events = _parse_events(
+        await _stream_until("/api/mentor/chat/stream", {"message": "調子は？"}, None)
+    )
+
+    kinds = [e["event"] for e in events if e["event"] != "ping"]
+    assert kinds[0] == "message_start"
+    assert kinds[-2:] == ["text_done", "message_done"]
+    assert json.loads(events[-1]["data"])["message"]["message"] == "chunk0 chunk1 chunk2 "
+    assert get_llm_scheduler().active == 0
+
+
+async def test_report_generation_is_skipped_when_inputs_are_unchanged(fake_backend, monkeypatch):
+    agent, _ = fake_backend
+    runner = Runner(
+        agent=agent, app_name=reports.APP_NAME, session_service=InMemorySessionService()
+    )
+    monkeypatch.setitem(agent_registry._runners, reports.APP_NAME, runner)
+    now = datetime.now(timezone.utc)
+    latest = {
+        "id": "report_1",
+        "reading_id": READING_ID,
+        "summary": "前回のレポート",
+        "insights_summary": "",
+        "context_analysis": "",
+        "metadata": {"session_count": 1, "insight_count": 0},
+        "input_fingerprint": "fp_1",
+        "created_at": now,
+        "updated_at": now,
+    }
+
+    async def compute_report_fingerprint(user_id, reading_id):
+        return "fp_1"
+
+    async def get_latest_report(user_id, reading_id):
+        return latest
+
+    monkeypatch.setattr(
+        report_fingerprint, "compute_report_fingerprint", compute_report_fingerprint
+    )
+    monkeypatch.setattr(firestore, "get_latest_report", get_latest_report)
+
+    received = await _stream_until(
+        f"/api/readings/{READING_ID}/reports/generate", {}, disconnect_after_deltas=None
+    )
+
+    events = _parse_events(received)
+    assert [e["event"] for e in events] == [
+        "message_start",
+        "text_delta",
+        "text_done",
+        "message_done",
+    ]
+    done = json.loads(events[-1]["data"])
+    assert done["status"] == "unchanged" and done["report"]["id"] == "report_1"
+    assert not agent.progress.get("started")
@@ -0,0 +1,73 @@
+import pytest
+from google.adk.agents import LlmAgent
+from google.adk.runners import Runner
+from google.genai import types
+
+from knowva.dependencies import get_firestore_client
+from knowva.services import firestore_ops, tracing
+from knowva.services.llm_backend import FakeLlm
+from knowva.services.session_service import FirestoreSessionService
+from knowva.testing.firestore_fake import fake_firestore
+
+SCRIPT = {
+    "test_agent": {
+        "tool_calls": [{"name": "save_note", "args": {"content": "気づき"}}],
+        "text": "記録しました。",
+    }
+}
+
+
+@pytest.fixture
+def exporter():
+    tracing.setup_tracing(exporter=tracing.EXPORTER_MEMORY)
+    try:
+        yield tracing.get_memory_exporter()
+    finally:
+        tracing.reset_tracing()
+
+
+async def test_agent_turn_spans_nest_with_firestore_counts(exporter):
+
+    async def save_note(content: str) -> dict:
+        """メモを保存する。"""
+        await get_firestore_client().collection("notes").document().set({"content": content})
+        return {"status": "success"}
+
+    llm = FakeLlm(model="fake", agent_name="test_agent", script=SCRIPT, tool_latency=0)
+    agent = LlmAgent(name="test_agent", model=llm, tools=[save_note])
+    with fake_firestore(), firestore_ops.track():
+        runner = Runner(
+            agent=agent,
+            app_name="test",
+            session_service=FirestoreSessionService(),
+            plugins=[tracing.TracingPlugin()],
+        )
+        await runner.session_service.create_session(app_name="test", user_id="u1", session_id="s1")
+        message = types.Content(role="user", parts=[types.Part(text="こんにちは")])
+        async for _ in runner.run_async(user_id="u1", session_id="s1", new_message=message):
+            pass
+
+    spans = {span.name: span for span in exporter.get_finished_spans()}
+    invocation = spans["invocation"]
+    assert invocation.attributes["knowva.agent"] == "test_agent"
+    assert invocation.attributes["knowva.session_id"] == "s1"
+    assert spans["session.get"].parent.span_id == invocation.context.span_id
+    assert spans["session.get"].attributes["session.cached"] is True
+    assert "session.append_event" in spans
+    assert "call_llm" in spans
+
+    tool = spans["execute_tool save_note"]
+    assert tool.context.trace_id == invocation.context.trace_id
+    assert tool.attributes["firestore.writes"] == 1
+
+
+def test_reset_stops_recording(exporter):
+    with tracing.span("before_reset") as current:
+        assert current.is_recording()
+
+    tracing.reset_tracing()
+
+    assert tracing.get_memory_exporter() is None
+    with tracing.span("after_reset") as current:
+        assert not current.is_recording()
+    assert [span.name for span in exporter.get_finished_spans()] == ["before_reset"]
@@ -0,0 +1,36 @@
+from knowva.services import firestore, user_service
+from knowva.testing.firestore_fake import fake_firestore
+
+USER_ID = "user_1"
+
+
+async def test_settings_update_merges_fresh_document_not_cached_one():
+    with fake_firestore() as client:
+        client.load({f"users/{USER_ID}": {"settings": {"fab_position": "left"}}})
+        user_service.invalidate(USER_ID)
+        await user_service.get_user_document(USER_ID)
+
+        # 別インスタンスでの更新（このインスタンスのキャッシュには反映されていない）
+        await (
+            client.collection("users")
+            .document(USER_ID)
+            .update({"settings": {"fab_position": "right"}})
+        )
+        updated = await firestore.update_user_settings(USER_ID, {"timeline_order": "newest"})
+
+        assert updated == {"fab_position": "right", "timeline_order": "newest"}
+        user_service.invalidate(USER_ID)
+
+
+async def test_returned_dicts_do_not_share_nested_state_with_cache():
+    with fake_firestore() as client:
+        client.load({f"users/{USER_ID}": {"current_profile": {"interests": ["歴史"]}}})
+        user_service.invalidate(USER_ID)
+        user_doc = await user_service.get_user_document(USER_ID)
+
+        user_doc.to_dict()["current_profile"]["interests"].append("哲学")
+        user_doc.current_profile["interests"].append("哲学")
+
+        cached = await user_service.get_user_document(USER_ID)
+        assert cached.current_profile == {"interests": ["歴史"]}
+        user_service.invalidate(USER_ID)
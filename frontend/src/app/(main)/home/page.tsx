@@ -1,7 +1,7 @@
 "use client";
 
 import { useEffect, useState, useCallback } from "react";
-import { apiClient, getLatestMentorFeedback, chatWithMentor, getUserSettings, updateUserSettings } from "@/lib/api";
+import { apiClient, getLatestMentorFeedback, generateMentorFeedback, getUserSettings, updateUserSettings } from "@/lib/api";
 import { AllInsightsResponse, MentorFeedback, MentorFeedbackType, Reading, FabPosition } from "@/lib/types";
 import { InsightList } from "@/components/profile/InsightList";
 import { QuickVoiceFAB } from "@/components/quick-voice/QuickVoiceFAB";
@@ -78,14 +78,12 @@ export default function HomePage() {
     setMentorLoading(true);
     setMentorMessage(null);
     try {
-      const message =
-        feedbackType === "weekly"
-          ? "今週の振り返りをお願いします"
-          : "今月の振り返りをお願いします";
-      const response = await chatWithMentor(message, feedbackType);
+      const response = await generateMentorFeedback(feedbackType);
       setMentorMessage(response.message);
       // 最新フィードバックを更新
-      getLatestMentorFeedback().then(setLatestFeedback).catch(() => {});
+      if (response.feedback) {
+        setLatestFeedback(response.feedback);
+      }
     } catch (error) {
       console.error("Failed to generate reflection:", error);
       setMentorMessage("振り返りの生成に失敗しました。もう一度お試しください。");
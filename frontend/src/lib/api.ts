@@ -13,6 +13,7 @@ import type {
   UserProfile,
   UserProfileUpdate,
   MentorFeedback,
+  MentorFeedbackGenerateResponse,
   MentorMessage,
   MentorFeedbackType,
   InsightVisibility,
@@ -245,6 +246,20 @@ export async function getLatestMentorFeedback(): Promise<MentorFeedback | null>
   return apiClient<MentorFeedback | null>("/api/mentor/feedbacks/latest");
 }
 
+/**
+ * 週次・月次の振り返りを生成
+ * （前回から活動に変化がなければ既存のフィードバックが返る: unchanged=true）
+ */
+export async function generateMentorFeedback(
+  feedbackType: MentorFeedbackType = "weekly",
+  force = false
+): Promise<MentorFeedbackGenerateResponse> {
+  return apiClient<MentorFeedbackGenerateResponse>("/api/mentor/feedbacks/generate", {
+    method: "POST",
+    body: JSON.stringify({ feedback_type: feedbackType, force }),
+  });
+}
+
 /**
  * メンターとチャット
  */
@@ -518,16 +533,21 @@ export async function getBook(bookId: string): Promise<Book> {
 
 /**
  * レポート生成をSSEストリーミングで開始する
+ *
+ * 前回の生成から入力が変わっていない場合は既存のレポートが返る
+ * （message_done の status が "unchanged"）。force=true で常に再生成する。
  */
 export async function generateReportStream(
   readingId: string,
   callbacks: SSECallbacks,
-  signal?: AbortSignal
+  signal?: AbortSignal,
+  force = false
 ): Promise<void> {
   const user = auth.currentUser;
   const token = user ? await user.getIdToken() : null;
 
-  const response = await fetch(`/api/readings/${readingId}/reports/generate`, {
+  const query = force ? "?force=true" : "";
+  const response = await fetch(`/api/readings/${readingId}/reports/generate${query}`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
@@ -75,6 +75,7 @@ export interface Session {
   started_at: string;
   ended_at?: string;
   summary?: string;
+  summary_status?: "pending" | "completed" | "failed";
 }
 
 export interface MessageOptions {
@@ -307,6 +308,12 @@ export interface MentorFeedback {
   created_at: string;
 }
 
+export interface MentorFeedbackGenerateResponse {
+  message: string;
+  feedback: MentorFeedback | null;
+  unchanged: boolean;
+}
+
 export interface MentorMessage {
   id: string;
   role: "user" | "assistant";